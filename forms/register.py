@@ -1,9 +1,11 @@
 import streamlit as st
 import time
-import bcrypt
-import pymongo
-import os
 from dotenv import load_dotenv
+from concurrent.futures import TimeoutError as FutureTimeout
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from services.database import connect_to_mongodb, index_failed
+from services.auth import hash_password
 
 # Load environment variables
 load_dotenv()
@@ -11,25 +13,26 @@ load_dotenv()
 # MODE PENGEMBANGAN - Set ke True untuk testing database tanpa Gemini
 DEVELOPMENT_MODE = st.sidebar.checkbox("Mode Testing Database", value=False)
 
-# Configure MongoDB connection
-def connect_to_mongodb():
-    mongo_uri = os.getenv("MONGODB_URI")
-    client = pymongo.MongoClient(mongo_uri)
-    db = client["Aedra_Ai"]  # Use the existing Aedra_Ai database
-    users_collection = db["users"]  # Access the users collection
-    return users_collection
-
 def register_user(username, password, users_collection):
-    if users_collection.find_one({"username": username}):
+    # Satu round-trip: index unique users.username menolak username yang sudah ada
+    # Tanpa index unique (data lama duplikat) username dicek manual - tidak bebas race, tapi tidak diam-diam duplikat
+    if index_failed("users", "username_unique") and users_collection.find_one({"username": username}, {"_id": 1}):
+        return False, "Username sudah digunakan."
+    try:
+        hashed_pw = hash_password(password)
+    except FutureTimeout:
+        # Pool bcrypt penuh - sama seperti login, jangan biarkan exception sampai ke dialog
+        return False, "Server sedang sibuk. Silakan coba lagi."
+    try:
+        user_id = ObjectId()
+        users_collection.insert_one({"_id": user_id, "username": username, "password": hashed_pw, "user_id": str(user_id)})
+    except DuplicateKeyError:
         return False, "Username sudah digunakan."
-
-    hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-    users_collection.insert_one({"username": username, "password": hashed_pw})
     return True, "Registrasi berhasil! Silakan login."
 
 @st.dialog("Sign Up")
 def register():
-    users_collection = connect_to_mongodb()
+    _, users_collection = connect_to_mongodb()
     
     with st.form("register"):
         new_username = st.text_input("Username Baru")
@@ -1,36 +1,40 @@
 import streamlit as st
-import bcrypt
-import pymongo
-import pandas as pd
-import google.generativeai as genai
-import os
 from dotenv import load_dotenv
-import time
-import uuid
-import re
-from google.api_core.exceptions import ResourceExhausted, DeadlineExceeded
-import random
 from forms.register import register
+from services.database import connect_to_mongodb, ensure_indexes
+from services.gemini import start_gemini_warmup
+from services.metrics import start_metrics_exporters
+from services.auth import authenticate
+from services.session_store import restore_session, sync_current_session, rotate_session, new_session_id, SESSION_QUERY_PARAM, SESSION_ID_KEY
 
 # Load environment variables
 load_dotenv()
 
+# Prometheus endpoint / periodic metrics log, if configured
+start_metrics_exporters()
+
 # MODE PENGEMBANGAN - Set ke True untuk testing database tanpa Gemini
 # DEVELOPMENT_MODE = st.sidebar.checkbox("Mode Testing Database", value=False)
 
-# Configure MongoDB connection
-def connect_to_mongodb():
-    mongo_uri = os.getenv("MONGODB_URI")
-    client = pymongo.MongoClient(mongo_uri)
-    db = client["Aedra_Ai"]  # Use the existing Aedra_Ai database
-    history_collection = db["history"]  # Access the history collection
-    users_collection = db["users"]      # Access the users collection
-    return history_collection, users_collection
+# Session id di URL - setelah reload, reconnect ke replika lain, atau restart, login memulihkan state yang sama.
+# Id ini bukan kredensial: status login tidak disimpan dan state hanya dipulihkan untuk akun pemiliknya.
+def get_session_id():
+    session_id = st.query_params.get(SESSION_QUERY_PARAM)
+    if not session_id or len(session_id) > 64:
+        session_id = new_session_id()
+        st.query_params[SESSION_QUERY_PARAM] = session_id
+    return session_id
 
 def main_application():
     """Main Streamlit application"""
     # Initialize MongoDB collections
     history_collection, users_collection = connect_to_mongodb()
+    # Index unique username dibutuhkan oleh login dan registrasi (sekali per proses)
+    try:
+        ensure_indexes()
+    except Exception as e:
+        st.error(f"❌ Gagal koneksi ke MongoDB: {e}")
+        st.stop()
 
     # Authentication state
     if 'logged_in' not in st.session_state:
@@ -50,12 +54,21 @@ def main_application():
 
                 # Tombol Submit
                 if st.form_submit_button("Sign In", type="primary", use_container_width=True):
-                    user_data = users_collection.find_one({"username": username})  
-                    if user_data and bcrypt.checkpw(password.encode(), user_data["password"]):
+                    user_data, error = authenticate(users_collection, username, password)
+                    if user_data:
                         st.session_state.logged_in = True
+                        # Identitas akun dipakai views/chat.py untuk history dan counter aktivitas
+                        st.session_state.user_id = user_data["user_id"]
+                        st.session_state.username = username
+                        # Kuesioner/percakapan yang sedang berjalan di ?sid= ini, jika milik akun yang sama
+                        restored = restore_session(st.session_state, get_session_id(), user_data["user_id"])
+                        st.query_params[SESSION_QUERY_PARAM] = rotate_session(st.session_state, get_session_id(), discard_old=restored)
+                        # Warm up the shared Gemini model in the background so the first diagnosis doesn't pay for it.
+                        # Baru setelah login: import SDK Gemini tidak ikut membebani render halaman login.
+                        start_gemini_warmup()
                         st.rerun()
                     else:
-                        st.error("Username atau password salah. Silakan coba lagi.")
+                        st.error(error)
                 
                 col1, col2 = st.columns(2)
                 col1.write("Don't have an account?")
@@ -78,4 +91,9 @@ def main_application():
         pg.run()
 
 if __name__ == "__main__":
-    main_application()
\ No newline at end of file
+    st.session_state[SESSION_ID_KEY] = get_session_id()
+    try:
+        main_application()
+    finally:
+        # Juga saat st.rerun()/st.stop() - perubahan state ditulis sebelum rerun berikutnya
+        sync_current_session(st.session_state)
@@ -0,0 +1,164 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+import bcrypt
+from dotenv import load_dotenv
+from services.cache import TTLCache
+from services.metrics import track, increment
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Work factor bcrypt - pilih dengan `python -m tools.benchmark_bcrypt`
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt melepas GIL saat hashing, jadi thread pool cukup untuk memakai beberapa core
+BCRYPT_POOL_SIZE = int(os.getenv("BCRYPT_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", "10"))  # detik menunggu giliran + hashing
+
+# Percobaan login gagal per username sebelum diblokir sementara
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_LOCKOUT_SECONDS = int(os.getenv("LOGIN_LOCKOUT_SECONDS", "300"))
+LOGIN_FAILURE_CACHE_SIZE = int(os.getenv("LOGIN_FAILURE_CACHE_SIZE", "10000"))
+
+LOGIN_PROJECTION = {"password": 1, "user_id": 1}
+
+
+class PasswordHasher:
+    """Hash dan verifikasi bcrypt di thread pool terbatas, di luar thread script Streamlit"""
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, pool_size=BCRYPT_POOL_SIZE, timeout=BCRYPT_TIMEOUT):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="bcrypt")
+
+    def _run(self, func, *args):
+        future = self._pool.submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            increment("bcrypt_timeouts")
+            raise
+
+    def hash(self, password):
+        with track("bcrypt_hash"):
+            return self._run(bcrypt.hashpw, password.encode(), bcrypt.gensalt(self.rounds))
+
+    def verify(self, password, hashed):
+        with track("bcrypt_check"):
+            return self._run(bcrypt.checkpw, password.encode(), hashed)
+
+    def needs_rehash(self, hashed):
+        # Format hash: $2b$<cost>$<salt+hash>
+        try:
+            return int(hashed.split(b"$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def rehash_in_background(self, password, on_done):
+        """Hash ulang dengan cost saat ini tanpa menahan login"""
+        def rehash():
+            try:
+                on_done(bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)))
+                increment("bcrypt_rehashes")
+            except Exception as e:
+                logger.warning("Password rehash failed: %s", e)
+        self._pool.submit(rehash)
+
+
+class LoginThrottle:
+    """Cache percobaan gagal per username - brute force ditolak sebelum mencapai bcrypt"""
+
+    def __init__(self, max_failures=LOGIN_MAX_FAILURES, lockout_seconds=LOGIN_LOCKOUT_SECONDS,
+                 max_entries=LOGIN_FAILURE_CACHE_SIZE):
+        self.max_failures = max_failures
+        self._failures = TTLCache(max_entries, lockout_seconds)
+        self._lock = threading.Lock()
+
+    def is_blocked(self, username):
+        return (self._failures.get(username) or 0) >= self.max_failures
+
+    def record_failure(self, username):
+        # Window dihitung dari kegagalan terakhir
+        with self._lock:
+            self._failures.set(username, (self._failures.get(username) or 0) + 1)
+
+    def reset(self, username):
+        self._failures.delete(username)
+
+
+_password_hasher = None
+_login_throttle = None
+_auth_lock = threading.Lock()
+
+
+# Process-wide hasher - pool bcrypt dibagi semua sesi
+def get_password_hasher():
+    global _password_hasher
+    if _password_hasher is None:
+        with _auth_lock:
+            if _password_hasher is None:
+                _password_hasher = PasswordHasher()
+    return _password_hasher
+
+
+def get_login_throttle():
+    global _login_throttle
+    if _login_throttle is None:
+        with _auth_lock:
+            if _login_throttle is None:
+                _login_throttle = LoginThrottle()
+    return _login_throttle
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def ensure_user_id(users_collection, user_data):
+    """user_id stabil untuk akun: str(_id), diisi sekali untuk akun lama yang belum memilikinya"""
+    user_id = user_data.get("user_id")
+    if user_id is None:
+        user_id = str(user_data["_id"])
+        users_collection.update_one(
+            {"_id": user_data["_id"], "user_id": {"$exists": False}},
+            {"$set": {"user_id": user_id}},
+        )
+        user_data["user_id"] = user_id
+    return user_id
+
+
+def authenticate(users_collection, username, password):
+    """Login: (user_data, pesan error). Hash dengan cost lama diperbarui di background"""
+    throttle = get_login_throttle()
+    if throttle.is_blocked(username):
+        increment("login_throttled")
+        return None, "Terlalu banyak percobaan gagal. Coba lagi beberapa menit lagi."
+
+    with track("login_user_lookup"):
+        # Index username_unique; hanya hash password (dan _id) yang dibaca
+        user_data = users_collection.find_one({"username": username}, LOGIN_PROJECTION)
+    hasher = get_password_hasher()
+    try:
+        password_ok = bool(user_data) and hasher.verify(password, user_data["password"])
+    except FutureTimeout:
+        return None, "Server sedang sibuk. Silakan coba lagi."
+    if not password_ok:
+        throttle.record_failure(username)
+        increment("login_failures")
+        return None, "Username atau password salah. Silakan coba lagi."
+
+    throttle.reset(username)
+    ensure_user_id(users_collection, user_data)
+    if hasher.needs_rehash(user_data["password"]):
+        old_hash = user_data["password"]
+        # Filter hash lama: tidak menimpa jika password diganti di antara login dan rehash
+        hasher.rehash_in_background(password, lambda new_hash: users_collection.update_one(
+            {"_id": user_data["_id"], "password": old_hash},
+            {"$set": {"password": new_hash}},
+        ))
+    return user_data, None
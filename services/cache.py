@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import time
+import math
+from collections import OrderedDict, Counter
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Diagnosis cache settings
+DIAGNOSIS_CACHE_TTL = int(os.getenv("DIAGNOSIS_CACHE_TTL", "86400"))  # detik
+DIAGNOSIS_CACHE_MAX_ENTRIES = int(os.getenv("DIAGNOSIS_CACHE_MAX_ENTRIES", "1024"))
+# Shared tier di MongoDB supaya semua replica memakai cache yang sama
+DIAGNOSIS_CACHE_SHARED = os.getenv("DIAGNOSIS_CACHE_SHARED", "false").lower() in ("1", "true", "yes")
+DIAGNOSIS_CACHE_COLLECTION = "diagnosis_cache"
+# Naikkan versi ini jika prompt atau model berubah agar entry lama tidak dipakai
+DIAGNOSIS_CACHE_VERSION = "v3"
+
+# Follow-up (semantic) cache settings
+FOLLOWUP_CACHE_TTL = int(os.getenv("FOLLOWUP_CACHE_TTL", "21600"))  # detik
+FOLLOWUP_CACHE_MAX_ENTRIES = int(os.getenv("FOLLOWUP_CACHE_MAX_ENTRIES", "512"))
+# Minimum cosine similarity agar pertanyaan dianggap sama
+FOLLOWUP_CACHE_THRESHOLD = float(os.getenv("FOLLOWUP_CACHE_THRESHOLD", "0.85"))
+FOLLOWUP_NGRAM_SIZE = 3
+# Kata negasi - "demam tidak turun" vs "demam turun" mirip secara n-gram tapi maknanya berlawanan
+FOLLOWUP_NEGATION_WORDS = frozenset({"tidak", "tdk", "bukan", "jangan", "belum", "nggak", "ngga", "gak", "enggak"})
+
+
+class TTLCache:
+    """LRU cache in-process dengan TTL per entry"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Normalisasi jawaban: huruf kecil, spasi dirapikan, en dash jadi tanda minus
+def normalize_answer(answer):
+    answer = str(answer).replace("–", "-").replace("—", "-")
+    return re.sub(r"\s+", " ", answer).strip().lower()
+
+
+# Key cache dari user_responses yang sudah dikanonikalisasi (urutan tidak berpengaruh)
+def make_response_key(responses):
+    canonical = sorted((question.strip(), normalize_answer(answer)) for question, answer in responses.items())
+    payload = json.dumps([DIAGNOSIS_CACHE_VERSION, canonical], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiagnosisCache:
+    """Cache diagnosis dua tingkat: in-process LRU dan (opsional) MongoDB bersama"""
+
+    def __init__(self, max_entries=DIAGNOSIS_CACHE_MAX_ENTRIES, ttl=DIAGNOSIS_CACHE_TTL, collection=None):
+        self.ttl = ttl
+        self.local = TTLCache(max_entries, ttl)
+        self.collection = collection
+        self._lock = threading.Lock()
+        self.stats = {
+            "local_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "shared_errors": 0,
+            "saved_seconds": 0.0,
+        }
+        if self.collection is not None:
+            try:
+                # MongoDB menghapus entry otomatis setelah expires_at
+                self.collection.create_index("expires_at", expireAfterSeconds=0)
+            except Exception:
+                self._count("shared_errors")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def get(self, responses):
+        key = make_response_key(responses)
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count("local_hits")
+            self._count("saved_seconds", entry["latency"])
+            return entry["diagnosis"]
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one(
+                    {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                    {"diagnosis": 1, "latency": 1},
+                )
+            except Exception:
+                self._count("shared_errors")
+                doc = None
+            if doc:
+                entry = {"diagnosis": doc["diagnosis"], "latency": doc.get("latency", 0.0)}
+                self.local.set(key, entry)
+                self._count("shared_hits")
+                self._count("saved_seconds", entry["latency"])
+                return entry["diagnosis"]
+
+        self._count("misses")
+        return None
+
+    def set(self, responses, diagnosis, latency=0.0):
+        key = make_response_key(responses)
+        self.local.set(key, {"diagnosis": diagnosis, "latency": latency})
+        self._count("stores")
+
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "diagnosis": diagnosis,
+                        "latency": latency,
+                        "version": DIAGNOSIS_CACHE_VERSION,
+                        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                    },
+                    upsert=True,
+                )
+            except Exception:
+                self._count("shared_errors")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        stats["local_size"] = len(self.local)
+        stats["shared_tier"] = self.collection is not None
+        return stats
+
+
+# Normalisasi pertanyaan: huruf kecil, tanpa tanda baca, spasi dirapikan
+def normalize_question(question):
+    question = re.sub(r"[^\w\s]", " ", str(question).lower())
+    return re.sub(r"\s+", " ", question).strip()
+
+
+# Character n-grams dari teks yang sudah dinormalisasi
+def char_ngrams(text, n=FOLLOWUP_NGRAM_SIZE):
+    padded = f" {text} "
+    if len(padded) <= n:
+        return Counter([padded])
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+# Token yang harus sama persis agar pertanyaan mirip boleh berbagi jawaban: angka dan kata negasi
+# ("berumur 5 tahun" vs "15 tahun", "boleh minum obat" vs "tidak boleh minum obat")
+def guard_tokens(text):
+    return frozenset(token for token in text.split() if token.isdigit() or token in FOLLOWUP_NEGATION_WORDS)
+
+
+class FollowupCache:
+    """Semantic cache untuk pertanyaan lanjutan berbasis TF-IDF character n-gram (lokal, tanpa network)"""
+
+    def __init__(self, max_entries=FOLLOWUP_CACHE_MAX_ENTRIES, ttl=FOLLOWUP_CACHE_TTL, threshold=FOLLOWUP_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # normalized question -> entry
+        self._postings = {}            # n-gram -> set of normalized questions
+        self._doc_freq = Counter()     # n-gram -> jumlah entry yang memuatnya
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "guard_misses": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _idf(self, gram):
+        return math.log((1 + len(self._entries)) / (1 + self._doc_freq[gram])) + 1.0
+
+    def _weights(self, grams):
+        weights = {gram: count * self._idf(gram) for gram, count in grams.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return weights, norm
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for gram in entry["grams"]:
+            self._doc_freq[gram] -= 1
+            if self._doc_freq[gram] <= 0:
+                del self._doc_freq[gram]
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _alive(self, key, now):
+        entry = self._entries[key]
+        if entry["expires_at"] <= now:
+            self._remove(key)
+            self.stats["expired"] += 1
+            return False
+        return True
+
+    def lookup(self, question):
+        """Kembalikan (answer, similarity) atau (None, best_similarity)"""
+        normalized = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            if normalized in self._entries and self._alive(normalized, now):
+                self._entries.move_to_end(normalized)
+                self.stats["exact_hits"] += 1
+                return self._entries[normalized]["answer"], 1.0
+
+            grams = char_ngrams(normalized)
+            guard = guard_tokens(normalized)
+            candidates = set()
+            for gram in grams:
+                candidates.update(self._postings.get(gram, ()))
+
+            best_key, best_score = None, 0.0
+            guard_rejected = False
+            if candidates:
+                query_weights, query_norm = self._weights(grams)
+                for key in candidates:
+                    if not self._alive(key, now):
+                        continue
+                    entry_weights, entry_norm = self._weights(self._entries[key]["grams"])
+                    dot = sum(w * entry_weights.get(gram, 0.0) for gram, w in query_weights.items())
+                    score = dot / (query_norm * entry_norm)
+                    if score >= self.threshold and self._entries[key]["guard"] != guard:
+                        # Mirip tapi angka/negasi berbeda - bukan pertanyaan yang sama
+                        guard_rejected = True
+                        continue
+                    if score > best_score:
+                        best_key, best_score = key, score
+
+            if best_key is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self.stats["similar_hits"] += 1
+                return self._entries[best_key]["answer"], best_score
+
+            self.stats["guard_misses" if guard_rejected else "misses"] += 1
+            return None, best_score
+
+    def get(self, question):
+        return self.lookup(question)[0]
+
+    def set(self, question, answer, ttl=None):
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        grams = char_ngrams(normalized)
+        with self._lock:
+            if normalized in self._entries:
+                self._remove(normalized)
+            self._entries[normalized] = {
+                "answer": answer,
+                "grams": grams,
+                "guard": guard_tokens(normalized),
+                "expires_at": time.monotonic() + (self.ttl if ttl is None else ttl),
+            }
+            for gram in grams:
+                self._doc_freq[gram] += 1
+                self._postings.setdefault(gram, set()).add(normalized)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["guard_misses"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["similar_hits"]) / lookups if lookups else 0.0
+        stats["threshold"] = self.threshold
+        return stats
+
+
+_diagnosis_cache = None
+_diagnosis_cache_lock = threading.Lock()
+_followup_cache = None
+
+
+# Process-wide diagnosis cache
+def get_diagnosis_cache():
+    global _diagnosis_cache
+    if _diagnosis_cache is None:
+        with _diagnosis_cache_lock:
+            if _diagnosis_cache is None:
+                collection = None
+                if DIAGNOSIS_CACHE_SHARED:
+                    from services.database import get_database
+                    collection = get_database()[DIAGNOSIS_CACHE_COLLECTION]
+                _diagnosis_cache = DiagnosisCache(collection=collection)
+    return _diagnosis_cache
+
+
+# Process-wide follow-up question cache
+def get_followup_cache():
+    global _followup_cache
+    if _followup_cache is None:
+        with _diagnosis_cache_lock:
+            if _followup_cache is None:
+                _followup_cache = FollowupCache()
+    return _followup_cache
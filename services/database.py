@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+import atexit
+import logging
+import pymongo
+import pymongo.errors
+from pymongo import monitoring
+from dotenv import load_dotenv
+from services.metrics import observe, increment
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DATABASE_NAME = "Aedra_Ai"  # Use the existing Aedra_Ai database
+
+# Connection pool settings - tunable through environment variables
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "20000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGODB_HEARTBEAT_FREQUENCY_MS = int(os.getenv("MONGODB_HEARTBEAT_FREQUENCY_MS", "10000"))
+# Minimum jarak (detik) antar health check ping
+MONGODB_HEALTH_CHECK_INTERVAL = float(os.getenv("MONGODB_HEALTH_CHECK_INTERVAL", "30"))
+
+# Time-series collection untuk event diagnosis (opsional)
+DIAGNOSIS_EVENTS_TIMESERIES = os.getenv("DIAGNOSIS_EVENTS_TIMESERIES", "false").lower() in ("1", "true", "yes")
+DIAGNOSIS_EVENTS_COLLECTION = "diagnosis_events"
+DIAGNOSIS_EVENTS_RETENTION_DAYS = int(os.getenv("DIAGNOSIS_EVENTS_RETENTION_DAYS", "365"))
+
+# Session state eksternal (services/session_store.py) - dokumen tidak aktif dihapus TTL index
+SESSIONS_COLLECTION = "sessions"
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Menghitung event connection pool untuk memantau churn koneksi"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "clients_created": 0,
+            "pools_created": 0,
+            "pools_cleared": 0,
+            "pools_closed": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkins": 0,
+            "checkout_failures": 0,
+        }
+
+    def increment(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["connections_open"] = stats["connections_created"] - stats["connections_closed"]
+        stats["connections_in_use"] = stats["checkouts"] - stats["checkins"]
+        return stats
+
+    def pool_created(self, event):
+        self.increment("pools_created")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.increment("pools_cleared")
+
+    def pool_closed(self, event):
+        self.increment("pools_closed")
+
+    def connection_created(self, event):
+        self.increment("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.increment("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.increment("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self.increment("checkouts")
+
+    def connection_checked_in(self, event):
+        self.increment("checkins")
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Latency setiap command MongoDB ke histogram mongo_command, per nama command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe("mongo_command", event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        observe("mongo_command", event.duration_micros / 1e6, command=event.command_name)
+        increment("mongo_command_errors", command=event.command_name)
+
+
+# Index yang dibutuhkan aplikasi: collection -> [(name, keys, options)]
+REQUIRED_INDEXES = {
+    "history": [
+        # Sidebar history: filter user_id, sort timestamp desc, _id sebagai tie-breaker pagination
+        ("user_id_timestamp", [("user_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], {}),
+    ],
+    "users": [
+        # Login lookup dan registrasi tanpa race; dokumen tanpa username (counter aktivitas) tidak ikut
+        ("username_unique", [("username", pymongo.ASCENDING)], {
+            "unique": True,
+            "partialFilterExpression": {"username": {"$type": "string"}},
+        }),
+        # Counter aktivitas diupdate berdasarkan user_id akun yang login
+        ("user_id_unique", [("user_id", pymongo.ASCENDING)], {
+            "unique": True,
+            "partialFilterExpression": {"user_id": {"$type": "string"}},
+        }),
+    ],
+    SESSIONS_COLLECTION: [
+        # Session yang tidak disentuh selama SESSION_TTL_SECONDS dihapus oleh MongoDB
+        ("updated_at_ttl", [("updated_at", pymongo.ASCENDING)], {"expireAfterSeconds": SESSION_TTL_SECONDS}),
+    ],
+}
+
+
+_pool_listener = PoolStatsListener()
+_command_listener = CommandMetricsListener()
+_client = None
+_client_lock = threading.Lock()
+_health = {"healthy": None, "last_check": 0.0, "latency_ms": None, "error": None}
+_indexes_ensured = False
+# 'collection.name' -> codeName error create_index (mis. IndexOptionsConflict), dilaporkan verify_indexes
+_index_errors = {}
+
+
+# Shared MongoDB client - dibuat sekali per proses dan dipakai ulang di setiap rerun
+def get_mongo_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = pymongo.MongoClient(
+                    os.getenv("MONGODB_URI"),
+                    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                    minPoolSize=MONGODB_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+                    connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                    waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                    heartbeatFrequencyMS=MONGODB_HEARTBEAT_FREQUENCY_MS,
+                    event_listeners=[_pool_listener, _command_listener],
+                    tz_aware=True,  # Timestamp dikembalikan sebagai datetime UTC yang tz-aware
+                )
+                _pool_listener.increment("clients_created")
+    return _client
+
+
+def get_database():
+    return get_mongo_client()[DATABASE_NAME]
+
+
+# Configure MongoDB connection
+def connect_to_mongodb():
+    db = get_database()
+    history_collection = db["history"]  # Access the history collection
+    users_collection = db["users"]      # Access the users collection
+    return history_collection, users_collection
+
+
+def ensure_indexes():
+    """Buat index yang dibutuhkan (sekali per proses); create_index idempotent jika sudah ada"""
+    global _indexes_ensured
+    if _indexes_ensured:
+        return
+    db = get_database()
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        for name, keys, options in indexes:
+            try:
+                db[collection_name].create_index(keys, name=name, **options)
+            except pymongo.errors.DuplicateKeyError as e:
+                # Data lama melanggar index unique - aplikasi tetap jalan, verify_indexes melaporkannya
+                logger.error("Index %s.%s tidak bisa dibuat, data duplikat: %s", collection_name, name, e)
+                _index_errors[f"{collection_name}.{name}"] = "DuplicateKey"
+            except pymongo.errors.OperationFailure as e:
+                # IndexOptionsConflict / IndexKeySpecsConflict: index lama dengan nama, key, atau opsi
+                # berbeda (mis. SESSION_TTL_SECONDS diubah) - perlu drop/collMod manual, aplikasi tetap jalan
+                code_name = (e.details or {}).get("codeName") or str(e.code)
+                logger.error("Index %s.%s bentrok dengan index yang ada (%s): %s", collection_name, name, code_name, e)
+                _index_errors[f"{collection_name}.{name}"] = code_name
+    if DIAGNOSIS_EVENTS_TIMESERIES:
+        ensure_timeseries_collection()
+    _indexes_ensured = True
+
+
+def index_failed(collection_name, name):
+    """True jika ensure_indexes tidak bisa membuat index ini (data duplikat atau bentrok dengan index lama)"""
+    return f"{collection_name}.{name}" in _index_errors
+
+
+def ensure_timeseries_collection():
+    """Buat time-series collection diagnosis_events (metaField user_id) jika belum ada"""
+    db = get_database()
+    if DIAGNOSIS_EVENTS_COLLECTION in db.list_collection_names(filter={"name": DIAGNOSIS_EVENTS_COLLECTION}):
+        return db[DIAGNOSIS_EVENTS_COLLECTION]
+    try:
+        return db.create_collection(
+            DIAGNOSIS_EVENTS_COLLECTION,
+            timeseries={"timeField": "timestamp", "metaField": "user_id", "granularity": "minutes"},
+            expireAfterSeconds=DIAGNOSIS_EVENTS_RETENTION_DAYS * 86400,
+        )
+    except pymongo.errors.CollectionInvalid:
+        # Dibuat oleh proses lain di antara pengecekan dan create
+        return db[DIAGNOSIS_EVENTS_COLLECTION]
+
+
+def verify_indexes():
+    """Kembalikan daftar index yang belum ada atau berbeda, format 'collection.name' (+ error create_index)"""
+    db = get_database()
+    missing = []
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        existing = db[collection_name].index_information()
+        for name, keys, options in indexes:
+            label = f"{collection_name}.{name}"
+            index = existing.get(name)
+            if index is None or index["key"] != keys or any(index.get(option) != value for option, value in options.items()):
+                error = _index_errors.get(label)
+                missing.append(f"{label} ({error})" if error else label)
+    return missing
+
+
+def check_health(force=False):
+    """Ping MongoDB, paling sering sekali per MONGODB_HEALTH_CHECK_INTERVAL detik"""
+    now = time.monotonic()
+    if not force and _health["healthy"] is not None and now - _health["last_check"] < MONGODB_HEALTH_CHECK_INTERVAL:
+        return _health["healthy"]
+
+    start = time.perf_counter()
+    try:
+        get_mongo_client().admin.command("ping")
+        _health.update(healthy=True, latency_ms=(time.perf_counter() - start) * 1000, error=None)
+    except Exception as e:
+        _health.update(healthy=False, latency_ms=None, error=str(e))
+    _health["last_check"] = now
+    return _health["healthy"]
+
+
+def get_pool_stats():
+    """Statistik connection pool dan hasil health check terakhir"""
+    stats = _pool_listener.snapshot()
+    stats["max_pool_size"] = MONGODB_MAX_POOL_SIZE
+    stats["healthy"] = _health["healthy"]
+    stats["ping_latency_ms"] = _health["latency_ms"]
+    stats["last_error"] = _health["error"]
+    return stats
+
+
+def close_mongo_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_mongo_client)
@@ -0,0 +1,442 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import random
+import threading
+import functools
+from collections import deque
+from dotenv import load_dotenv
+from services.metrics import timed, observe, increment
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Model settings
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+GEMINI_TEMPERATURE = os.getenv("GEMINI_TEMPERATURE")
+GEMINI_MAX_OUTPUT_TOKENS = os.getenv("GEMINI_MAX_OUTPUT_TOKENS")
+# JSON, contoh: {"HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_ONLY_HIGH"}
+GEMINI_SAFETY_SETTINGS = os.getenv("GEMINI_SAFETY_SETTINGS")
+GEMINI_WARMUP = os.getenv("GEMINI_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Rate limit settings - sesuaikan dengan kuota Gemini API (GEMINI_REQUESTS_PER_MINUTE=0: tanpa rate limit lokal)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "5"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))  # detik
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "10.0"))  # detik
+GEMINI_CALL_TIMEOUT = float(os.getenv("GEMINI_CALL_TIMEOUT", "30"))  # deadline per request
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "20"))  # maksimal menunggu giliran
+# Single-flight: request dengan prompt sama yang sedang berjalan dipakai bersama, bukan dikirim ulang
+GEMINI_SINGLE_FLIGHT = os.getenv("GEMINI_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+GEMINI_SINGLE_FLIGHT_TIMEOUT = float(os.getenv("GEMINI_SINGLE_FLIGHT_TIMEOUT", "90"))  # detik per key
+
+
+# google.api_core (grpc, protobuf) baru di-import saat request Gemini pertama - halaman login tidak membayarnya
+@functools.lru_cache(maxsize=None)
+def api_exceptions():
+    from google.api_core import exceptions
+    return exceptions
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors():
+    exceptions = api_exceptions()
+    return (exceptions.ResourceExhausted, exceptions.DeadlineExceeded, exceptions.ServiceUnavailable, exceptions.InternalServerError)
+
+
+def describe_gemini_error(error):
+    """Pesan error Gemini untuk ditampilkan ke user"""
+    exceptions = api_exceptions()
+    if isinstance(error, exceptions.ResourceExhausted):
+        return "❌ Kuota Gemini API habis atau batas rate tercapai. Coba lagi nanti."
+    if isinstance(error, exceptions.DeadlineExceeded):
+        return "❌ Permintaan ke Gemini API timeout. Koneksi mungkin lambat atau server sibuk."
+    return f"Error calling Gemini API: {error}"
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` token per detik, maksimal `capacity` token"""
+
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"TokenBucket butuh rate > 0 dan capacity >= 1 (rate={rate}, capacity={capacity})")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class FlightTimeout(TimeoutError):
+    """Follower menunggu request yang sama melewati deadline key"""
+
+
+class FlightAbandoned(RuntimeError):
+    """Sesi leader berhenti sebelum request selesai dan tidak ada follower yang menunggu"""
+
+
+# Key single-flight: prompt dengan spasi dirapikan dan huruf kecil, plus model dan opsi request
+def prompt_key(model, prompt, options):
+    text = re.sub(r"\s+", " ", str(prompt)).strip().casefold()
+    payload = json.dumps([getattr(model, "model_name", None), text, options], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """Satu request upstream yang sedang berjalan; follower membaca chunk dan hasil yang sama"""
+
+    def __init__(self, timeout):
+        self.deadline = time.monotonic() + timeout
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self):
+        """Chunk leader saat tiba; error leader dilempar ulang, FlightTimeout setelah deadline key"""
+        index = 0
+        while True:
+            with self._cond:
+                while index == len(self.chunks) and not self.done:
+                    remaining = self.deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise FlightTimeout("Menunggu request Gemini yang sama melewati batas waktu")
+                    self._cond.wait(remaining)
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(chunks)
+            yield from chunks
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Peta key -> Flight yang sedang berjalan; pemanggil pertama menjadi leader"""
+
+    def __init__(self, timeout=GEMINI_SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """(flight, is_leader)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight(self.timeout)
+            return flight, True
+
+    def complete(self, key, flight, error=None):
+        # Lepas dari peta dulu - pemanggil berikutnya memulai request baru (atau kena cache diagnosis/follow-up)
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    def abandon(self, key, flight):
+        """Leader berhenti: tutup flight jika belum ada follower (True); False = request harus diselesaikan untuk follower"""
+        with self._lock:
+            # Dicek di bawah lock yang sama dengan join - follower tidak bisa masuk setelah flight ditutup
+            if flight.followers:
+                return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(FlightAbandoned("Request Gemini dihentikan"))
+        return True
+
+    def __len__(self):
+        return len(self._flights)
+
+
+class GeminiClient:
+    """Wrapper Gemini dengan token bucket, batas concurrency, retry + jitter, dan metrik"""
+
+    def __init__(self, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, burst=GEMINI_BURST,
+                 max_concurrency=GEMINI_MAX_CONCURRENCY, max_retries=GEMINI_MAX_RETRIES,
+                 single_flight=GEMINI_SINGLE_FLIGHT, single_flight_timeout=GEMINI_SINGLE_FLIGHT_TIMEOUT):
+        # Tanpa bucket jika rate 0 - hanya batas concurrency yang berlaku
+        self.bucket = TokenBucket(requests_per_minute / 60.0, max(1, burst)) if requests_per_minute > 0 else None
+        self.single_flight = SingleFlight(single_flight_timeout) if single_flight else None
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=500)
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "retries": 0,
+            "failures": 0,
+            "fallbacks": 0,
+            "queue_timeouts": 0,
+            "in_flight": 0,
+            "coalesced": 0,
+            "coalesce_timeouts": 0,
+            "flights_detached": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def record_fallback(self):
+        self._count("fallbacks")
+
+    def _backoff(self, attempt):
+        # Full jitter exponential backoff
+        return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+    def _acquire_slot(self):
+        """Tunggu token rate limit dan slot concurrency; lempar ResourceExhausted jika terlalu lama"""
+        start = time.perf_counter()
+        deadline = start + GEMINI_QUEUE_TIMEOUT
+        if (self.bucket is not None and not self.bucket.acquire(timeout=GEMINI_QUEUE_TIMEOUT)) or \
+                not self.semaphore.acquire(timeout=max(0.0, deadline - time.perf_counter())):
+            self._count("queue_timeouts")
+            raise api_exceptions().ResourceExhausted("Antrean Gemini lokal penuh (rate limit aplikasi)")
+        with self._lock:
+            self._queue_waits.append(time.perf_counter() - start)
+            self.stats["in_flight"] += 1
+
+    def _release_slot(self):
+        self.semaphore.release()
+        self._count("in_flight", -1)
+
+    def _follow(self, flight, mode):
+        """Ikuti request leader dengan prompt sama - tidak memakai token rate limit maupun slot"""
+        self._count("coalesced")
+        increment("gemini_coalesced", mode=mode)
+        try:
+            yield from flight.follow()
+        except FlightTimeout as e:
+            self._count("coalesce_timeouts")
+            raise api_exceptions().DeadlineExceeded(str(e)) from e
+
+    def _finish_detached(self, key, flight, chunks, mode):
+        """Sesi leader berhenti tapi follower masih menunggu - request diselesaikan di thread terpisah"""
+        self._count("flights_detached")
+        increment("gemini_flights_detached", mode=mode)
+
+        def run():
+            try:
+                for text in chunks():
+                    flight.publish(text)
+            except Exception as e:
+                self.single_flight.complete(key, flight, e)
+            else:
+                self.single_flight.complete(key, flight)
+
+        threading.Thread(target=run, name="gemini-flight", daemon=True).start()
+
+    @timed("gemini_request", mode="generate")
+    def generate(self, model, prompt, **kwargs):
+        """generate_content dengan retry; mengembalikan teks response"""
+        if self.single_flight is None:
+            return self._generate(model, prompt, **kwargs)
+        key = prompt_key(model, prompt, kwargs)
+        flight, leader = self.single_flight.join(key)
+        if not leader:
+            return "".join(self._follow(flight, "generate"))
+        try:
+            text = self._generate(model, prompt, **kwargs)
+        except Exception as e:
+            self.single_flight.complete(key, flight, e)
+            raise
+        except BaseException:
+            # Sesi leader dihentikan di tengah request - follower mendapat request ulang, bukan error
+            if not self.single_flight.abandon(key, flight):
+                self._finish_detached(key, flight, lambda: [self._generate(model, prompt, **kwargs)], "generate")
+            raise
+        flight.publish(text)
+        self.single_flight.complete(key, flight)
+        return text
+
+    def _generate(self, model, prompt, **kwargs):
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._acquire_slot()
+            try:
+                response = model.generate_content(prompt, request_options={"timeout": GEMINI_CALL_TIMEOUT}, **kwargs)
+                text = response.text
+                self._count("successes")
+                return text
+            except retryable_errors():
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+            except Exception:
+                self._count("failures")
+                raise
+            finally:
+                self._release_slot()
+            self._count("retries")
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    @timed("gemini_request", mode="stream")
+    def stream(self, model, prompt, **kwargs):
+        """Streaming generate_content; retry hanya sebelum chunk pertama diterima"""
+        if self.single_flight is None:
+            yield from self._stream(model, prompt, **kwargs)
+            return
+        # Key sama dengan generate: follower stream bisa mengikuti leader generate dan sebaliknya
+        key = prompt_key(model, prompt, kwargs)
+        flight, leader = self.single_flight.join(key)
+        if not leader:
+            yield from self._follow(flight, "stream")
+            return
+        upstream = self._stream(model, prompt, **kwargs)
+        try:
+            for text in upstream:
+                flight.publish(text)
+                yield text
+        except Exception as e:
+            self.single_flight.complete(key, flight, e)
+            raise
+        except BaseException:
+            # GeneratorExit: sesi leader berhenti membaca - sisa stream tetap dibaca untuk follower
+            if self.single_flight.abandon(key, flight):
+                upstream.close()
+            else:
+                self._finish_detached(key, flight, lambda: upstream, "stream")
+            raise
+        self.single_flight.complete(key, flight)
+
+    def _stream(self, model, prompt, **kwargs):
+        self._count("calls")
+        request_start = time.perf_counter()
+        attempt = 0
+        while True:
+            started = False
+            self._acquire_slot()
+            try:
+                for chunk in model.generate_content(prompt, stream=True, request_options={"timeout": GEMINI_CALL_TIMEOUT}, **kwargs):
+                    if chunk.text:
+                        if not started:
+                            observe("gemini_first_chunk", time.perf_counter() - request_start)
+                        started = True
+                        yield chunk.text
+                self._count("successes")
+                return
+            except retryable_errors():
+                if started or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+            except Exception:
+                self._count("failures")
+                raise
+            finally:
+                self._release_slot()
+            self._count("retries")
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            waits = sorted(self._queue_waits)
+        if self.single_flight is not None:
+            stats["flights_open"] = len(self.single_flight)
+        if waits:
+            stats["queue_wait_p50_ms"] = round(waits[len(waits) // 2] * 1000, 2)
+            stats["queue_wait_p95_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2)
+        return stats
+
+
+_gemini_client = None
+_gemini_client_lock = threading.Lock()
+_gemini_model = None
+_gemini_model_lock = threading.Lock()
+_warmup_thread = None
+
+
+def build_generation_config():
+    config = {}
+    if GEMINI_TEMPERATURE:
+        config["temperature"] = float(GEMINI_TEMPERATURE)
+    if GEMINI_MAX_OUTPUT_TOKENS:
+        config["max_output_tokens"] = int(GEMINI_MAX_OUTPUT_TOKENS)
+    return config or None
+
+
+# Configure Gemini API - model dibuat sekali per proses
+def get_gemini_model():
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_model_lock:
+            if _gemini_model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _gemini_model = genai.GenerativeModel(
+                    GEMINI_MODEL_NAME,
+                    generation_config=build_generation_config(),
+                    safety_settings=json.loads(GEMINI_SAFETY_SETTINGS) if GEMINI_SAFETY_SETTINGS else None,
+                )
+    return _gemini_model
+
+
+def _warm_up():
+    try:
+        # count_tokens membuat transport client dan koneksi tanpa memakai kuota generate
+        get_gemini_model().count_tokens("ping")
+    except Exception as e:
+        logger.warning("Gemini warm-up failed: %s", e)
+
+
+def start_gemini_warmup():
+    """Bangun model dan koneksi Gemini di background saat startup"""
+    global _warmup_thread
+    if not GEMINI_WARMUP or _warmup_thread is not None:
+        return
+    with _gemini_model_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_up, name="gemini-warmup", daemon=True)
+            _warmup_thread.start()
+
+
+# Process-wide Gemini client - token bucket dan semaphore dibagi semua sesi
+def get_gemini_client():
+    global _gemini_client
+    if _gemini_client is None:
+        with _gemini_client_lock:
+            if _gemini_client is None:
+                _gemini_client = GeminiClient()
+    return _gemini_client
@@ -0,0 +1,237 @@
+import os
+import re
+import zlib
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import pymongo
+from bson import ObjectId, Binary
+from services.database import connect_to_mongodb
+from services.metrics import timed
+from services.questionnaire import questions, QUESTION_INDEX, QUESTION_SET_VERSION, QUESTION_SETS, welcome_message, FOLLOWUP_INVITATION
+
+# Zona waktu untuk menampilkan jam di sidebar
+DISPLAY_TIMEZONE = ZoneInfo(os.getenv("DISPLAY_TIMEZONE", "Asia/Jakarta"))
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+HISTORY_PAGE_SIZE = 10
+# Umur cache label history per sesi (detik) sebelum query ulang
+HISTORY_CACHE_TTL = 60
+
+# Pesan chat yang ditahan di session state; turn yang lebih lama dimuat dari history saat diminta
+TRANSCRIPT_MAX_MESSAGES = int(os.getenv("TRANSCRIPT_MAX_MESSAGES", "40"))
+# Jumlah entry history per klik "Muat pesan sebelumnya"
+TRANSCRIPT_PAGE_SIZE = int(os.getenv("TRANSCRIPT_PAGE_SIZE", "5"))
+
+# Projection ringan untuk label sidebar - tanpa conversation dan diagnosis
+HISTORY_LABEL_PROJECTION = {
+    "type": 1,
+    "timestamp": 1,
+    "question": 1,
+    "risk_level": 1,
+    "_id": 1,
+}
+
+# Skema ringkas: indeks pertanyaan + versi daftar pertanyaan, teks LLM disimpan sekali, tanpa array conversation
+HISTORY_SCHEMA_VERSION = 2
+# Kompresi zlib untuk teks LLM panjang (diagnosis/answer) - "none" atau "zlib"
+HISTORY_COMPRESSION = os.getenv("HISTORY_COMPRESSION", "none").lower()
+HISTORY_COMPRESS_MIN_CHARS = int(os.getenv("HISTORY_COMPRESS_MIN_CHARS", "512"))
+COMPRESSED_SUFFIX = "_z"
+
+# Field yang dibutuhkan untuk membangun ulang percakapan saat entry sidebar diklik (skema lama dan baru)
+HISTORY_ENTRY_PROJECTION = {
+    "type": 1,
+    "timestamp": 1,
+    "mode": 1,
+    "question_set": 1,
+    "answers": 1,
+    "extra_responses": 1,
+    "diagnosis": 1,
+    "diagnosis_z": 1,
+    "question": 1,
+    "answer": 1,
+    "answer_z": 1,
+    "responses": 1,
+    "conversation": 1,
+}
+
+RISK_LEVEL_PATTERN = re.compile(r"Kemungkinan Demam Berdarah:\s*(\w+)")
+
+
+# Ambil tingkat risiko dari teks diagnosis - dipanggil sekali saat menyimpan
+def extract_risk_level(diagnosis_text):
+    match = RISK_LEVEL_PATTERN.search(diagnosis_text or "")
+    return match.group(1) if match else "N/A"
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+# Jam untuk label sidebar - mendukung datetime BSON dan string lama
+def format_history_time(timestamp):
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(DISPLAY_TIMEZONE).strftime("%H:%M:%S")
+    if isinstance(timestamp, str) and " " in timestamp:
+        return timestamp.split(" ")[1]
+    return "No Timestamp"
+
+
+# Konversi timestamp string lama ("%Y-%m-%d %H:%M:%S", waktu lokal server) ke datetime UTC
+def parse_legacy_timestamp(value, source_timezone=timezone.utc):
+    return datetime.strptime(value, LEGACY_TIMESTAMP_FORMAT).replace(tzinfo=source_timezone).astimezone(timezone.utc)
+
+
+@timed()
+def get_history_page(user_id, after=None, limit=HISTORY_PAGE_SIZE):
+    """Satu halaman label history, terbaru dulu. `after` = entry terakhir halaman sebelumnya"""
+    history_collection, _ = connect_to_mongodb()
+    query = {"user_id": user_id}
+    if after is not None:
+        # Cursor-based pagination di atas index (user_id, timestamp, _id)
+        query["$or"] = [
+            {"timestamp": {"$lt": after["timestamp"]}},
+            {"timestamp": after["timestamp"], "_id": {"$lt": after["_id"]}},
+        ]
+        if isinstance(after["timestamp"], datetime):
+            # Timestamp string lama (belum dimigrasi tools/migrate_timestamps.py) diurutkan BSON setelah
+            # semua datetime pada sort menurun, tapi $lt datetime tidak pernah mencocokkan string
+            query["$or"].append({"timestamp": {"$type": "string"}})
+    cursor = history_collection.find(query, HISTORY_LABEL_PROJECTION).sort(
+        [("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+    ).limit(limit)
+    return list(cursor)
+
+
+@timed()
+def load_history_entry(entry_id):
+    """Ambil entry lengkap hanya saat tombol history diklik; percakapan dibangun dengan rebuild_conversation"""
+    history_collection, _ = connect_to_mongodb()
+    return history_collection.find_one({"_id": ObjectId(entry_id)}, HISTORY_ENTRY_PROJECTION)
+
+
+@timed()
+def get_transcript_page(user_id, entry_ids):
+    """Entry lengkap dengan _id persis `entry_ids`, terbaru dulu - turn yang dipotong dari transcript"""
+    if not entry_ids:
+        return []
+    history_collection, _ = connect_to_mongodb()
+    # _id eksplisit, bukan rentang waktu: entry tab lain di antara turn yang dipotong tidak ikut termuat
+    query = {"_id": {"$in": list(entry_ids)}, "user_id": user_id}
+    cursor = history_collection.find(query, HISTORY_ENTRY_PROJECTION).sort(
+        [("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+    )
+    return list(cursor)
+
+
+# Teks LLM: {"diagnosis": text} atau {"diagnosis_z": zlib} jika kompresi aktif dan teks panjang
+def encode_text(field, text, compression=HISTORY_COMPRESSION):
+    if compression == "zlib" and len(text) >= HISTORY_COMPRESS_MIN_CHARS:
+        return {field + COMPRESSED_SUFFIX: Binary(zlib.compress(text.encode("utf-8"), 6))}
+    return {field: text}
+
+
+def read_text(doc, field, default=""):
+    compressed = doc.get(field + COMPRESSED_SUFFIX)
+    if compressed is not None:
+        return zlib.decompress(compressed).decode("utf-8")
+    return doc.get(field, default)
+
+
+# user_responses -> [[indeks pertanyaan, jawaban]]; pertanyaan di luar daftar disimpan apa adanya
+def encode_answers(responses):
+    answers, extra = [], {}
+    for question, answer in responses.items():
+        i = QUESTION_INDEX.get(question)
+        if i is None:
+            extra[question] = answer
+        else:
+            answers.append([i, answer])
+    answers.sort()
+    return answers, extra
+
+
+def decode_responses(doc):
+    """user_responses dari dokumen history, skema lama (responses) maupun baru (answers)"""
+    if "answers" not in doc:
+        return doc.get("responses") or {}
+    question_list = QUESTION_SETS.get(doc.get("question_set"), questions)
+    responses = {question_list[i]: answer for i, answer in doc["answers"]}
+    responses.update(doc.get("extra_responses") or {})
+    return responses
+
+
+def build_diagnosis_record(user_id, responses, diagnosis, mode, timestamp):
+    answers, extra = encode_answers(responses)
+    record = {
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "type": "dengue_diagnosis",
+        "schema_version": HISTORY_SCHEMA_VERSION,
+        "question_set": QUESTION_SET_VERSION,
+        "answers": answers,
+        "risk_level": extract_risk_level(diagnosis),  # Precomputed label for the sidebar
+        "mode": mode,
+    }
+    if extra:
+        record["extra_responses"] = extra
+    record.update(encode_text("diagnosis", diagnosis))
+    return record
+
+
+def build_followup_record(user_id, question, answer, mode, timestamp):
+    record = {
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "type": "followup_question",
+        "schema_version": HISTORY_SCHEMA_VERSION,
+        "question": question,
+        "mode": mode,
+    }
+    record.update(encode_text("answer", answer))
+    return record
+
+
+def rebuild_conversation(doc):
+    """Pesan chat untuk entry history - dokumen lama masih menyimpan array conversation"""
+    if "conversation" in doc:
+        return doc["conversation"]
+    if doc.get("type") == "followup_question":
+        return [
+            {"role": "user", "content": doc.get("question", "")},
+            {"role": "assistant", "content": read_text(doc, "answer")},
+        ]
+
+    question_list = QUESTION_SETS.get(doc.get("question_set"), questions)
+    conversation = [{"role": "assistant", "content": welcome_message(doc.get("mode") == "testing")}]
+    for i, answer in doc.get("answers", []):
+        conversation.append({"role": "assistant", "content": question_list[i]})
+        conversation.append({"role": "user", "content": answer})
+    conversation.append({"role": "assistant", "content": read_text(doc, "diagnosis")})
+    conversation.append({"role": "assistant", "content": FOLLOWUP_INVITATION})
+    return conversation
+
+
+def backfill_risk_levels(batch_size=500):
+    """Isi risk_level untuk dokumen diagnosis lama yang belum memilikinya"""
+    history_collection, _ = connect_to_mongodb()
+    cursor = history_collection.find(
+        {"type": "dengue_diagnosis", "risk_level": {"$exists": False}},
+        {"diagnosis": 1, "diagnosis_z": 1},
+        batch_size=batch_size,
+    )
+    updated = 0
+    ops = []
+    for doc in cursor:
+        ops.append(pymongo.UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"risk_level": extract_risk_level(read_text(doc, "diagnosis"))}},
+        ))
+        if len(ops) >= batch_size:
+            updated += history_collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += history_collection.bulk_write(ops, ordered=False).modified_count
+    return updated
@@ -0,0 +1,246 @@
+import os
+import time
+import logging
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "aedra"
+# Endpoint Prometheus (GET /metrics) - kosong = tidak dijalankan
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Dump metrik ke log setiap N detik - 0 = tidak aktif
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "0"))
+# Panel profiler per rerun di sidebar, juga bisa diaktifkan dari Mode Testing
+PROFILER_PANEL = os.getenv("PROFILER_PANEL", "false").lower() in ("1", "true", "yes")
+PROFILER_TOP_N = 15
+
+# Batas bucket histogram latency (detik)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Batas bucket histogram ukuran (byte) - mis. memori transcript per sesi
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Histogram kumulatif gaya Prometheus"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, unit="seconds"):
+        self.buckets = buckets
+        self.unit = unit
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Histogram latency dan counter per (nama, label) - thread-safe, dibagi semua sesi"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS, unit="seconds"):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets, unit)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, labels=()):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+    def snapshot(self):
+        """Ringkasan untuk log / st.json: count, rata-rata, dan total per metrik"""
+        with self._lock:
+            summary = {}
+            for (name, labels), histogram in self.histograms.items():
+                if histogram.unit == "seconds":
+                    summary[_series_name(name, labels)] = {
+                        "count": histogram.count,
+                        "avg_ms": round(histogram.sum / histogram.count * 1000, 2),
+                        "total_s": round(histogram.sum, 3),
+                    }
+                else:
+                    summary[_series_name(name, labels)] = {
+                        "count": histogram.count,
+                        f"avg_{histogram.unit}": round(histogram.sum / histogram.count, 1),
+                    }
+            for (name, labels), value in self.counters.items():
+                summary[_series_name(name, labels)] = value
+        return summary
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        declared = set()
+        for (name, labels), histogram in histograms:
+            metric = f"{METRICS_PREFIX}_{name}_{histogram.unit}"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} histogram")
+                declared.add(metric)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', _format_bound(bound)),))} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _format_bound(bound):
+    return str(bound) if isinstance(bound, int) else f"{bound:g}"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series_name(name, labels):
+    return name + (_format_labels(labels) if labels else "")
+
+
+_registry = MetricsRegistry()
+# Streamlit menjalankan script setiap sesi di thread sendiri - profil rerun disimpan per thread
+_rerun_profile = threading.local()
+
+
+def get_registry():
+    return _registry
+
+
+def increment(name, amount=1, **labels):
+    _registry.increment(name, amount, tuple(sorted(labels.items())))
+
+
+def observe(name, seconds, **labels):
+    _registry.observe(name, seconds, tuple(sorted(labels.items())))
+
+
+def observe_size(name, num_bytes, **labels):
+    _registry.observe(name, num_bytes, tuple(sorted(labels.items())), SIZE_BUCKETS, "bytes")
+
+
+def start_rerun_profile():
+    """Mulai mencatat span untuk rerun yang sedang berjalan di thread ini"""
+    _rerun_profile.spans = []
+
+
+def get_rerun_profile(limit=PROFILER_TOP_N):
+    """Span paling lambat pada rerun ini"""
+    spans = getattr(_rerun_profile, "spans", None) or []
+    rows = [{"fungsi": name, "durasi_ms": round(seconds * 1000, 2), "error": failed} for name, seconds, failed in spans]
+    return sorted(rows, key=lambda row: row["durasi_ms"], reverse=True)[:limit]
+
+
+@contextmanager
+def track(name, **labels):
+    """Catat latency blok ke histogram `name` dan ke profil rerun aktif"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        increment(f"{name}_errors", **labels)
+        raise
+    finally:
+        # finally tetap jalan saat st.rerun() / st.stop() melempar exception
+        seconds = time.perf_counter() - start
+        observe(name, seconds, **labels)
+        spans = getattr(_rerun_profile, "spans", None)
+        if spans is not None:
+            spans.append((_series_name(name, tuple(sorted(labels.items()))), seconds, failed))
+
+
+def timed(name=None, **labels):
+    """Decorator `track`; untuk generator, durasi dihitung sampai stream habis"""
+    def decorator(func):
+        metric = name or func.__name__
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with track(metric, **labels):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(metric, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrape Prometheus tidak perlu masuk log
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def _log_metrics_forever(interval):
+    while True:
+        time.sleep(interval)
+        logger.info("metrics %s", _registry.snapshot())
+
+
+def start_metrics_exporters():
+    """Jalankan endpoint /metrics dan/atau dump log periodik (sekali per proses)"""
+    global _exporters_started
+    if _exporters_started:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        if METRICS_PORT:
+            try:
+                server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            except OSError as e:
+                logger.warning("Metrics endpoint tidak bisa dijalankan di port %s: %s", METRICS_PORT, e)
+        if METRICS_LOG_INTERVAL > 0:
+            threading.Thread(target=_log_metrics_forever, args=(METRICS_LOG_INTERVAL,), name="metrics-log", daemon=True).start()
+        _exporters_started = True
@@ -0,0 +1,158 @@
+import os
+import time
+
+# Simulasi latency response MOCK (detik) - set 0 untuk load test
+MOCK_RESPONSE_DELAY = float(os.getenv("MOCK_RESPONSE_DELAY", "1.0"))
+MOCK_STREAM_DELAY = float(os.getenv("MOCK_STREAM_DELAY", "0.02"))  # per kata
+
+
+# MOCK RESPONSES untuk testing - tanpa Gemini
+def get_mock_diagnosis(responses, user_id="unknown"):
+    """Memberikan diagnosis palsu untuk testing database"""
+    
+    # Hitung score berdasarkan jawaban
+    risk_score = 0
+    total_questions = len(responses)
+    
+    for question, answer in responses.items():
+        if "ya" in answer.lower():
+            risk_score += 2
+        elif "sering" in answer.lower() or "parah" in answer.lower():
+            risk_score += 2
+        elif "kadang" in answer.lower() or "sedang" in answer.lower():
+            risk_score += 1
+        elif "lebih dari 3 hari" in answer.lower():
+            risk_score += 2
+        elif "2-3 hari" in answer.lower():
+            risk_score += 1
+    
+    # Tentukan tingkat risiko
+    risk_percentage = (risk_score / (total_questions * 2)) * 100
+    
+    if risk_percentage >= 70:
+        risk_level = "TINGGI"
+        color_icon = "🔴"
+    elif risk_percentage >= 40:
+        risk_level = "SEDANG" 
+        color_icon = "🟡"
+    else:
+        risk_level = "RENDAH"
+        color_icon = "🟢"
+    
+    diagnosis = f"""
+**{color_icon} HASIL ANALISIS GEJALA DEMAM BERDARAH (MODE TESTING)**
+
+**Kemungkinan Demam Berdarah: {risk_level}**
+*Score: {risk_score}/{total_questions * 2} ({risk_percentage:.1f}%)*
+
+🩺 **Tindakan yang Direkomendasikan:**
+- {"Segera konsultasi dengan dokter atau kunjungi rumah sakit" if risk_percentage >= 70 else "Konsultasi dengan dokter untuk pemeriksaan lebih lanjut" if risk_percentage >= 40 else "Pantau gejala dan istirahat yang cukup"}
+- Perbanyak minum air putih untuk mencegah dehidrasi
+- Istirahat yang cukup
+- Pantau suhu tubuh secara berkala
+
+⚠️ **Tanda Peringatan Penting:**
+- Nyeri perut yang hebat dan terus-menerus
+- Muntah terus-menerus (lebih dari 3x dalam sehari)  
+- Perdarahan dari hidung, gusi, atau bintik merah di kulit
+- Sesak napas atau kesulitan bernapas
+- Penurunan kesadaran atau gelisah
+
+🚨 **Segera Cari Bantuan Medis Jika:**
+- Demam tinggi tidak turun setelah 3 hari
+- Muncul tanda-tanda perdarahan
+- Muntah darah atau BAB berdarah
+- Pingsan atau penurunan kesadaran
+
+**📝 Catatan Testing:**
+- Ini adalah response MOCK untuk testing database
+- Data telah disimpan ke MongoDB
+- Timestamp: {time.strftime("%Y-%m-%d %H:%M:%S")}
+- User ID: {user_id}
+
+⚠️ **Disclaimer:** Hasil ini hanya untuk testing sistem. Konsultasi dengan tenaga medis profesional untuk diagnosis yang akurat.
+"""
+    
+    return diagnosis
+
+def get_mock_followup_answer(question):
+    """Memberikan jawaban palsu untuk pertanyaan lanjutan"""
+    
+    question_lower = question.lower()
+    
+    if any(word in question_lower for word in ['pencegahan', 'cegah', 'hindari']):
+        return """
+**PENCEGAHAN DEMAM BERDARAH (MODE TESTING)**
+
+🏠 **3M Plus:**
+- **Menguras:** Bak mandi, tandon air minimal 1 minggu sekali
+- **Menutup:** Tempat penampungan air rapat-rapat
+- **Mengubur:** Barang bekas yang bisa menampung air
+
+➕ **Plus:**
+- Gunakan obat nyamuk/anti nyamuk
+- Pasang kawat kasa di ventilasi
+- Pakai baju lengan panjang
+- Tanam tanaman pengusir nyamuk
+
+*📝 Ini adalah response MOCK untuk testing database*
+"""
+    
+    elif any(word in question_lower for word in ['gejala', 'tanda']):
+        return """
+**GEJALA DEMAM BERDARAH (MODE TESTING)**
+
+🌡️ **Gejala Utama:**
+- Demam tinggi mendadak (38-40°C)
+- Sakit kepala hebat
+- Nyeri di belakang mata
+- Nyeri otot dan sendi
+
+🔍 **Gejala Lanjutan:**
+- Ruam kulit atau bintik merah
+- Mual dan muntah
+- Perdarahan ringan (mimisan, gusi berdarah)
+
+*📝 Ini adalah response MOCK untuk testing database*
+"""
+    
+    elif any(word in question_lower for word in ['obat', 'pengobatan', 'terapi']):
+        return """
+**PENGOBATAN DEMAM BERDARAH (MODE TESTING)**
+
+💊 **Tidak Ada Obat Khusus:**
+- Belum ada obat antiviral spesifik untuk dengue
+- Pengobatan bersifat suportif
+
+🏥 **Perawatan:**
+- Istirahat total
+- Minum banyak air putih
+- Kompres untuk menurunkan demam
+- Pantau jumlah trombosit
+
+⚠️ **Hindari:** Aspirin dan ibuprofen
+
+*📝 Ini adalah response MOCK untuk testing database*
+"""
+    
+    else:
+        return f"""
+**INFORMASI UMUM DEMAM BERDARAH (MODE TESTING)**
+
+Terima kasih atas pertanyaan: "{question}"
+
+🦟 **Tentang Demam Berdarah:**
+- Penyakit yang disebabkan virus dengue
+- Ditularkan melalui gigitan nyamuk Aedes aegypti
+- Masa inkubasi 4-7 hari
+- Bisa menyerang siapa saja
+
+📞 **Untuk informasi lebih lanjut, hubungi:**
+- Puskesmas terdekat
+- Hotline kesehatan daerah
+- Dokter keluarga
+
+*📝 Ini adalah response MOCK untuk testing database - Timestamp: {time.strftime("%Y-%m-%d %H:%M:%S")}*
+
+**Disclaimer:** Ini adalah response untuk testing. Selalu konsultasi dengan tenaga medis profesional.
+"""
@@ -0,0 +1,278 @@
+import os
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from dotenv import load_dotenv
+from services.database import connect_to_mongodb, get_database, DIAGNOSIS_EVENTS_COLLECTION, DIAGNOSIS_EVENTS_TIMESERIES
+from services.metrics import increment
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Background writer settings
+HISTORY_WRITE_ASYNC = os.getenv("HISTORY_WRITE_ASYNC", "true").lower() in ("1", "true", "yes")
+HISTORY_WRITE_BATCH_SIZE = int(os.getenv("HISTORY_WRITE_BATCH_SIZE", "50"))
+HISTORY_WRITE_FLUSH_INTERVAL = float(os.getenv("HISTORY_WRITE_FLUSH_INTERVAL", "1.0"))  # detik
+HISTORY_WRITE_MAX_RETRIES = int(os.getenv("HISTORY_WRITE_MAX_RETRIES", "5"))
+HISTORY_WRITE_BACKOFF_BASE = float(os.getenv("HISTORY_WRITE_BACKOFF_BASE", "0.5"))  # detik
+HISTORY_WRITE_MAX_QUEUE = int(os.getenv("HISTORY_WRITE_MAX_QUEUE", "10000"))
+HISTORY_WRITE_SHUTDOWN_TIMEOUT = float(os.getenv("HISTORY_WRITE_SHUTDOWN_TIMEOUT", "10"))
+HISTORY_WRITE_FLUSH_TIMEOUT = float(os.getenv("HISTORY_WRITE_FLUSH_TIMEOUT", "30"))  # detik
+
+DUPLICATE_KEY_ERROR = 11000
+# Penanda di dokumen history bahwa event diagnosis_events-nya sudah ditulis - backfill melewatinya
+EVENT_LOGGED_FIELD = "event_logged"
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Thread latar belakang yang mem-batch penulisan history dan users ke MongoDB"""
+
+    def __init__(self, batch_size=HISTORY_WRITE_BATCH_SIZE, flush_interval=HISTORY_WRITE_FLUSH_INTERVAL,
+                 max_retries=HISTORY_WRITE_MAX_RETRIES, backoff_base=HISTORY_WRITE_BACKOFF_BASE,
+                 max_queue=HISTORY_WRITE_MAX_QUEUE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "history_written": 0,
+            "user_updates_written": 0,
+            "events_written": 0,
+            "batches": 0,
+            "retries": 0,
+            "dropped": 0,
+            "failed_batches": 0,
+            "queue_full": 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            self._count("enqueued")
+        except queue.Full:
+            # Antrean penuh - tulis langsung supaya data tidak hilang
+            self._count("queue_full")
+            self._write_safely([item])
+
+    def enqueue_history(self, record):
+        """Masukkan dokumen history ke antrean; _id diisi di sini agar retry tetap idempotent"""
+        record.setdefault("_id", ObjectId())
+        self._put(("history", record))
+        return record["_id"]
+
+    def enqueue_user_update(self, filter, update, upsert=False):
+        self._put(("users", UpdateOne(filter, update, upsert=upsert)))
+
+    def enqueue_event(self, event):
+        # _id diisi di sini seperti history - retry tidak membuat event baru dengan _id lain
+        event.setdefault("_id", ObjectId())
+        self._put(("events", event))
+
+    def flush(self, timeout=HISTORY_WRITE_FLUSH_TIMEOUT):
+        """Tunggu sampai semua item yang sudah diantrekan tertulis; False jika timeout atau thread sudah berhenti"""
+        if not self._thread.is_alive():
+            return False
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(0.0, deadline - time.monotonic()))
+
+    def stop(self, timeout=HISTORY_WRITE_SHUTDOWN_TIMEOUT):
+        """Drain antrean lalu hentikan thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["queue_size"] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP or isinstance(item, threading.Event):
+                if batch:
+                    self._write_safely(batch)
+                    batch, deadline = [], None
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            # Flush berdasarkan ukuran batch atau waktu
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_safely(batch)
+                batch, deadline = [], None
+
+    def _write_safely(self, batch):
+        """_write_batch tanpa membunuh thread - error tak terduga membuang satu batch, loop tetap jalan"""
+        try:
+            self._write_batch(batch)
+        except Exception:
+            logger.exception("Dropping history batch of %d writes after unexpected error", len(batch))
+            self._count("dropped", len(batch))
+            self._count("failed_batches")
+            increment("history_batches_failed")
+
+    def _write_batch(self, batch):
+        history_docs = [payload for kind, payload in batch if kind == "history"]
+        user_ops = [payload for kind, payload in batch if kind == "users"]
+        events = [payload for kind, payload in batch if kind == "events"]
+        history_collection, users_collection = connect_to_mongodb()
+
+        if history_docs:
+            written = self._with_retry(
+                history_docs,
+                lambda docs: history_collection.insert_many(docs, ordered=False),
+            )
+            self._count("history_written", written)
+        if user_ops:
+            # $inc tidak idempotent - error yang tidak jelas sudah diterapkan atau belum tidak diulang
+            written = self._with_retry(
+                user_ops,
+                lambda ops: users_collection.bulk_write(ops, ordered=False),
+                idempotent=False,
+            )
+            self._count("user_updates_written", written)
+        if events:
+            events_collection = get_database()[DIAGNOSIS_EVENTS_COLLECTION]
+            # Time-series collection tidak menolak _id ganda - sama seperti $inc, tidak diulang buta
+            written = self._with_retry(
+                events,
+                lambda docs: events_collection.insert_many(docs, ordered=False),
+                idempotent=False,
+            )
+            self._count("events_written", written)
+        self._count("batches")
+
+    def _with_retry(self, items, write, idempotent=True):
+        """Tulis items dengan exponential backoff; hanya item yang gagal yang diulang.
+
+        BulkWriteError menyebut item yang pasti gagal, jadi selalu aman diulang. Error lain (mis. koneksi putus)
+        bisa terjadi setelah sebagian item diterapkan; untuk write yang tidak idempotent item itu dicatat dropped.
+        """
+        pending = list(items)
+        attempt = 0
+        while pending:
+            try:
+                write(pending)
+                pending = []
+            except BulkWriteError as e:
+                failed = {
+                    err["index"] for err in e.details.get("writeErrors", [])
+                    if err.get("code") != DUPLICATE_KEY_ERROR  # Sudah tersimpan di percobaan sebelumnya
+                }
+                pending = [item for i, item in enumerate(pending) if i in failed]
+            except PyMongoError as e:
+                logger.warning("History write failed (attempt %d): %s", attempt + 1, e)
+                if not idempotent:
+                    logger.error("Dropping %d non-idempotent writes after ambiguous error", len(pending))
+                    self._count("dropped", len(pending))
+                    break
+
+            if not pending:
+                break
+            attempt += 1
+            if attempt > self.max_retries:
+                logger.error("Dropping %d history writes after %d retries", len(pending), self.max_retries)
+                self._count("dropped", len(pending))
+                break
+            self._count("retries")
+            time.sleep(self.backoff_base * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+        return len(items) - len(pending)
+
+
+_history_writer = None
+_history_writer_lock = threading.Lock()
+
+
+# Process-wide background writer
+def get_history_writer():
+    global _history_writer
+    if _history_writer is None:
+        with _history_writer_lock:
+            if _history_writer is None:
+                _history_writer = HistoryWriter()
+    return _history_writer
+
+
+# Event ringkas untuk time-series collection diagnosis_events
+def build_diagnosis_event(record):
+    return {
+        "timestamp": record["timestamp"],
+        "user_id": record["user_id"],
+        "type": record["type"],
+        "risk_level": record.get("risk_level"),
+        "mode": record.get("mode"),
+    }
+
+
+def save_history_record(record, user_filter, user_update):
+    """Simpan dokumen history dan update users - async lewat writer, atau langsung jika HISTORY_WRITE_ASYNC=false.
+
+    Counter hanya diupdate pada dokumen akun yang sudah ada (tanpa upsert); user_filter None = sesi tanpa login.
+    """
+    event = build_diagnosis_event(record) if DIAGNOSIS_EVENTS_TIMESERIES and record["type"] == "dengue_diagnosis" else None
+    if event:
+        record[EVENT_LOGGED_FIELD] = True
+    if HISTORY_WRITE_ASYNC:
+        writer = get_history_writer()
+        record_id = writer.enqueue_history(record)
+        if user_filter is not None:
+            writer.enqueue_user_update(user_filter, user_update)
+        if event:
+            writer.enqueue_event(event)
+        return record_id
+
+    history_collection, users_collection = connect_to_mongodb()
+    result = history_collection.insert_one(record)
+    if user_filter is not None:
+        users_collection.update_one(user_filter, user_update)
+    if event:
+        get_database()[DIAGNOSIS_EVENTS_COLLECTION].insert_one(event)
+    return result.inserted_id
+
+
+def shutdown_history_writer():
+    if _history_writer is not None:
+        _history_writer.stop()
+
+
+atexit.register(shutdown_history_writer)
@@ -0,0 +1,135 @@
+import functools
+import numpy as np
+from services.questionnaire import questions, options, SYMPTOM_CATEGORY
+
+# Kata kunci untuk pertanyaan di luar daftar `questions` (mis. riwayat dengan teks pertanyaan lama)
+FALLBACK_CATEGORY_KEYWORDS = [
+    (("demam",), "Demam"),
+    (("mata", "otot", "sendi"), "Nyeri"),
+    (("lelah", "lemas"), "Kelelahan/Kelemasan"),
+    (("mual", "muntah"), "Mual/Muntah"),
+    (("ruam", "bintik"), "Ruam kulit"),
+    (("perdarahan",), "Perdarahan"),
+    (("sakit kepala",), "Sakit kepala"),
+    (("perut",), "Nyeri perut"),
+    (("pusing", "pingsan"), "Pusing/Pingsan"),
+    (("makan", "minum"), "Kesulitan makan/minum"),
+]
+
+DIAGNOSIS_PROMPT_TEMPLATE = """
+            Analisis gejala demam berdarah dalam Bahasa Indonesia:
+            
+            Gejala pasien: {symptom_summary}.
+            {reference_section}
+            Berikan:
+            1. Kemungkinan demam berdarah (Tinggi/Sedang/Rendah)
+            2. Tindakan direkomendasikan
+            3. Tanda peringatan penting
+            4. Kapan mencari bantuan medis
+            
+            Jawaban singkat, jelas, dan menggunakan format Markdown untuk poin-poin.
+            """
+
+FOLLOWUP_PROMPT_TEMPLATE = """
+            Jawab pertanyaan tentang demam berdarah dalam Bahasa Indonesia:
+            
+            Pertanyaan: {question}
+            {reference_section}
+            Berikan jawaban singkat, akurat, dan medis. Jika tidak terkait demam berdarah, 
+            arahkan kembali ke topik demam berdarah.
+            
+            Sertakan disclaimer bahwa ini bukan pengganti konsultasi medis profesional.
+            """
+
+REFERENCE_SECTION_TEMPLATE = """
+            Kasus referensi serupa dari data klinis (konteks saja, bukan data pasien ini):
+{similar_cases}
+            """
+
+
+@functools.lru_cache(maxsize=256)
+def symptom_category(question):
+    """Kategori gejala untuk satu pertanyaan - O(1) untuk pertanyaan standar"""
+    category = SYMPTOM_CATEGORY.get(question)
+    if category is not None:
+        return category
+    question_lower = question.lower()
+    for keywords, fallback in FALLBACK_CATEGORY_KEYWORDS:
+        if any(keyword in question_lower for keyword in keywords):
+            return fallback
+    return "Gejala lain"
+
+
+def build_symptom_summary(responses):
+    return "; ".join(f"{symptom_category(question)}: {answer}" for question, answer in responses.items())
+
+
+def build_symptom_summaries(response_sets):
+    """Ringkasan gejala untuk banyak user_responses sekaligus (re-scoring offline).
+
+    Jawaban tombol di-encode ke matriks indeks opsi; kombinasi yang sama hanya dirender sekali.
+    Set dengan teks bebas atau pertanyaan di luar daftar dirender satu per satu.
+    """
+    response_sets = list(response_sets)
+    summaries = [None] * len(response_sets)
+    option_index = [{option: j for j, option in enumerate(option_list)} for option_list in options]
+    question_position = {question: i for i, question in enumerate(questions)}
+
+    encodable, rows = [], []
+    for n, responses in enumerate(response_sets):
+        # Urutan jawaban ikut di-encode karena menentukan urutan teks ringkasan
+        row = []
+        for question, answer in responses.items():
+            i = question_position.get(question)
+            j = option_index[i].get(answer) if i is not None else None
+            if j is None:
+                row = None
+                break
+            row.append(i * 16 + j)
+        if row is None:
+            summaries[n] = build_symptom_summary(responses)
+        else:
+            encodable.append(n)
+            rows.append(row + [-1] * (len(questions) - len(row)))
+
+    if rows:
+        unique_rows, inverse = np.unique(np.array(rows, dtype=np.int16), axis=0, return_inverse=True)
+        rendered = [
+            "; ".join(f"{symptom_category(questions[code // 16])}: {options[code // 16][code % 16]}" for code in row if code >= 0)
+            for row in unique_rows
+        ]
+        for n, u in zip(encodable, inverse.ravel()):
+            summaries[n] = rendered[u]
+    return summaries
+
+
+def format_reference_section(similar_cases):
+    if not similar_cases:
+        return ""
+    return REFERENCE_SECTION_TEMPLATE.format(similar_cases=similar_cases)
+
+
+@functools.lru_cache(maxsize=1024)
+def render_diagnosis_prompt(symptom_summary, similar_cases=""):
+    return DIAGNOSIS_PROMPT_TEMPLATE.format(
+        symptom_summary=symptom_summary,
+        reference_section=format_reference_section(similar_cases),
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def render_followup_prompt(question, similar_cases=""):
+    return FOLLOWUP_PROMPT_TEMPLATE.format(
+        question=question,
+        reference_section=format_reference_section(similar_cases),
+    )
+
+
+# Build the symptom analysis prompt from user responses
+def build_diagnosis_prompt(responses, similar_cases=""):
+    return render_diagnosis_prompt(build_symptom_summary(responses), similar_cases)
+
+
+# Build the follow-up question prompt
+def build_followup_prompt(question, similar_cases=""):
+    return render_followup_prompt(question, similar_cases)
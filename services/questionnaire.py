@@ -0,0 +1,63 @@
+# Define all questions
+questions = [
+    "Apakah Anda mengalami demam tinggi secara tiba-tiba (di atas 38°C)?",
+    "Sudah berapa hari Anda mengalami demam?",
+    "Apakah Anda merasa nyeri di belakang mata?",
+    "Apakah Anda mengalami nyeri otot atau sendi yang parah (sering disebut 'breakbone fever')?",
+    "Apakah Anda mengalami sakit kepala berat?",
+    "Apakah Anda merasa sangat lelah atau lemas meskipun hanya sedikit aktivitas?",
+    "Apakah Anda mengalami mual atau muntah?",
+    "Apakah Anda mengalami ruam kulit atau bintik-bintik merah?",
+    "Apakah Anda mengalami perdarahan ringan, seperti mimisan atau gusi berdarah?",
+    "Apakah perut Anda terasa nyeri, terutama di bagian bawah kanan?",
+    "Apakah Anda merasa pusing atau ingin pingsan saat berdiri?",
+    "Apakah Anda kesulitan makan atau minum karena merasa mual atau lemas?"
+]
+
+# Options for each question
+options = [
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["1 hari", "2–3 hari", "Lebih dari 3 hari"],
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["Tidak", "Kadang", "Sering"],
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["Ya", "Tidak"],
+    ["Ya", "Tidak", "Tidak Yakin"],
+    ["Ya", "Tidak", "Kadang-kadang"],
+    ["Tidak", "Sedikit", "Parah"]
+]
+
+# Question text -> index, dipakai untuk lookup O(1)
+QUESTION_INDEX = {question: i for i, question in enumerate(questions)}
+
+# Versi daftar pertanyaan - history menyimpan indeks pertanyaan + versi ini, bukan teksnya.
+# Jika teks/urutan pertanyaan berubah, tambahkan versi baru dan simpan daftar lama di QUESTION_SETS.
+QUESTION_SET_VERSION = "q1"
+QUESTION_SETS = {QUESTION_SET_VERSION: questions}
+
+WELCOME_MESSAGE = "Halo! Selamat datang di Aedra{mode_text}. Saya akan membantu Anda menilai gejala-gejala yang mungkin terkait dengan demam berdarah (dengue fever). Mari kita mulai dengan beberapa pertanyaan."
+FOLLOWUP_INVITATION = "Anda dapat bertanya lebih lanjut tentang demam berdarah atau memulai tes baru."
+
+
+def welcome_message(development_mode):
+    return WELCOME_MESSAGE.format(mode_text=" (Mode Testing)" if development_mode else "")
+
+# Kategori gejala untuk ringkasan prompt (urutan sama dengan `questions`)
+SYMPTOM_CATEGORIES = [
+    "Demam tinggi",
+    "Durasi demam",
+    "Nyeri belakang mata",
+    "Nyeri otot/sendi",
+    "Sakit kepala",
+    "Kelelahan/Kelemasan",
+    "Mual/Muntah",
+    "Ruam kulit",
+    "Perdarahan",
+    "Nyeri perut",
+    "Pusing/Pingsan",
+    "Kesulitan makan/minum",
+]
+SYMPTOM_CATEGORY = dict(zip(questions, SYMPTOM_CATEGORIES))
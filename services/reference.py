@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import functools
+import numpy as np
+
+REFERENCE_CSV_PATH = os.getenv("REFERENCE_CSV_PATH", "views/DATA DBD.csv")
+# Dataset hasil build (tools/build_reference_dataset.py): array .npy yang di-memory-map
+REFERENCE_DATASET_DIR = os.getenv("REFERENCE_DATASET_DIR", "views/reference_dataset")
+REFERENCE_DATASET_FORMAT = 1
+REFERENCE_DATASET_ARRAYS = ("symptom_matrix", "duration", "trombosit", "hematokrit", "ns1_positive", "case_ids", "case_counts")
+REFERENCE_COLUMNS = ["Gejalah", "Durasi Gejalah", "Pemeriksaan Laboratorium"]
+REFERENCE_TOP_K = int(os.getenv("REFERENCE_TOP_K", "3"))
+# Bobot kemiripan durasi dibanding kemiripan gejala
+REFERENCE_DURATION_WEIGHT = 0.2
+
+# Kata kunci pertanyaan -> token gejala pada kolom Gejalah
+QUESTION_SYMPTOM_KEYWORDS = [
+    ("demam tinggi", ("demam",)),
+    ("belakang mata", ("nyeri mata",)),
+    ("otot atau sendi", ("nyeri otot", "nyeri sendi")),
+    ("sakit kepala", ("sakit kepala",)),
+    ("lelah", ("lemas",)),
+    ("mual atau muntah", ("mual", "muntah")),
+    ("ruam", ("ruam",)),
+    ("perdarahan", ("perdarahan",)),
+    ("perut", ("nyeri perut",)),
+    ("pusing", ("pusing",)),
+]
+POSITIVE_ANSWERS = ("ya", "kadang", "sering", "sedikit", "parah")
+
+
+@functools.lru_cache(maxsize=64)
+def question_symptoms(question):
+    question = question.lower()
+    for keyword, symptoms in QUESTION_SYMPTOM_KEYWORDS:
+        if keyword in question:
+            return symptoms
+    return ()
+
+
+def is_positive_answer(answer):
+    answer = str(answer).strip().lower()
+    return answer.startswith(POSITIVE_ANSWERS)
+
+
+# "1 hari" -> 1, "2–3 hari" -> 2.5, "Lebih dari 3 hari" -> 4
+def parse_duration_days(answer):
+    answer = str(answer).lower()
+    numbers = [float(n) for n in re.findall(r"\d+(?:[.,]\d+)?", answer.replace(",", "."))]
+    if not numbers:
+        return None
+    if "lebih" in answer:
+        return max(numbers) + 1
+    return sum(numbers) / len(numbers)
+
+
+# Ekstrak gejala dan durasi dari user_responses
+def responses_to_query(responses):
+    symptoms = set()
+    duration = None
+    for question, answer in responses.items():
+        if "berapa hari" in question.lower():
+            duration = parse_duration_days(answer)
+        elif is_positive_answer(answer):
+            symptoms.update(question_symptoms(question))
+    return symptoms, duration
+
+
+class ReferenceIndex:
+    """Index kemiripan kasus dari data referensi - semua operasi vektor numpy, tanpa loop per baris"""
+
+    def __init__(self, symptom_vocab, symptom_matrix, duration, trombosit, hematokrit, ns1_positive, case_ids, case_counts=None,
+                 normalized=False):
+        self.symptom_vocab = symptom_vocab
+        self.vocab_index = {symptom: i for i, symptom in enumerate(symptom_vocab)}
+        if not normalized:
+            norms = np.linalg.norm(symptom_matrix, axis=1, keepdims=True)
+            symptom_matrix = symptom_matrix / np.where(norms == 0, 1, norms)
+        # np.asarray tidak menyalin array memmap yang dtype-nya sudah sesuai
+        self.symptom_matrix = np.asarray(symptom_matrix, dtype=np.float32)
+        self.duration = np.asarray(duration, dtype=np.float32)
+        self.trombosit = np.asarray(trombosit, dtype=np.float32)
+        self.hematokrit = np.asarray(hematokrit, dtype=np.float32)
+        self.ns1_positive = np.asarray(ns1_positive, dtype=bool)
+        self.case_ids = case_ids
+        # Jumlah baris referensi yang identik dengan profil ini
+        self.case_counts = np.ones(len(case_ids), dtype=np.int64) if case_counts is None else case_counts
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.zeros((0, 0)), np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def from_dataframe(cls, df):
+        if df.empty:
+            return cls.empty()
+
+        import pandas as pd  # Hanya jalur CSV yang butuh pandas; dataset memmap tidak
+
+        # Dedup string mentah dulu (hash, murah) supaya parsing hanya pada baris unik
+        raw = df[REFERENCE_COLUMNS].fillna("").astype(str)
+        raw_groups = raw.groupby(REFERENCE_COLUMNS, sort=False).ngroup().to_numpy()
+        raw_counts = np.bincount(raw_groups)
+        raw_first = np.flatnonzero(~raw.duplicated().to_numpy())
+        raw = raw.iloc[raw_first]
+
+        symptoms = (
+            raw["Gejalah"].str.lower()
+            .str.replace(r"\s*,\s*", ",", regex=True)
+            .str.strip(" ,")
+            .str.get_dummies(sep=",")
+        )
+        labs = raw["Pemeriksaan Laboratorium"]
+
+        symptom_matrix = symptoms.to_numpy(dtype=np.float32)
+        duration = pd.to_numeric(raw["Durasi Gejalah"].str.extract(r"(\d+)")[0], errors="coerce").fillna(0).to_numpy()
+        trombosit = pd.to_numeric(labs.str.extract(r"Trombosit:\s*(\d+)")[0], errors="coerce").to_numpy(dtype=np.float64)
+        hematokrit = pd.to_numeric(labs.str.extract(r"Hematokrit:\s*(\d+(?:\.\d+)?)")[0], errors="coerce").to_numpy(dtype=np.float64)
+        ns1_positive = labs.str.contains(r"NS1:\s*positif", case=False, regex=True).to_numpy()
+
+        # Baris yang hanya beda spasi/kapitalisasi digabung menjadi satu profil
+        features = np.column_stack([
+            symptom_matrix, duration, np.nan_to_num(trombosit, nan=-1), np.nan_to_num(hematokrit, nan=-1), ns1_positive,
+        ])
+        _, first, inverse = np.unique(features, axis=0, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=raw_counts).astype(np.int64)
+        order = np.argsort(first)
+        first, counts = first[order], counts[order]
+
+        return cls(
+            symptom_vocab=list(symptoms.columns),
+            symptom_matrix=symptom_matrix[first],
+            duration=duration[first],
+            trombosit=trombosit[first],
+            hematokrit=hematokrit[first],
+            ns1_positive=ns1_positive[first],
+            case_ids=raw_first[first] + 1,
+            case_counts=counts,
+        )
+
+    def save(self, path, source_path=None):
+        """Tulis index sebagai array .npy + manifest.json (manifest ditulis terakhir)"""
+        os.makedirs(path, exist_ok=True)
+        for name in REFERENCE_DATASET_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        manifest = {
+            "format": REFERENCE_DATASET_FORMAT,
+            "symptom_vocab": list(self.symptom_vocab),
+            "cases": len(self),
+            "source": _source_signature(source_path) if source_path else None,
+        }
+        tmp_path = os.path.join(path, "manifest.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, "manifest.json"))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Muat dataset hasil build; dengan mmap, halaman file dibagi semua proses lewat page cache"""
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != REFERENCE_DATASET_FORMAT:
+            raise ValueError(f"Format dataset referensi {manifest.get('format')} tidak didukung")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in REFERENCE_DATASET_ARRAYS}
+        return cls(manifest["symptom_vocab"], normalized=True, **arrays)
+
+    def __len__(self):
+        return len(self.case_ids)
+
+    def query_vector(self, symptoms):
+        vector = np.zeros(len(self.symptom_vocab), dtype=np.float32)
+        for symptom in symptoms:
+            i = self.vocab_index.get(symptom)
+            if i is not None:
+                vector[i] = 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, symptoms, duration=None, k=REFERENCE_TOP_K):
+        """Top-k kasus paling mirip: (indices, scores)"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        vector = self.query_vector(symptoms)
+        if not vector.any() and duration is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = self.symptom_matrix @ vector
+        if duration is not None:
+            duration_score = np.exp(-np.abs(self.duration - duration) / 3.0)
+            scores = (1 - REFERENCE_DURATION_WEIGHT) * scores + REFERENCE_DURATION_WEIGHT * duration_score
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def format_cases(self, indices):
+        """Ringkasan kasus yang padat untuk disisipkan ke prompt"""
+        lines = []
+        for i in indices:
+            present = [self.symptom_vocab[j] for j in np.flatnonzero(self.symptom_matrix[i])]
+            lab = []
+            if not np.isnan(self.trombosit[i]):
+                lab.append(f"Trombosit {self.trombosit[i]:g}")
+            if not np.isnan(self.hematokrit[i]):
+                lab.append(f"Ht {self.hematokrit[i]:g}%")
+            lab.append("NS1 +" if self.ns1_positive[i] else "NS1 -")
+            similar = f" ({self.case_counts[i]} kasus)" if self.case_counts[i] > 1 else ""
+            lines.append(f"- Kasus {self.case_ids[i]}{similar}: {', '.join(present)}; {self.duration[i]:g} hari; {', '.join(lab)}")
+        return "\n".join(lines)
+
+    def similar_cases_for_responses(self, responses, k=REFERENCE_TOP_K):
+        symptoms, duration = responses_to_query(responses)
+        indices, _ = self.search(symptoms, duration, k)
+        return self.format_cases(indices)
+
+    def similar_cases_for_text(self, text, k=REFERENCE_TOP_K):
+        text = text.lower()
+        symptoms = {symptom for symptom in self.symptom_vocab if symptom in text}
+        indices, _ = self.search(symptoms, None, k)
+        return self.format_cases(indices)
+
+
+# Ukuran + mtime CSV sumber, untuk mendeteksi dataset build yang sudah basi
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"path": os.path.basename(source_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def reference_dataset_is_fresh(dataset_dir=REFERENCE_DATASET_DIR, csv_path=REFERENCE_CSV_PATH):
+    try:
+        with open(os.path.join(dataset_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not os.path.exists(csv_path) or manifest.get("source") is None:
+        # Deploy tanpa CSV: dataset build adalah satu-satunya sumber
+        return True
+    return manifest["source"] == _source_signature(csv_path)
+
+
+def open_reference_index(csv_path=REFERENCE_CSV_PATH, dataset_dir=REFERENCE_DATASET_DIR):
+    """Index referensi dari dataset build (memmap) jika masih sesuai CSV, selain itu parse CSV"""
+    if reference_dataset_is_fresh(dataset_dir, csv_path):
+        return ReferenceIndex.load(dataset_dir)
+    import pandas as pd
+    return ReferenceIndex.from_dataframe(pd.read_csv(csv_path))
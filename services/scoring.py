@@ -0,0 +1,223 @@
+import os
+import re
+import numpy as np
+from services.questionnaire import questions, options, QUESTION_INDEX
+from services.cache import normalize_answer
+from services.reference import parse_duration_days
+
+# Pre-triage: jawab langsung kasus yang jelas rendah/tinggi tanpa memanggil Gemini
+PRE_TRIAGE_ENABLED = os.getenv("PRE_TRIAGE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRIAGE_LOW_THRESHOLD = float(os.getenv("TRIAGE_LOW_THRESHOLD", "0.2"))
+TRIAGE_HIGH_THRESHOLD = float(os.getenv("TRIAGE_HIGH_THRESHOLD", "0.75"))
+# Minimal jawaban yang dikenali sebelum hasil dianggap pasti
+TRIAGE_MIN_KNOWN_ANSWERS = int(os.getenv("TRIAGE_MIN_KNOWN_ANSWERS", "10"))
+
+# Bobot tiap pertanyaan (urutan sama dengan `questions`) dan tingkat keparahan tiap opsi (0..1)
+QUESTION_WEIGHTS = [3, 2, 2, 2, 1, 1, 2, 2, 3, 3, 2, 2]
+OPTION_SEVERITY = [
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"1 hari": 0.3, "2–3 hari": 0.7, "Lebih dari 3 hari": 1.0},
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"Tidak": 0.0, "Kadang": 0.5, "Sering": 1.0},
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"Ya": 1.0, "Tidak": 0.0},
+    {"Ya": 1.0, "Tidak": 0.0, "Tidak Yakin": 0.5},
+    {"Ya": 1.0, "Tidak": 0.0, "Kadang-kadang": 0.5},
+    {"Tidak": 0.0, "Sedikit": 0.5, "Parah": 1.0},
+]
+# Demam tinggi dan tanda peringatan (perdarahan, nyeri perut, pusing/pingsan):
+# jawaban positif tidak pernah dianggap pasti risiko rendah
+WARNING_SIGN_QUESTIONS = (0, 8, 9, 10)
+DURATION_QUESTION = 1
+
+# Jawaban teks bebas: kata setelah negasi ("tidak turun", "tidak banyak") dibuang dulu, lalu
+# tanda peringatan dan kata kunci dicek berurutan pada sisa jawaban - yang pertama cocok dipakai.
+# Negasi hanya berarti "tidak" jika tidak ada kata kunci positif di luar kata yang dinegasikan.
+NEGATION_PATTERN = re.compile(r"\b(tidak|tdk|nggak|ngga|gak|enggak|belum|no)\b")
+NEGATED_WORD_PATTERN = re.compile(r"\b(tidak|tdk|nggak|ngga|gak|enggak|belum|no)\s+[\w-]+")
+WARNING_KEYWORDS = re.compile(r"\b(berdarah|darah|perdarahan|pendarahan|mimisan|pingsan|kunang)\w*")
+FREE_TEXT_KEYWORDS = [
+    (WARNING_KEYWORDS, 1.0),
+    (re.compile(r"\b(sering|parah|sangat|banget|terus|berat)\b"), 1.0),
+    (re.compile(r"\b(kadang|sedikit|agak|lumayan|ringan|mungkin)\w*"), 0.5),
+    (re.compile(r"\b(ya|iya|yes|betul|benar|ada)\b"), 1.0),
+]
+
+# Compiled lookup: (question index, normalized option) -> points
+OPTION_POINTS = {
+    (i, normalize_answer(option)): QUESTION_WEIGHTS[i] * severity
+    for i, severities in enumerate(OPTION_SEVERITY)
+    for option, severity in severities.items()
+}
+RAW_OPTION_POINTS = {
+    (i, option): QUESTION_WEIGHTS[i] * severity
+    for i, severities in enumerate(OPTION_SEVERITY)
+    for option, severity in severities.items()
+}
+MAX_POINTS = np.array(QUESTION_WEIGHTS, dtype=np.float32)
+
+# Matriks untuk batch scoring: baris = pertanyaan, kolom = indeks opsi; dua kolom terakhir = tidak dijawab / teks bebas
+MAX_OPTIONS = max(len(option_list) for option_list in options)
+UNKNOWN_OPTION = MAX_OPTIONS
+FREE_TEXT_OPTION = MAX_OPTIONS + 1
+POINTS_MATRIX = np.zeros((len(questions), MAX_OPTIONS + 2), dtype=np.float32)
+KNOWN_MATRIX = np.zeros((len(questions), MAX_OPTIONS + 2), dtype=bool)
+OPTION_INDEX = {}
+for _i, _option_list in enumerate(options):
+    for _j, _option in enumerate(_option_list):
+        POINTS_MATRIX[_i, _j] = OPTION_POINTS[(_i, normalize_answer(_option))]
+        KNOWN_MATRIX[_i, _j] = True
+        OPTION_INDEX[(_i, normalize_answer(_option))] = _j
+
+
+def duration_severity(answer):
+    days = parse_duration_days(answer)
+    if days is None:
+        return None
+    return 0.3 if days <= 1 else 0.7 if days <= 3 else 1.0
+
+
+def free_text_severity(question_index, answer):
+    """Tingkat keparahan dari jawaban teks bebas, atau None jika tidak dikenali"""
+    if question_index == DURATION_QUESTION:
+        return duration_severity(answer)
+    remaining = NEGATED_WORD_PATTERN.sub(" ", answer)
+    for pattern, severity in FREE_TEXT_KEYWORDS:
+        if pattern.search(remaining):
+            return severity
+    if NEGATION_PATTERN.search(answer):
+        return 0.0
+    return None
+
+
+def is_option_answer(question_index, answer):
+    return (question_index, answer) in RAW_OPTION_POINTS or (question_index, normalize_answer(answer)) in OPTION_POINTS
+
+
+def answer_points(question_index, answer):
+    # Jawaban tombol cocok persis dengan teks opsi - tanpa normalisasi
+    points = RAW_OPTION_POINTS.get((question_index, answer))
+    if points is not None:
+        return points
+    normalized = normalize_answer(answer)
+    points = OPTION_POINTS.get((question_index, normalized))
+    if points is not None:
+        return points
+    severity = free_text_severity(question_index, normalized)
+    return None if severity is None else QUESTION_WEIGHTS[question_index] * severity
+
+
+def classify(score, known_answers, warning_sign, free_text=0):
+    if known_answers < TRIAGE_MIN_KNOWN_ANSWERS:
+        return "SEDANG", False
+    if score >= TRIAGE_HIGH_THRESHOLD:
+        return "TINGGI", True
+    # Risiko rendah hanya pasti jika semua jawaban dari tombol - teks bebas selalu dinilai Gemini
+    if score <= TRIAGE_LOW_THRESHOLD and not warning_sign and not free_text:
+        return "RENDAH", True
+    return ("TINGGI" if score >= 0.55 else "SEDANG" if score >= 0.3 else "RENDAH"), False
+
+
+def score_responses(responses):
+    """Skor risiko deterministik dari user_responses.
+
+    Mengembalikan dict: score (0..1), level, decisive (True jika tidak perlu Gemini),
+    known_answers, free_text (jumlah jawaban teks bebas) dan unknown (pertanyaan yang jawabannya tidak dikenali).
+    """
+    points, max_points = 0.0, 0.0
+    warning_sign = False
+    free_text = 0
+    unknown = []
+    for question, answer in responses.items():
+        i = QUESTION_INDEX.get(question)
+        if i is None:
+            continue
+        if not is_option_answer(i, answer):
+            free_text += 1
+        answer_score = answer_points(i, answer)
+        if answer_score is None:
+            unknown.append(question)
+            continue
+        points += answer_score
+        max_points += QUESTION_WEIGHTS[i]
+        if i in WARNING_SIGN_QUESTIONS and answer_score >= QUESTION_WEIGHTS[i]:
+            warning_sign = True
+
+    known_answers = len(responses) - len(unknown)
+    score = points / max_points if max_points else 0.0
+    level, decisive = classify(score, known_answers, warning_sign, free_text)
+    return {
+        "score": score,
+        "level": level,
+        "decisive": decisive,
+        "warning_sign": warning_sign,
+        "known_answers": known_answers,
+        "free_text": free_text,
+        "unknown": unknown,
+    }
+
+
+def encode_responses(responses):
+    """user_responses -> vektor indeks opsi (UNKNOWN_OPTION tidak dijawab, FREE_TEXT_OPTION teks bebas)"""
+    encoded = np.full(len(questions), UNKNOWN_OPTION, dtype=np.int8)
+    for question, answer in responses.items():
+        i = QUESTION_INDEX.get(question)
+        if i is not None:
+            encoded[i] = OPTION_INDEX.get((i, normalize_answer(answer)), FREE_TEXT_OPTION)
+    return encoded
+
+
+def score_batch(encoded):
+    """Skor banyak jawaban sekaligus; `encoded` berbentuk (n, len(questions)) dari encode_responses.
+
+    Hanya jawaban tombol yang dikenali; teks bebas dihitung sebagai tidak dikenal dan, seperti di
+    score_responses, mencegah hasil pasti risiko rendah.
+    """
+    rows = np.arange(len(questions))
+    points = POINTS_MATRIX[rows, encoded]
+    known = KNOWN_MATRIX[rows, encoded]
+    max_points = (known * MAX_POINTS).sum(axis=1)
+    scores = np.divide(points.sum(axis=1), max_points, out=np.zeros(len(encoded), dtype=np.float32), where=max_points > 0)
+    warning = (points[:, WARNING_SIGN_QUESTIONS] >= MAX_POINTS[list(WARNING_SIGN_QUESTIONS)]).any(axis=1)
+    enough = known.sum(axis=1) >= TRIAGE_MIN_KNOWN_ANSWERS
+    free_text = (encoded == FREE_TEXT_OPTION).any(axis=1)
+    decisive = enough & ((scores >= TRIAGE_HIGH_THRESHOLD) | ((scores <= TRIAGE_LOW_THRESHOLD) & ~warning & ~free_text))
+    return scores, decisive
+
+
+def render_triage_diagnosis(result):
+    """Diagnosis Markdown untuk kasus yang sudah pasti rendah/tinggi"""
+    if result["level"] == "TINGGI":
+        color_icon = "🔴"
+        action = "Segera konsultasi dengan dokter atau kunjungi rumah sakit / IGD terdekat"
+    else:
+        color_icon = "🟢"
+        action = "Pantau gejala, istirahat yang cukup, dan periksa ke dokter bila demam muncul atau memburuk"
+
+    return f"""
+**{color_icon} HASIL ANALISIS GEJALA DEMAM BERDARAH**
+
+**Kemungkinan Demam Berdarah: {result["level"]}**
+*Skor triase: {result["score"] * 100:.0f}%*
+
+🩺 **Tindakan yang Direkomendasikan:**
+- {action}
+- Perbanyak minum air putih untuk mencegah dehidrasi
+- Pantau suhu tubuh secara berkala
+
+⚠️ **Tanda Peringatan Penting:**
+- Nyeri perut yang hebat dan terus-menerus
+- Muntah terus-menerus (lebih dari 3x dalam sehari)
+- Perdarahan dari hidung, gusi, atau bintik merah di kulit
+- Penurunan kesadaran atau gelisah
+
+🚨 **Segera Cari Bantuan Medis Jika:**
+- Demam tinggi tidak turun setelah 3 hari
+- Muncul tanda-tanda perdarahan
+- Muntah darah atau BAB berdarah
+
+⚠️ **Disclaimer:** Hasil ini dari penilaian otomatis berbasis jawaban Anda dan bukan pengganti konsultasi dengan tenaga medis profesional.
+"""
@@ -0,0 +1,235 @@
+import os
+import logging
+import secrets
+import threading
+from dotenv import load_dotenv
+from services.cache import TTLCache
+from services.database import get_database, SESSIONS_COLLECTION, SESSION_TTL_SECONDS
+from services.history import encode_answers, decode_responses, utc_now
+from services.questionnaire import QUESTION_SET_VERSION
+from services.metrics import track, increment
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Backend session state: "memory" (per proses) atau "mongodb" (dibagi semua replika, bertahan saat restart)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_MEMORY_MAX_ENTRIES = int(os.getenv("SESSION_MEMORY_MAX_ENTRIES", "10000"))
+# Session id dibawa di URL (?sid=) supaya reconnect ke replika mana pun menemukan state yang sama
+SESSION_QUERY_PARAM = "sid"
+SESSION_SCHEMA_VERSION = 2
+
+# Key st.session_state yang disimpan -> nama field ringkas di dokumen session.
+# Status login (logged_in, user_id, username) sengaja tidak disimpan: ?sid= bukan kredensial,
+# setelah reload user login ulang dan state hanya dipulihkan untuk akun pemiliknya.
+# State UI lain (mode testing, cache sidebar, timer) tetap lokal per proses.
+PERSISTED_KEYS = {
+    "current_question": "q",
+    "user_responses": "r",
+    "messages": "m",
+    "diagnosis_complete": "d",
+    "allow_followup": "f",
+    "transcript_turns": "t",
+    "transcript_trimmed": "x",
+}
+# user_id akun pemilik session
+OWNER_FIELD = "o"
+
+ROLE_CODES = {"assistant": "a", "user": "u"}
+ROLES = {code: role for role, code in ROLE_CODES.items()}
+
+
+# messages -> [[kode role, teks]]
+def encode_messages(messages):
+    return [[ROLE_CODES.get(message["role"], message["role"]), message["content"]] for message in messages]
+
+
+def decode_messages(value):
+    return [{"role": ROLES.get(role, role), "content": content} for role, content in value]
+
+
+# user_responses -> indeks pertanyaan seperti dokumen history skema ringkas
+def encode_user_responses(responses):
+    answers, extra = encode_answers(responses)
+    value = {"v": QUESTION_SET_VERSION, "a": answers}
+    if extra:
+        value["e"] = extra
+    return value
+
+
+def decode_user_responses(value):
+    return decode_responses({"question_set": value.get("v"), "answers": value.get("a", []), "extra_responses": value.get("e")})
+
+
+# Encoder dan decoder selalu membuat objek baru - snapshot tidak ikut berubah saat state dimutasi di tempat
+CODECS = {
+    "messages": (encode_messages, decode_messages),
+    "user_responses": (encode_user_responses, decode_user_responses),
+    "transcript_turns": (
+        lambda turns: [[cursor, count] for cursor, count in turns],
+        lambda value: [(cursor, count) for cursor, count in value],
+    ),
+    "transcript_trimmed": (
+        lambda trimmed: {"ids": list(trimmed["ids"]), "messages": trimmed["messages"]} if trimmed else trimmed,
+        lambda value: {"ids": list(value["ids"]), "messages": value["messages"]} if value else value,
+    ),
+}
+
+
+def encode_value(key, value):
+    codec = CODECS.get(key)
+    return codec[0](value) if codec else value
+
+
+def decode_value(key, value):
+    codec = CODECS.get(key)
+    return codec[1](value) if codec else value
+
+
+class InMemorySessionStore:
+    """Session state per proses (LRU + TTL) - bertahan saat reconnect ke proses yang sama"""
+
+    name = "memory"
+
+    def __init__(self, max_entries=SESSION_MEMORY_MAX_ENTRIES, ttl=SESSION_TTL_SECONDS):
+        self._sessions = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        return dict(self._sessions.get(session_id) or {})
+
+    def save(self, session_id, changed, removed=()):
+        with self._lock:
+            state = dict(self._sessions.get(session_id) or {})
+            state.update(changed)
+            for field in removed:
+                state.pop(field, None)
+            self._sessions.set(session_id, state)
+
+    def delete(self, session_id):
+        self._sessions.delete(session_id)
+
+
+class MongoSessionStore:
+    """Session state di collection sessions - dibagi semua replika, dihapus TTL index setelah tidak aktif"""
+
+    name = "mongodb"
+
+    def __init__(self, collection=None):
+        self.collection = collection if collection is not None else get_database()[SESSIONS_COLLECTION]
+
+    def load(self, session_id):
+        doc = self.collection.find_one({"_id": session_id}, {"v": 1, "s": 1})
+        if not doc or doc.get("v") != SESSION_SCHEMA_VERSION:
+            return {}
+        return doc.get("s") or {}
+
+    def save(self, session_id, changed, removed=()):
+        # Hanya field yang berubah yang ditulis - satu update_one per rerun
+        update = {"$set": {f"s.{field}": value for field, value in changed.items()}}
+        update["$set"].update(v=SESSION_SCHEMA_VERSION, updated_at=utc_now())
+        if removed:
+            update["$unset"] = {f"s.{field}": "" for field in removed}
+        self.collection.update_one({"_id": session_id}, update, upsert=True)
+
+    def delete(self, session_id):
+        self.collection.delete_one({"_id": session_id})
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = MongoSessionStore() if SESSION_STORE == "mongodb" else InMemorySessionStore()
+    return _session_store
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+# Snapshot nilai ter-encode yang terakhir tersimpan, untuk mendeteksi key yang berubah
+SNAPSHOT_KEY = "_session_snapshot"
+# Session id aktif, diisi main.py - fragment memakainya untuk write-through
+SESSION_ID_KEY = "_session_id"
+
+
+def restore_session(state, session_id, owner, store=None):
+    """Setelah login: isi session state dari store jika session milik akun `owner`; True jika dipulihkan"""
+    store = store or get_session_store()
+    stored = {}
+    try:
+        with track("session_restore", backend=store.name):
+            stored = store.load(session_id)
+    except Exception as e:
+        increment("session_store_errors", backend=store.name, operation="load")
+        logger.warning("Session %s tidak bisa dimuat: %s", session_id, e)
+    if stored.get(OWNER_FIELD) != owner:
+        # Session akun lain (mis. link yang dibagikan) - tidak dipulihkan
+        if stored:
+            increment("session_owner_mismatch", backend=store.name)
+        stored = {}
+    for key, field in PERSISTED_KEYS.items():
+        if field in stored:
+            state[key] = decode_value(key, stored[field])
+    state[SNAPSHOT_KEY] = stored
+    return bool(stored)
+
+
+def sync_session(state, session_id, store=None):
+    """Write-through key yang berubah sejak snapshot terakhir; hanya untuk sesi yang sudah login"""
+    owner = state.get("user_id") if state.get("logged_in") else None
+    if owner is None:
+        return
+    store = store or get_session_store()
+    snapshot = state.get(SNAPSHOT_KEY) or {}
+    changed = {} if snapshot.get(OWNER_FIELD) == owner else {OWNER_FIELD: owner}
+    for key, field in PERSISTED_KEYS.items():
+        if key in state:
+            value = encode_value(key, state[key])
+            if field not in snapshot or snapshot[field] != value:
+                changed[field] = value
+    removed = [field for key, field in PERSISTED_KEYS.items() if key not in state and field in snapshot]
+    if not changed and not removed:
+        return
+    try:
+        with track("session_save", backend=store.name):
+            store.save(session_id, changed, removed)
+    except Exception as e:
+        # Sesi tetap jalan dari state lokal; key yang sama dicoba lagi pada rerun berikutnya
+        increment("session_store_errors", backend=store.name, operation="save")
+        logger.warning("Session %s tidak bisa disimpan: %s", session_id, e)
+        return
+    increment("session_fields_written", len(changed), backend=store.name)
+    snapshot = dict(snapshot, **changed)
+    for field in removed:
+        snapshot.pop(field, None)
+    state[SNAPSHOT_KEY] = snapshot
+
+
+def sync_current_session(state, store=None):
+    """sync_session untuk session id aktif - dipakai fragment, yang rerun-nya tidak melewati main.py"""
+    session_id = state.get(SESSION_ID_KEY)
+    if session_id:
+        sync_session(state, session_id, store)
+
+
+def rotate_session(state, session_id, discard_old=True, store=None):
+    """Session id baru setelah login; session lama dihapus hanya jika milik akun ini (discard_old)"""
+    store = store or get_session_store()
+    if discard_old:
+        try:
+            store.delete(session_id)
+        except Exception as e:
+            logger.warning("Session %s tidak bisa dihapus: %s", session_id, e)
+    # Snapshot kosong: sync berikutnya menulis semua key ke dokumen session baru
+    state[SNAPSHOT_KEY] = {}
+    state[SESSION_ID_KEY] = new_session_id()
+    return state[SESSION_ID_KEY]
@@ -0,0 +1,54 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Jumlah sampel terakhir yang disimpan per bagian
+RERUN_TIMING_WINDOW = 50
+
+
+# Jenis rerun: seluruh script, atau hanya satu fragment (klik di dalam @st.fragment)
+FULL_RERUN = "penuh"
+FRAGMENT_RERUN = "fragment"
+
+
+class RerunTimer:
+    """Mencatat durasi setiap bagian script Streamlit per rerun, terpisah untuk rerun penuh dan rerun fragment"""
+
+    def __init__(self, window=RERUN_TIMING_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.calls = {}
+        # Diisi di awal setiap rerun (script atau fragment); bagian yang dicatat memakai scope ini
+        self.scope = FULL_RERUN
+
+    def record(self, name, seconds):
+        key = (name, self.scope)
+        self.samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    @contextmanager
+    def section(self, name):
+        # finally tetap jalan saat st.rerun() / st.stop() melempar exception
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self):
+        """Satu baris per (bagian, jenis rerun) - biaya bagian yang sama saat rerun penuh vs fragment berdampingan"""
+        rows = []
+        for (name, scope), samples in self.samples.items():
+            rows.append({
+                "bagian": name,
+                "rerun": scope,
+                "terakhir_ms": round(samples[-1] * 1000, 2),
+                "rata2_ms": round(sum(samples) / len(samples) * 1000, 2),
+                "maks_ms": round(max(samples) * 1000, 2),
+                "eksekusi": self.calls[(name, scope)],
+            })
+        # Bagian termahal dulu, rerun penuh di atas rerun fragment
+        cost = {}
+        for row in rows:
+            cost[row["bagian"]] = max(cost.get(row["bagian"], 0.0), row["rata2_ms"])
+        return sorted(rows, key=lambda row: (-cost[row["bagian"]], row["bagian"], row["rerun"] != FULL_RERUN))
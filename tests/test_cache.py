@@ -0,0 +1,47 @@
+from services.cache import FollowupCache
+
+AGE_QUESTION = "apakah anak berumur 5 tahun boleh minum paracetamol"
+
+
+def cache_with(question, answer="jawaban"):
+    cache = FollowupCache(max_entries=16, ttl=60, threshold=0.85)
+    cache.set(question, answer)
+    return cache
+
+
+def test_rephrased_question_still_hits():
+    cache = cache_with(AGE_QUESTION)
+    answer, score = cache.lookup("Apakah anak berumur 5 tahun boleh minum paracetamol?")
+    assert answer == "jawaban"
+    answer, score = cache.lookup("apakah anak yang berumur 5 tahun boleh minum paracetamol")
+    assert answer == "jawaban"
+    assert score >= 0.85
+
+
+def test_different_numbers_never_share_an_answer():
+    # Tanpa guard semua pertanyaan ini lolos threshold 0.85
+    cache = cache_with(AGE_QUESTION)
+    for question in (
+        "apakah anak berumur 2 tahun boleh minum paracetamol",
+        "apakah anak berumur 15 tahun boleh minum paracetamol",
+        "apakah anak berumur tahun boleh minum paracetamol",
+    ):
+        assert cache.get(question) is None, question
+    assert cache.get_stats()["guard_misses"] >= 2
+
+
+def test_negation_never_shares_an_answer():
+    # Tanpa guard semua pasangan ini lolos threshold 0.85
+    cache = cache_with("apakah anak yang demam boleh mandi air hangat")
+    for question in (
+        "apakah anak yang demam belum boleh mandi air hangat",
+        "apakah anak yang demam jangan boleh mandi air hangat",
+    ):
+        assert cache.get(question) is None, question
+
+    cache = cache_with("apakah demam boleh dikompres air dingin")
+    assert cache.get("apakah demam tidak boleh dikompres air dingin") is None
+
+    cache = cache_with("apakah nyamuk di rumah saya bukan nyamuk aedes aegypti")
+    assert cache.get("apakah nyamuk di rumah saya nyamuk aedes aegypti") is None
+    assert cache.get("apakah nyamuk di rumah saya bukan nyamuk aedes aegypti ya") == "jawaban"
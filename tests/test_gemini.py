@@ -0,0 +1,54 @@
+import time
+import threading
+import pytest
+from services.gemini import GeminiClient, TokenBucket
+from tools.benchmark_single_flight import FakeModel
+
+PROMPT = "Bagaimana cara pencegahan DBD?"
+
+
+def make_client():
+    return GeminiClient(requests_per_minute=6000, burst=10, max_concurrency=10, max_retries=0)
+
+
+def test_follower_gets_full_stream_after_leader_stops_reading():
+    model = FakeModel(0.3, 0.0, 0)
+    client = make_client()
+    leader = client.stream(model, PROMPT)
+    next(leader)
+
+    result = {}
+    follower = threading.Thread(target=lambda: result.setdefault("text", "".join(client.stream(model, PROMPT))))
+    follower.start()
+    while client.get_stats()["coalesced"] == 0:
+        time.sleep(0.01)
+    leader.close()
+    follower.join(5)
+
+    assert result["text"] == f"Jawaban untuk: {PROMPT} "
+    stats = client.get_stats()
+    assert model.upstream_calls == 1
+    assert stats["flights_detached"] == 1
+    assert stats["flights_open"] == 0
+
+
+def test_abandoned_flight_without_followers_is_closed():
+    model = FakeModel(0.1, 0.0, 0)
+    client = make_client()
+    leader = client.stream(model, PROMPT)
+    next(leader)
+    leader.close()
+
+    stats = client.get_stats()
+    assert stats["flights_open"] == 0
+    assert stats["in_flight"] == 0
+    assert stats["flights_detached"] == 0
+    assert client.generate(model, PROMPT) == f"Jawaban untuk: {PROMPT}"
+
+
+def test_zero_rate_limit_means_no_local_bucket():
+    model = FakeModel(0.0, 0.0, 0)
+    client = GeminiClient(requests_per_minute=0, burst=0, max_concurrency=2, max_retries=0)
+    assert client.generate(model, PROMPT) == f"Jawaban untuk: {PROMPT}"
+    with pytest.raises(ValueError):
+        TokenBucket(0, 5)
@@ -0,0 +1,48 @@
+import numpy as np
+from services.questionnaire import questions, options
+from services.scoring import score_responses, score_batch, encode_responses, free_text_severity
+
+FEVER, BLEEDING = 0, 8
+
+
+def all_negative_responses():
+    return {question: "Tidak" if "Tidak" in option_list else option_list[0] for question, option_list in zip(questions, options)}
+
+
+def test_all_negative_buttons_are_decisive_low():
+    result = score_responses(all_negative_responses())
+    assert result["level"] == "RENDAH"
+    assert result["decisive"]
+
+
+def test_negation_is_scoped_to_the_next_word():
+    assert free_text_severity(FEVER, "iya, demamnya tidak turun-turun") == 1.0
+    assert free_text_severity(FEVER, "tidak") == 0.0
+    assert free_text_severity(FEVER, "tidak ada") == 0.0
+
+
+def test_bleeding_keyword_wins_over_negation():
+    assert free_text_severity(BLEEDING, "gusi berdarah tapi tidak banyak") == 1.0
+    assert free_text_severity(BLEEDING, "tidak berdarah") == 0.0
+
+
+def test_free_text_fever_and_bleeding_are_never_decisive_low():
+    responses = all_negative_responses()
+    responses[questions[FEVER]] = "iya, demamnya tidak turun-turun"
+    responses[questions[BLEEDING]] = "gusi berdarah tapi tidak banyak"
+
+    result = score_responses(responses)
+    assert result["warning_sign"]
+    assert not result["decisive"]
+
+    _, decisive = score_batch(np.stack([encode_responses(responses)]))
+    assert not decisive[0]
+
+
+def test_free_text_blocks_decisive_low_in_batch_and_single():
+    responses = all_negative_responses()
+    responses[questions[4]] = "nggak"
+
+    assert not score_responses(responses)["decisive"]
+    _, decisive = score_batch(np.stack([encode_responses(responses)]))
+    assert not decisive[0]
@@ -0,0 +1,47 @@
+import pytest
+from bson import ObjectId
+from services.session_store import MongoSessionStore, InMemorySessionStore, restore_session, sync_session
+
+mongomock = pytest.importorskip("mongomock")
+
+OWNER = "u-ana"
+
+
+def logged_in_state():
+    return {"logged_in": True, "user_id": OWNER}
+
+
+@pytest.fixture(params=["mongodb", "memory"])
+def store(request):
+    if request.param == "mongodb":
+        return MongoSessionStore(mongomock.MongoClient().db.sessions)
+    return InMemorySessionStore()
+
+
+def test_trimmed_ids_survive_restore_trim_sync_restore(store):
+    first_ids = [ObjectId(), ObjectId()]
+    state = logged_in_state()
+    state["transcript_trimmed"] = {"ids": list(first_ids), "messages": 4}
+    sync_session(state, "sid", store)
+
+    restored = logged_in_state()
+    assert restore_session(restored, "sid", OWNER, store)
+    # Turn berikutnya dipotong: ids bertambah di state hasil restore (juga jika dimutasi di tempat)
+    new_id = ObjectId()
+    restored["transcript_trimmed"]["ids"].append(new_id)
+    restored["transcript_trimmed"]["messages"] += 2
+    sync_session(restored, "sid", store)
+
+    again = logged_in_state()
+    assert restore_session(again, "sid", OWNER, store)
+    assert again["transcript_trimmed"] == {"ids": first_ids + [new_id], "messages": 6}
+
+
+def test_session_of_another_account_is_not_restored(store):
+    state = logged_in_state()
+    state["current_question"] = 3
+    sync_session(state, "sid", store)
+
+    other = {"logged_in": True, "user_id": "u-budi"}
+    assert not restore_session(other, "sid", "u-budi", store)
+    assert "current_question" not in other
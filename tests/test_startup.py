@@ -0,0 +1,20 @@
+import statistics
+import pytest
+from tools.profile_startup import measure_first_render, profile_imports, STARTUP_BUDGET_MS
+
+# Halaman login dirender dengan MongoDB palsu; tanpa mongomock gate ini tidak bisa jalan
+pytest.importorskip("mongomock")
+pytest.importorskip("streamlit.testing.v1")
+
+
+def test_login_page_renders_within_budget():
+    runs = measure_first_render(3)
+    median_render = statistics.median(run["first_render_ms"] for run in runs)
+    assert median_render <= STARTUP_BUDGET_MS, f"Render pertama {median_render:.0f} ms melewati budget {STARTUP_BUDGET_MS:.0f} ms"
+
+
+def test_login_page_does_not_load_deferred_modules():
+    loaded = set(profile_imports(top=0)["deferred_modules_loaded"])
+    for run in measure_first_render(1):
+        loaded.update(run["deferred_modules_loaded"])
+    assert not loaded, f"Halaman login memuat modul yang seharusnya ditunda: {', '.join(sorted(loaded))}"
@@ -0,0 +1,22 @@
+"""Isi field risk_level pada dokumen dengue_diagnosis lama.
+
+Contoh:
+    python -m tools.backfill_risk_level --batch-size 500
+"""
+import argparse
+from services.database import ensure_indexes
+from services.history import backfill_risk_levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    ensure_indexes()
+    updated = backfill_risk_levels(args.batch_size)
+    print(f"risk_level diisi untuk {updated} dokumen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Micro-benchmark cost factor bcrypt untuk memilih BCRYPT_ROUNDS.
+
+Mengukur latency satu verifikasi per cost dan throughput login saat burst lewat PasswordHasher.
+Rekomendasi = cost tertinggi yang p95 latency burst-nya masih di bawah --target-ms.
+
+Contoh:
+    python -m tools.benchmark_bcrypt --rounds 10 11 12 13
+    python -m tools.benchmark_bcrypt --burst 40 --pool-size 4 --target-ms 500
+"""
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from services.auth import PasswordHasher, BCRYPT_POOL_SIZE
+from tools.benchmark_utils import latency_summary, print_report
+
+
+def benchmark_cost(rounds, samples, burst, pool_size):
+    password = "benchmark-password"
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds))
+
+    single = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.checkpw(password.encode(), hashed)
+        single.append(time.perf_counter() - start)
+
+    # Burst: `burst` login bersamaan (thread script Streamlit) berbagi satu pool bcrypt
+    hasher = PasswordHasher(rounds=rounds, pool_size=pool_size, timeout=300)
+
+    def login():
+        start = time.perf_counter()
+        hasher.verify(password, hashed)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=burst) as sessions:
+        burst_latencies = list(sessions.map(lambda _: login(), range(burst)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "rounds": rounds,
+        "single": latency_summary(single),
+        "burst": latency_summary(burst_latencies),
+        "logins_per_second": round(burst / elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--burst", type=int, default=20, help="Login bersamaan")
+    parser.add_argument("--pool-size", type=int, default=BCRYPT_POOL_SIZE)
+    parser.add_argument("--target-ms", type=float, default=1000.0, help="Batas p95 latency login saat burst")
+    args = parser.parse_args()
+
+    results = [benchmark_cost(rounds, args.samples, args.burst, args.pool_size) for rounds in args.rounds]
+    within_target = [result["rounds"] for result in results if result["burst"]["p95_ms"] <= args.target_ms]
+    print_report("bcrypt cost", {
+        "pool_size": args.pool_size,
+        "burst": args.burst,
+        "results": results,
+        "recommended_rounds": max(within_target) if within_target else min(args.rounds),
+    })
+
+
+if __name__ == "__main__":
+    main()
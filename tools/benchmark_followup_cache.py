@@ -0,0 +1,76 @@
+"""Replay pertanyaan lanjutan dari koleksi history melalui FollowupCache.
+
+Contoh:
+    python -m tools.benchmark_followup_cache --limit 5000 --threshold 0.85
+    python -m tools.benchmark_followup_cache --input followups.jsonl
+"""
+import argparse
+import json
+import time
+import pymongo
+from services.history import read_text
+from services.cache import FollowupCache, FOLLOWUP_CACHE_MAX_ENTRIES, FOLLOWUP_CACHE_THRESHOLD
+from tools.benchmark_utils import latency_summary, print_report
+
+
+# Ambil dokumen followup_question dari MongoDB, urut sesuai waktu
+def load_followups_from_mongodb(limit):
+    from services.database import connect_to_mongodb
+    history_collection, _ = connect_to_mongodb()
+    cursor = history_collection.find(
+        {"type": "followup_question"},
+        {"question": 1, "answer": 1, "answer_z": 1, "_id": 0},
+    ).sort("timestamp", pymongo.ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+
+# Ambil dokumen dari file JSONL (hasil export) untuk benchmark tanpa koneksi
+def load_followups_from_file(path, limit):
+    docs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                docs.append(json.loads(line))
+            if limit and len(docs) >= limit:
+                break
+    return docs
+
+
+def replay(docs, threshold, max_entries):
+    cache = FollowupCache(max_entries=max_entries, threshold=threshold)
+    latencies = []
+    for doc in docs:
+        question = doc.get("question")
+        if not question:
+            continue
+        start = time.perf_counter()
+        answer = cache.get(question)
+        latencies.append(time.perf_counter() - start)
+        if answer is None:
+            # Miss: anggap Gemini sudah menjawab, simpan jawaban historisnya
+            cache.set(question, read_text(doc, "answer"))
+    return cache.get_stats(), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="File JSONL berisi dokumen followup_question (default: baca dari MongoDB)")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=FOLLOWUP_CACHE_THRESHOLD)
+    parser.add_argument("--max-entries", type=int, default=FOLLOWUP_CACHE_MAX_ENTRIES)
+    args = parser.parse_args()
+
+    if args.input:
+        docs = load_followups_from_file(args.input, args.limit)
+    else:
+        docs = load_followups_from_mongodb(args.limit)
+
+    stats, latencies = replay(docs, args.threshold, args.max_entries)
+    report = {"documents": len(docs), "cache": stats, "lookup_latency": latency_summary(latencies)}
+    print_report("Follow-up semantic cache", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Bandingkan cold start dan RSS memuat index referensi: parse CSV vs dataset .npy memory-mapped.
+
+Setiap pengukuran berjalan di proses baru (cold start tanpa cache modul), termasuk satu pencarian
+supaya halaman memmap yang dibutuhkan benar-benar dibaca. Build dataset dulu dengan
+`python -m tools.build_reference_dataset`.
+
+Contoh:
+    python -m tools.benchmark_reference_load --runs 5
+"""
+import sys
+import json
+import argparse
+import subprocess
+from tools.benchmark_utils import latency_summary, print_report
+
+# Dijalankan di proses anak; mencetak JSON durasi dan RSS maksimum
+CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from services.reference import ReferenceIndex, REFERENCE_CSV_PATH, REFERENCE_DATASET_DIR
+if sys.argv[1] == "csv":
+    import pandas as pd
+imported = time.perf_counter()
+if sys.argv[1] == "csv":
+    index = ReferenceIndex.from_dataframe(pd.read_csv(REFERENCE_CSV_PATH))
+else:
+    index = ReferenceIndex.load(REFERENCE_DATASET_DIR)
+loaded = time.perf_counter()
+index.search({"demam", "mual"}, 3.0)
+print(json.dumps({
+    "import_s": imported - start,
+    "load_s": loaded - imported,
+    "first_search_s": time.perf_counter() - loaded,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def measure(mode, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, mode], capture_output=True, text=True, check=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        "load": latency_summary([sample["load_s"] for sample in samples]),
+        "first_search": latency_summary([sample["first_search_s"] for sample in samples]),
+        "import": latency_summary([sample["import_s"] for sample in samples]),
+        "max_rss_mb": round(max(sample["max_rss_kb"] for sample in samples) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print_report("Reference load: CSV vs memmap", {
+        "csv": measure("csv", args.runs),
+        "memmap": measure("npy", args.runs),
+    })
+
+
+if __name__ == "__main__":
+    main()
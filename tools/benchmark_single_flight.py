@@ -0,0 +1,116 @@
+"""Burst request Gemini identik lewat GeminiClient, dengan dan tanpa single-flight.
+
+Model Gemini diganti model palsu dengan latency tetap, jadi tidak memakai kuota. Setiap user
+virtual memilih satu dari --distinct prompt (mis. jawaban identik / pertanyaan lanjutan populer)
+dan semua request dikirim bersamaan. Laporan membandingkan jumlah request upstream, jumlah yang
+digabung (coalesced), dan latency per user.
+
+Contoh:
+    python -m tools.benchmark_single_flight --users 50 --distinct 3
+    python -m tools.benchmark_single_flight --users 20 --stream --latency 2.0
+    python -m tools.benchmark_single_flight --users 30 --fail-rate 0.3
+"""
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.gemini import GeminiClient
+from tools.benchmark_utils import latency_summary, print_report
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """generate_content palsu: `latency` detik per request, gagal dengan peluang `fail_rate`"""
+
+    model_name = "fake-gemini"
+
+    def __init__(self, latency, fail_rate, seed):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        with self._lock:
+            self.upstream_calls += 1
+            failed = self.rng.random() < self.fail_rate
+        words = f"Jawaban untuk: {prompt}".split()
+        if stream:
+            return self._stream(words, failed)
+        time.sleep(self.latency)
+        if failed:
+            raise RuntimeError("Gemini palsu gagal")
+        return FakeChunk(" ".join(words))
+
+    def _stream(self, words, failed):
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            if failed and i == len(words) // 2:
+                raise RuntimeError("Gemini palsu gagal")
+            yield FakeChunk(word + " ")
+
+
+def run_burst(single_flight, args):
+    model = FakeModel(args.latency, args.fail_rate, args.seed)
+    # Rate limit longgar - yang diukur hanya penggabungan request
+    client = GeminiClient(requests_per_minute=60000, burst=args.users, max_concurrency=args.users, max_retries=0,
+                          single_flight=single_flight, single_flight_timeout=args.timeout)
+    rng = random.Random(args.seed)
+    prompts = [f"Bagaimana cara pencegahan DBD? (varian {rng.randrange(args.distinct)})" for _ in range(args.users)]
+    start_barrier = threading.Barrier(args.users)
+
+    def request(prompt):
+        start_barrier.wait()
+        start = time.perf_counter()
+        try:
+            if args.stream:
+                "".join(client.stream(model, prompt))
+            else:
+                client.generate(model, prompt)
+            failed = False
+        except Exception:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    with ThreadPoolExecutor(max_workers=args.users) as sessions:
+        results = list(sessions.map(request, prompts))
+
+    stats = client.get_stats()
+    return {
+        "requests": args.users,
+        "upstream_calls": model.upstream_calls,
+        "coalesced": stats["coalesced"],
+        "coalesce_timeouts": stats["coalesce_timeouts"],
+        "errors": sum(failed for _, failed in results),
+        "latency": latency_summary([seconds for seconds, _ in results]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=30, help="Request bersamaan")
+    parser.add_argument("--distinct", type=int, default=3, help="Jumlah prompt berbeda di dalam burst")
+    parser.add_argument("--latency", type=float, default=1.0, help="Latency Gemini palsu (detik)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Peluang request upstream gagal")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout single-flight per key (detik)")
+    parser.add_argument("--stream", action="store_true", help="Pakai GeminiClient.stream")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print_report("Single-flight Gemini", {
+        "users": args.users,
+        "distinct_prompts": args.distinct,
+        "mode": "stream" if args.stream else "generate",
+        "without_single_flight": run_burst(False, args),
+        "with_single_flight": run_burst(True, args),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark throughput scoring engine dan jumlah panggilan Gemini yang dihindari.
+
+Contoh:
+    python -m tools.benchmark_triage --synthetic 100000
+    python -m tools.benchmark_triage --replay --limit 5000
+    python -m tools.benchmark_triage --replay --input diagnoses.jsonl
+"""
+import argparse
+import json
+import random
+import time
+from collections import Counter
+import numpy as np
+from services.questionnaire import questions, options
+from services.history import decode_responses
+from services.scoring import score_responses, encode_responses, score_batch
+from tools.benchmark_utils import print_report
+
+
+def random_responses(rng):
+    return {question: rng.choice(option_list) for question, option_list in zip(questions, options)}
+
+
+def benchmark_throughput(count, seed):
+    rng = random.Random(seed)
+    samples = [random_responses(rng) for _ in range(count)]
+
+    start = time.perf_counter()
+    decisive = sum(score_responses(responses)["decisive"] for responses in samples)
+    single_seconds = time.perf_counter() - start
+
+    encoded = np.stack([encode_responses(responses) for responses in samples])
+    start = time.perf_counter()
+    _, batch_decisive = score_batch(encoded)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "responses": count,
+        "single_per_second": round(count / single_seconds),
+        "batch_per_second": round(count / batch_seconds),
+        "decisive_share": round(decisive / count, 4),
+        "batch_matches_single": int(batch_decisive.sum()) == decisive,
+    }
+
+
+def load_diagnoses(input_path, limit):
+    if input_path:
+        docs = []
+        with open(input_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    docs.append(json.loads(line))
+                if limit and len(docs) >= limit:
+                    break
+        return docs
+
+    from services.database import connect_to_mongodb
+    history_collection, _ = connect_to_mongodb()
+    cursor = history_collection.find(
+        {"type": "dengue_diagnosis", "$or": [{"responses": {"$exists": True}}, {"answers": {"$exists": True}}]},
+        {"responses": 1, "answers": 1, "extra_responses": 1, "question_set": 1, "risk_level": 1, "mode": 1, "_id": 0},
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
+
+
+def replay_history(docs):
+    avoided = 0
+    agreement = Counter()
+    for doc in docs:
+        result = score_responses(decode_responses(doc))
+        if not result["decisive"]:
+            continue
+        avoided += 1
+        # Bandingkan dengan risk_level hasil Gemini yang tersimpan (hanya dokumen production)
+        stored = doc.get("risk_level")
+        if doc.get("mode") == "production" and stored and stored != "N/A":
+            agreement["sama" if stored.upper() == result["level"] else "beda"] += 1
+
+    return {
+        "diagnoses": len(docs),
+        "gemini_calls_avoided": avoided,
+        "avoided_share": round(avoided / len(docs), 4) if docs else 0.0,
+        "agreement_with_stored_risk_level": dict(agreement),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=100000, help="Jumlah jawaban acak untuk uji throughput")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replay", action="store_true", help="Replay dokumen dengue_diagnosis dari history")
+    parser.add_argument("--input", help="File JSONL hasil export history (default: baca dari MongoDB)")
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        print_report("Throughput scoring", benchmark_throughput(args.synthetic, args.seed))
+    if args.replay:
+        print_report("Replay history", replay_history(load_diagnoses(args.input, args.limit)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import json
+import math
+
+
+# Nearest-rank percentile, values tidak perlu diurutkan
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# Ringkasan latency (detik) dalam milidetik
+def latency_summary(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "max_ms": round(max(values) * 1000, 3) if values else 0.0,
+    }
+
+
+def print_report(title, report):
+    print(f"== {title} ==")
+    print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
@@ -0,0 +1,32 @@
+"""Build dataset referensi bersih dan bertipe dari CSV ke array .npy untuk dimuat dengan memory-map.
+
+Padding spasi dibersihkan, nilai lab di-parse ke kolom numerik, gejala dipecah menjadi kolom flag,
+dan baris identik digabung menjadi satu profil dengan jumlah kasus. Jalankan ulang setiap CSV berubah;
+aplikasi kembali mem-parse CSV jika dataset sudah basi.
+
+Contoh:
+    python -m tools.build_reference_dataset
+    python -m tools.build_reference_dataset --csv "views/DATA DBD.csv" --output views/reference_dataset
+"""
+import time
+import argparse
+import pandas as pd
+from services.reference import ReferenceIndex, REFERENCE_CSV_PATH, REFERENCE_DATASET_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=REFERENCE_CSV_PATH)
+    parser.add_argument("--output", default=REFERENCE_DATASET_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.csv)
+    index = ReferenceIndex.from_dataframe(df)
+    index.save(args.output, source_path=args.csv)
+    print(f"{len(df)} baris -> {len(index)} profil, {len(index.symptom_vocab)} gejala, "
+          f"ditulis ke {args.output} dalam {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
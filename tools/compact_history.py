@@ -0,0 +1,106 @@
+"""Migrasi dokumen history ke skema ringkas (indeks pertanyaan, tanpa array conversation).
+
+Dokumen diproses per batch urut _id dan diganti dengan ReplaceOne bersyarat, jadi aman dijalankan ulang.
+Laporan ukuran BSON per dokumen sebelum/sesudah dicetak per tipe.
+
+Contoh:
+    python -m tools.compact_history --dry-run --limit 2000
+    python -m tools.compact_history --compression zlib --batch-size 500
+"""
+import argparse
+from collections import defaultdict
+import bson
+import pymongo
+from services.database import connect_to_mongodb
+from services.persistence import EVENT_LOGGED_FIELD
+from services.history import (
+    build_diagnosis_record, build_followup_record, decode_responses, read_text, encode_text,
+    HISTORY_SCHEMA_VERSION, HISTORY_COMPRESSION,
+)
+from tools.benchmark_utils import print_report
+
+# Field yang dipertahankan apa adanya dari dokumen lama
+PRESERVED_FIELDS = ("rediagnosis", "rediagnosed_at", "prompt_version", "diagnosis_source", EVENT_LOGGED_FIELD)
+
+
+def compact_document(doc, compression):
+    """Dokumen skema baru dengan _id, user_id, timestamp dan mode yang sama"""
+    mode = doc.get("mode", "production")
+    if doc["type"] == "dengue_diagnosis":
+        compact = build_diagnosis_record(doc.get("user_id"), decode_responses(doc), read_text(doc, "diagnosis"), mode, doc.get("timestamp"))
+        # risk_level tersimpan (mis. dari backfill) dipakai ulang agar label sidebar tidak berubah
+        if doc.get("risk_level"):
+            compact["risk_level"] = doc["risk_level"]
+        text_field = "diagnosis"
+    else:
+        compact = build_followup_record(doc.get("user_id"), doc.get("question", ""), read_text(doc, "answer"), mode, doc.get("timestamp"))
+        text_field = "answer"
+    # Kompresi mengikuti argumen CLI, bukan HISTORY_COMPRESSION proses ini
+    compact.pop(text_field, None)
+    compact.pop(text_field + "_z", None)
+    compact.update(encode_text(text_field, read_text(doc, text_field), compression))
+    for field in PRESERVED_FIELDS:
+        if field in doc:
+            compact[field] = doc[field]
+    compact["_id"] = doc["_id"]
+    return compact
+
+
+def migrate(history_collection, batch_size, compression, dry_run, limit=None):
+    sizes = defaultdict(lambda: {"documents": 0, "bytes_before": 0, "bytes_after": 0})
+    last_id = None
+    processed = 0
+    while limit is None or processed < limit:
+        query = {
+            "type": {"$in": ["dengue_diagnosis", "followup_question"]},
+            "schema_version": {"$ne": HISTORY_SCHEMA_VERSION},
+        }
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        size = batch_size if limit is None else min(batch_size, limit - processed)
+        docs = list(history_collection.find(query).sort("_id", pymongo.ASCENDING).limit(size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        ops = []
+        for doc in docs:
+            compact = compact_document(doc, compression)
+            stats = sizes[doc["type"]]
+            stats["documents"] += 1
+            stats["bytes_before"] += len(bson.encode(doc))
+            stats["bytes_after"] += len(bson.encode(compact))
+            # Hanya ganti jika dokumen belum dimigrasi oleh proses lain
+            ops.append(pymongo.ReplaceOne({"_id": doc["_id"], "schema_version": {"$ne": HISTORY_SCHEMA_VERSION}}, compact))
+        if ops and not dry_run:
+            history_collection.bulk_write(ops, ordered=False)
+        processed += len(docs)
+        print(f"history: {processed} dokumen {'diperiksa' if dry_run else 'dimigrasi'}")
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--compression", choices=["none", "zlib"], default=HISTORY_COMPRESSION)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--dry-run", action="store_true", help="Hanya hitung ukuran sebelum/sesudah")
+    args = parser.parse_args()
+
+    history_collection, _ = connect_to_mongodb()
+    sizes = migrate(history_collection, args.batch_size, args.compression, args.dry_run, args.limit)
+
+    report = {}
+    for doc_type, stats in sizes.items():
+        count = stats["documents"]
+        report[doc_type] = {
+            "documents": count,
+            "avg_bytes_before": round(stats["bytes_before"] / count),
+            "avg_bytes_after": round(stats["bytes_after"] / count),
+            "reduction": f"{1 - stats['bytes_after'] / stats['bytes_before']:.1%}",
+        }
+    print_report(f"Ukuran history per dokumen (kompresi: {args.compression})", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Bersihkan dokumen users yatim dari upsert counter per sesi (user_id uuid4 tanpa akun).
+
+Akun terdaftar yang belum punya user_id diisi str(_id). Dokumen tanpa username dihapus per batch;
+history mereka tetap ada di collection history. Dengan --recount, counter akun dihitung ulang dari history.
+
+Contoh:
+    python -m tools.compact_users --dry-run
+    python -m tools.compact_users --older-than-days 1 --batch-size 1000
+    python -m tools.compact_users --recount
+"""
+import argparse
+from datetime import timedelta, timezone
+from zoneinfo import ZoneInfo
+import pymongo
+from services.database import connect_to_mongodb, ensure_indexes
+from services.history import utc_now, LEGACY_TIMESTAMP_FORMAT
+
+# Dokumen counter yang dibuat oleh upsert sesi anonim - tidak punya username
+ORPHAN_FILTER = {"username": {"$not": {"$type": "string"}}}
+
+
+# Isi user_id = str(_id) untuk akun lama, batch per batch urut _id
+def backfill_account_ids(users_collection, batch_size, dry_run):
+    updated = 0
+    last_id = None
+    while True:
+        query = {"username": {"$type": "string"}, "user_id": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = list(users_collection.find(query, {"_id": 1}).sort("_id", pymongo.ASCENDING).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        ops = [
+            pymongo.UpdateOne({"_id": doc["_id"], "user_id": {"$exists": False}}, {"$set": {"user_id": str(doc["_id"])}})
+            for doc in docs
+        ]
+        if dry_run:
+            updated += len(ops)
+        else:
+            updated += users_collection.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+
+def delete_orphans(users_collection, batch_size, older_than_days, dry_run, source_timezone=timezone.utc):
+    query = dict(ORPHAN_FILTER)
+    if older_than_days is not None:
+        # Jangan sentuh sesi yang mungkin masih aktif
+        cutoff = utc_now() - timedelta(days=older_than_days)
+        # last_activity string lama (belum dimigrasi) tidak pernah cocok dengan $lt datetime;
+        # format LEGACY_TIMESTAMP_FORMAT urut secara leksikal, jadi bandingkan dengan cutoff versi string
+        legacy_cutoff = cutoff.astimezone(source_timezone).strftime(LEGACY_TIMESTAMP_FORMAT)
+        query["$or"] = [
+            {"last_activity": {"$lt": cutoff}},
+            {"last_activity": {"$type": "string", "$lt": legacy_cutoff}},
+        ]
+    if dry_run:
+        return users_collection.count_documents(query)
+
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in users_collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            break
+        deleted += users_collection.delete_many({"_id": {"$in": ids}}).deleted_count
+        print(f"users: {deleted} dokumen yatim dihapus")
+    return deleted
+
+
+# Hitung ulang diagnosis_count / question_count akun dari history (sumber kebenaran)
+def recount_activity(history_collection, users_collection, batch_size, dry_run):
+    account_ids = {doc["user_id"] for doc in users_collection.find({"username": {"$type": "string"}, "user_id": {"$type": "string"}}, {"user_id": 1})}
+    pipeline = [
+        {"$match": {"user_id": {"$in": list(account_ids)}}},
+        {"$group": {
+            "_id": "$user_id",
+            "diagnosis_count": {"$sum": {"$cond": [{"$eq": ["$type", "dengue_diagnosis"]}, 1, 0]}},
+            "question_count": {"$sum": {"$cond": [{"$eq": ["$type", "followup_question"]}, 1, 0]}},
+            "last_activity": {"$max": "$timestamp"},
+        }},
+    ]
+    updated = 0
+    ops = []
+    for row in history_collection.aggregate(pipeline, allowDiskUse=True):
+        ops.append(pymongo.UpdateOne({"user_id": row["_id"]}, {"$set": {
+            "diagnosis_count": row["diagnosis_count"],
+            "question_count": row["question_count"],
+            "last_activity": row["last_activity"],
+        }}))
+        if len(ops) >= batch_size:
+            updated += len(ops) if dry_run else users_collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += len(ops) if dry_run else users_collection.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--older-than-days", type=float, help="Hanya hapus dokumen yatim yang tidak aktif selama N hari")
+    parser.add_argument("--source-timezone", default="UTC", help="Zona waktu last_activity string lama (lihat tools.migrate_timestamps)")
+    parser.add_argument("--recount", action="store_true", help="Hitung ulang counter akun dari history")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    history_collection, users_collection = connect_to_mongodb()
+    before = users_collection.estimated_document_count()
+
+    backfilled = backfill_account_ids(users_collection, args.batch_size, args.dry_run)
+    print(f"users: user_id diisi untuk {backfilled} akun")
+    deleted = delete_orphans(users_collection, args.batch_size, args.older_than_days, args.dry_run, ZoneInfo(args.source_timezone))
+    print(f"users: {deleted} dokumen yatim {'akan dihapus' if args.dry_run else 'dihapus'}")
+    if args.recount:
+        recounted = recount_activity(history_collection, users_collection, args.batch_size, args.dry_run)
+        print(f"users: counter dihitung ulang untuk {recounted} akun")
+
+    if not args.dry_run:
+        # Index user_id_unique dibuat setelah backfill supaya akun lama langsung tercakup
+        ensure_indexes()
+        print(f"users: {before} -> {users_collection.estimated_document_count()} dokumen")
+
+
+if __name__ == "__main__":
+    main()
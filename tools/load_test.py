@@ -0,0 +1,234 @@
+"""Load test headless untuk alur chat (views/chat.py) dengan streamlit AppTest.
+
+Setiap user virtual menjawab 12 pertanyaan, menerima diagnosis MOCK (DEVELOPMENT_MODE),
+lalu mengajukan beberapa pertanyaan lanjutan. MongoDB diganti mongomock (pip install mongomock)
+atau mongod lokal lewat --mongodb-uri.
+
+AppTest memakai runtime global per proses, jadi rerun dijalankan satu per satu. --concurrency
+adalah jumlah sesi yang hidup bersamaan; langkah mereka dijalankan bergiliran (round-robin),
+sehingga state, cache, dan antrean penulisan semua sesi tertahan seperti pada server sungguhan.
+
+Contoh:
+    python -m tools.load_test --users 20 --concurrency 4
+    python -m tools.load_test --users 50 --followups 3 --streaming
+    python -m tools.load_test --users 5 --followups 40  # transcript tetap dibatasi TRANSCRIPT_MAX_MESSAGES
+    python -m tools.load_test --mongodb-uri mongodb://localhost:27017 --users 10
+"""
+import os
+import gc
+import sys
+import time
+import random
+import pickle
+import logging
+import argparse
+import threading
+import tracemalloc
+from collections import Counter, deque
+from tools.benchmark_utils import percentile, latency_summary, print_report
+
+CHAT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "views", "chat.py")
+FOLLOWUP_QUESTIONS = [
+    "Bagaimana cara pencegahan DBD?",
+    "Apa saja gejala demam berdarah?",
+    "Obat apa yang aman untuk demam berdarah?",
+    "Berapa lama masa inkubasi virus dengue?",
+]
+# Operasi collection yang dihitung sebagai round-trip ke MongoDB
+COUNTED_OPERATIONS = (
+    "find", "find_one", "insert_one", "insert_many", "update_one", "update_many", "bulk_write",
+    "count_documents", "create_index", "index_information", "aggregate", "delete_many",
+)
+
+
+class RoundTripCounter:
+    """Hitung round-trip DB: CommandListener untuk pymongo, wrapper method untuk mongomock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def total(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    # pymongo.monitoring.CommandListener
+    def started(self, event):
+        self.add(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def patch_mongomock(self, mongomock):
+        for name in COUNTED_OPERATIONS:
+            original = getattr(mongomock.Collection, name)
+
+            def counted(collection, *args, __original=original, __name=name, **kwargs):
+                self.add(__name)
+                return __original(collection, *args, **kwargs)
+
+            setattr(mongomock.Collection, name, counted)
+        original_command = mongomock.Database.command
+
+        def counted_command(database, *args, **kwargs):
+            self.add("command")
+            return original_command(database, *args, **kwargs)
+
+        mongomock.Database.command = counted_command
+
+
+def install_database(counter, mongodb_uri):
+    """Pasang client MongoDB untuk seluruh proses sebelum views/chat.py dijalankan"""
+    from services import database
+    if mongodb_uri:
+        from pymongo import monitoring
+        monitoring.register(counter)
+        os.environ["MONGODB_URI"] = mongodb_uri
+        database.get_mongo_client()
+        return
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock belum terpasang: pip install mongomock, atau gunakan --mongodb-uri")
+    counter.patch_mongomock(mongomock)
+    database._client = mongomock.MongoClient(tz_aware=True)
+    # mongomock tidak mendukung semua opsi index/time-series; index tidak relevan untuk load test
+    database._indexes_ensured = True
+    database.check_health = lambda force=False: True
+
+
+class VirtualUser:
+    """Satu sesi Streamlit yang dijalankan lewat AppTest"""
+
+    def __init__(self, number, followups, streaming, seed, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(CHAT_SCRIPT, default_timeout=timeout)
+        self.app.session_state["DEVELOPMENT_MODE"] = True
+        self.app.session_state["STREAMING_MODE"] = streaming
+        self.followups = followups
+        self.rng = random.Random(seed + number)
+        self.rerun_seconds = []
+        self.max_transcript_messages = 0
+
+    def _run(self, action=None):
+        start = time.perf_counter()
+        (action or self.app).run()
+        self.rerun_seconds.append(time.perf_counter() - start)
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+        if "messages" in self.app.session_state:
+            self.max_transcript_messages = max(self.max_transcript_messages, len(self.app.session_state["messages"]))
+
+    def steps(self):
+        """Generator satu rerun per langkah - supaya banyak sesi bisa dijalankan bergiliran"""
+        from services.questionnaire import questions, options
+        self._run()
+        yield
+        for index in range(len(questions)):
+            option = self.rng.randrange(len(options[index]))
+            self._run(self.app.button(key=f"q{index}_option{option}").click())
+            yield
+        if not self.app.session_state["diagnosis_complete"]:
+            raise RuntimeError("Diagnosis tidak selesai setelah 12 jawaban")
+        # Lebih dari jumlah contoh pertanyaan = diulang, untuk sesi follow-up panjang
+        order = self.rng.sample(FOLLOWUP_QUESTIONS, len(FOLLOWUP_QUESTIONS))
+        for i in range(self.followups):
+            self._run(self.app.chat_input[0].set_value(order[i % len(order)]))
+            yield
+
+    def session_state_bytes(self):
+        total = 0
+        for value in self.app.session_state._state.filtered_state.values():
+            try:
+                total += len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                pass  # Objek yang tidak bisa di-pickle tidak ikut dihitung
+        return total
+
+
+# Jalankan sesi bergiliran, maksimal `concurrency` sesi aktif bersamaan
+def run_interleaved(users, concurrency):
+    pending = deque(users)
+    active = deque()
+    while pending or active:
+        while pending and len(active) < concurrency:
+            user = pending.popleft()
+            active.append((user, user.steps()))
+        user, steps = active.popleft()
+        try:
+            next(steps)
+            active.append((user, steps))
+        except StopIteration:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="Sesi yang berjalan bersamaan")
+    parser.add_argument("--followups", type=int, default=2, help="Pertanyaan lanjutan per user")
+    parser.add_argument("--streaming", action="store_true", help="Jalankan dengan STREAMING_MODE")
+    parser.add_argument("--mock-delay", type=float, default=0.0, help="Latency simulasi response MOCK (detik)")
+    parser.add_argument("--mongodb-uri", help="mongod lokal; default mongomock")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout per rerun (detik)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Dibaca saat import services.* - harus diset sebelum modul aplikasi dimuat
+    os.environ["MOCK_RESPONSE_DELAY"] = str(args.mock_delay)
+    os.environ["MOCK_STREAM_DELAY"] = "0" if args.mock_delay == 0 else os.environ.get("MOCK_STREAM_DELAY", "0.02")
+    os.environ["GEMINI_WARMUP"] = "false"
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    counter = RoundTripCounter()
+    install_database(counter, args.mongodb_uri)
+    from services.persistence import get_history_writer
+
+    # Pemanasan: cache_resource (index referensi) dan import modul tidak dihitung per sesi
+    run_interleaved([VirtualUser(-1, 0, args.streaming, args.seed, args.timeout)], 1)
+    get_history_writer().flush()
+    gc.collect()
+    round_trips_before = counter.total()
+    counts_before = Counter(counter.counts)
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    users = [VirtualUser(n, args.followups, args.streaming, args.seed, args.timeout) for n in range(args.users)]
+    start = time.perf_counter()
+    run_interleaved(users, args.concurrency)
+    elapsed = time.perf_counter() - start
+    get_history_writer().flush()
+    gc.collect()
+    # Semua AppTest masih hidup - selisih memori = state yang ditahan per sesi
+    memory_per_session = (tracemalloc.get_traced_memory()[0] - memory_before) / args.users
+    tracemalloc.stop()
+
+    reruns = [seconds for user in users for seconds in user.rerun_seconds]
+    round_trips = counter.total() - round_trips_before
+    print_report("Load test chat", {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "streaming": args.streaming,
+        "database": "mongod" if args.mongodb_uri else "mongomock",
+        "elapsed_seconds": round(elapsed, 2),
+        "sessions_per_second": round(args.users / elapsed, 2),
+        "rerun_latency": latency_summary(reruns),
+        "rerun_p99_ms": round(percentile(reruns, 99) * 1000, 3),
+        "reruns_per_session": round(len(reruns) / args.users, 1),
+        "db_round_trips_per_session": round(round_trips / args.users, 1),
+        "db_operations": dict(counter.counts - counts_before),
+        "memory_per_session_kb": round(memory_per_session / 1024, 1),
+        "session_state_pickled_kb": round(sum(user.session_state_bytes() for user in users) / args.users / 1024, 1),
+        "transcript_messages_max": max(user.max_transcript_messages for user in users),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Konversi timestamp string lama di history dan users menjadi datetime BSON.
+
+Jalankan sekali setelah upgrade. Sebelum migrasi, sidebar history tetap memuat entry bertimestamp
+string, tapi selalu di bawah semua entry datetime (urutan tipe BSON), apa pun waktunya.
+
+Contoh:
+    python -m tools.migrate_timestamps --source-timezone Asia/Jakarta --batch-size 1000
+    python -m tools.migrate_timestamps --dry-run
+    python -m tools.migrate_timestamps --backfill-events
+"""
+import argparse
+from zoneinfo import ZoneInfo
+import pymongo
+from services.database import connect_to_mongodb, ensure_timeseries_collection, ensure_indexes
+from services.history import parse_legacy_timestamp
+from services.persistence import build_diagnosis_event, EVENT_LOGGED_FIELD
+
+
+# Konversi satu field string ke datetime, batch per batch urut _id supaya bisa dilanjutkan
+def migrate_field(collection, field, source_timezone, batch_size, dry_run):
+    converted, failed = 0, 0
+    last_id = None
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = list(collection.find(query, {field: 1}).sort("_id", pymongo.ASCENDING).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        ops = []
+        for doc in docs:
+            try:
+                value = parse_legacy_timestamp(doc[field], source_timezone)
+            except ValueError:
+                failed += 1
+                continue
+            ops.append(pymongo.UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+
+        if ops and not dry_run:
+            converted += collection.bulk_write(ops, ordered=False).modified_count
+        else:
+            converted += len(ops)
+        print(f"{collection.name}.{field}: {converted} dikonversi, {failed} gagal parse")
+    return converted, failed
+
+
+# Salin dokumen dengue_diagnosis (timestamp sudah datetime) ke time-series collection.
+# Dokumen yang event-nya sudah ada ditandai event_logged (juga oleh aplikasi saat menulis event),
+# jadi perintah ini aman dijalankan ulang atau dilanjutkan setelah gagal di tengah.
+def backfill_events(history_collection, batch_size, dry_run):
+    events_collection = ensure_timeseries_collection()
+    inserted = 0
+    last_id = None
+    while True:
+        query = {"type": "dengue_diagnosis", "timestamp": {"$type": "date"}, EVENT_LOGGED_FIELD: {"$ne": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = list(history_collection.find(
+            query, {"timestamp": 1, "user_id": 1, "type": 1, "risk_level": 1, "mode": 1},
+        ).sort("_id", pymongo.ASCENDING).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        if not dry_run:
+            events_collection.insert_many([build_diagnosis_event(doc) for doc in docs], ordered=False)
+            # Penanda ditulis setelah event tersimpan; gagal di antara keduanya hanya menduplikasi satu batch
+            history_collection.update_many(
+                {"_id": {"$in": [doc["_id"] for doc in docs]}},
+                {"$set": {EVENT_LOGGED_FIELD: True}},
+            )
+        inserted += len(docs)
+        print(f"diagnosis_events: {inserted} event disalin")
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source-timezone", default="UTC", help="Zona waktu server saat timestamp string ditulis")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--backfill-events", action="store_true", help="Isi time-series collection diagnosis_events")
+    args = parser.parse_args()
+
+    source_timezone = ZoneInfo(args.source_timezone)
+    history_collection, users_collection = connect_to_mongodb()
+    if not args.dry_run:
+        ensure_indexes()
+
+    migrate_field(history_collection, "timestamp", source_timezone, args.batch_size, args.dry_run)
+    migrate_field(users_collection, "last_activity", source_timezone, args.batch_size, args.dry_run)
+
+    if args.backfill_events:
+        inserted = backfill_events(history_collection, args.batch_size, args.dry_run)
+        print(f"diagnosis_events: {inserted} event disalin")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Profil cold start halaman login (main.py): import-time per modul dan waktu render pertama.
+
+Import-time diambil dari `python -X importtime -c "import main"` dan diurutkan berdasarkan waktu
+kumulatif. Time-to-first-login-render diukur dengan streamlit AppTest di subprocess baru per run,
+supaya cache import tidak terbawa antar run. MongoDB diganti mongomock (pip install mongomock).
+
+Exit code 1 jika median render pertama melewati --budget-ms. Gate regresi yang sama dijalankan
+pytest di tests/test_startup.py.
+
+Contoh:
+    python -m tools.profile_startup
+    python -m tools.profile_startup --runs 5 --budget-ms 1500
+    python -m tools.profile_startup --top 30 --importtime-output startup_importtime.txt
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from tools.benchmark_utils import print_report
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_SCRIPT = os.path.join(PROJECT_DIR, "main.py")
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "2000"))
+# Modul berat yang tidak boleh dimuat oleh halaman login
+DEFERRED_MODULES = ("pandas", "google.generativeai", "google.api_core", "numpy")
+
+
+def child_env():
+    # Konfigurasi default (termasuk GEMINI_WARMUP) - yang diukur adalah startup seperti di produksi
+    env = dict(os.environ)
+    env.pop("GEMINI_WARMUP", None)
+    env.pop("METRICS_PORT", None)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def parse_importtime(stderr):
+    """Baris `import time: self | cumulative | module` -> list dict (mikrodetik)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        rows.append({"module": module.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return rows
+
+
+def profile_imports(top, output=None):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PROJECT_DIR, env=child_env(), capture_output=True, text=True,
+    )
+    if output:
+        with open(output, "w") as f:
+            f.write(result.stderr)
+    rows = parse_importtime(result.stderr)
+    modules = {row["module"] for row in rows}
+    total = next((row["cumulative_us"] for row in rows if row["module"] == "main"), 0)
+    return {
+        "import_main_ms": round(total / 1000, 1),
+        "top_cumulative": [
+            {"module": row["module"], "cumulative_ms": round(row["cumulative_us"] / 1000, 1), "self_ms": round(row["self_us"] / 1000, 1)}
+            for row in sorted(rows, key=lambda row: row["cumulative_us"], reverse=True)[:top]
+        ],
+        "deferred_modules_loaded": [name for name in DEFERRED_MODULES if name in modules],
+    }
+
+
+def measure_once():
+    """Satu cold start di proses ini - dipanggil lewat subprocess oleh measure_first_render"""
+    process_start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    from tools.load_test import RoundTripCounter, install_database
+    install_database(RoundTripCounter(), None)
+    setup_seconds = time.perf_counter() - process_start
+
+    app = AppTest.from_file(MAIN_SCRIPT, default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    render_seconds = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    if not app.text_input:
+        raise RuntimeError("Form login tidak ter-render")
+    print(json.dumps({
+        "setup_ms": round(setup_seconds * 1000, 1),
+        "first_render_ms": round(render_seconds * 1000, 1),
+        "deferred_modules_loaded": [name for name in DEFERRED_MODULES if name in sys.modules],
+    }))
+
+
+def measure_first_render(runs):
+    results = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-m", "tools.profile_startup", "--measure-once"],
+            cwd=PROJECT_DIR, env=child_env(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            sys.exit(f"Render login gagal:\n{result.stderr}")
+        results.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Cold start terpisah untuk median render pertama")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="Batas median render pertama halaman login")
+    parser.add_argument("--top", type=int, default=20, help="Jumlah modul teratas di laporan import-time")
+    parser.add_argument("--importtime-output", help="Simpan output mentah -X importtime ke file")
+    parser.add_argument("--measure-once", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_once:
+        measure_once()
+        return
+
+    imports = profile_imports(args.top, args.importtime_output)
+    runs = measure_first_render(args.runs)
+    renders = [run["first_render_ms"] for run in runs]
+    median_render = statistics.median(renders)
+    deferred_loaded = sorted(set(imports["deferred_modules_loaded"]).union(*(run["deferred_modules_loaded"] for run in runs)))
+    print_report("Startup halaman login", {
+        "import_main_ms": imports["import_main_ms"],
+        "first_render_ms": renders,
+        "first_render_median_ms": median_render,
+        "setup_ms": statistics.median(run["setup_ms"] for run in runs),
+        "budget_ms": args.budget_ms,
+        "deferred_modules_loaded": deferred_loaded,
+        "top_cumulative": imports["top_cumulative"],
+    })
+    if median_render > args.budget_ms:
+        sys.exit(f"Render pertama {median_render:.0f} ms melewati budget {args.budget_ms:.0f} ms")
+    if deferred_loaded:
+        sys.exit(f"Halaman login memuat modul yang seharusnya ditunda: {', '.join(deferred_loaded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Jalankan ulang diagnosis dengue_diagnosis di history dengan prompt/model saat ini.
+
+Hasil ditulis ke field `rediagnosis` (atau menimpa `diagnosis` dengan --replace).
+Progress disimpan di file checkpoint setiap batch; jalankan ulang perintah yang sama untuk melanjutkan.
+Dokumen yang gagal dicatat di checkpoint (failed_ids) dan dicoba lagi di awal run berikutnya.
+Dengan --replace, diagnosis di array `conversation` dokumen lama ikut diganti; dokumen lama yang
+diagnosisnya tidak ditemukan di conversation dilewati dan dicatat di checkpoint (skipped_ids).
+
+Contoh:
+    python -m tools.rediagnose --backend mock --batch-size 100
+    python -m tools.rediagnose --backend gemini --workers 4 --checkpoint rediagnose.json
+    python -m tools.rediagnose --backend gemini --replace --no-triage
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import pymongo
+from bson import ObjectId
+from services.database import connect_to_mongodb, ensure_indexes
+from services.gemini import get_gemini_client, get_gemini_model, GEMINI_MODEL_NAME, GEMINI_MAX_CONCURRENCY
+from services.history import extract_risk_level, utc_now, decode_responses, encode_text, read_text
+from services.mock_responses import get_mock_diagnosis
+from services.prompts import build_diagnosis_prompt
+from services.reference import open_reference_index
+from services.scoring import score_responses, render_triage_diagnosis
+from services.cache import DIAGNOSIS_CACHE_VERSION
+
+# Jawaban dalam skema lama (responses) maupun ringkas (answers)
+REDIAGNOSE_PROJECTION = {"responses": 1, "answers": 1, "extra_responses": 1, "question_set": 1, "user_id": 1}
+# --replace juga perlu diagnosis lama dan array conversation dokumen lama untuk ikut diganti
+REPLACE_PROJECTION = {**REDIAGNOSE_PROJECTION, "diagnosis": 1, "diagnosis_z": 1, "conversation": 1}
+
+
+def rediagnose_projection(replace):
+    return REPLACE_PROJECTION if replace else REDIAGNOSE_PROJECTION
+
+
+def new_checkpoint():
+    return {"last_id": None, "processed": 0, "failed": 0, "failed_ids": [], "skipped_ids": []}
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return new_checkpoint()
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("last_id"):
+        checkpoint["last_id"] = ObjectId(checkpoint["last_id"])
+    checkpoint["failed_ids"] = [ObjectId(doc_id) for doc_id in checkpoint.get("failed_ids", [])]
+    checkpoint["skipped_ids"] = [ObjectId(doc_id) for doc_id in checkpoint.get("skipped_ids", [])]
+    return checkpoint
+
+
+# Tulis ke file sementara lalu rename supaya checkpoint tidak pernah setengah jadi
+def save_checkpoint(path, checkpoint):
+    data = dict(
+        checkpoint,
+        last_id=str(checkpoint["last_id"]) if checkpoint["last_id"] else None,
+        failed_ids=[str(doc_id) for doc_id in checkpoint["failed_ids"]],
+        skipped_ids=[str(doc_id) for doc_id in checkpoint["skipped_ids"]],
+    )
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class Rediagnoser:
+    """Membuat diagnosis baru untuk satu dokumen history - dipanggil paralel dari worker pool"""
+
+    def __init__(self, backend, reference_index=None, use_triage=True):
+        self.backend = backend
+        self.reference_index = reference_index
+        self.use_triage = use_triage
+        self.model = get_gemini_model() if backend == "gemini" else None
+
+    def diagnose(self, doc):
+        responses = decode_responses(doc)
+        if self.use_triage:
+            triage = score_responses(responses)
+            if triage["decisive"]:
+                return render_triage_diagnosis(triage), "triage"
+        if self.backend == "mock":
+            return get_mock_diagnosis(responses, doc.get("user_id", "unknown")), "mock"
+
+        similar_cases = self.reference_index.similar_cases_for_responses(responses) if self.reference_index else ""
+        # GeminiClient membatasi rate (token bucket) dan concurrency untuk seluruh worker
+        return get_gemini_client().generate(self.model, build_diagnosis_prompt(responses, similar_cases)), GEMINI_MODEL_NAME
+
+
+def find_conversation_diagnosis(doc):
+    """Index pesan diagnosis di array conversation dokumen lama, None jika tidak ditemukan"""
+    old_diagnosis = read_text(doc, "diagnosis")
+    if not old_diagnosis:
+        return None
+    for i, message in enumerate(doc["conversation"]):
+        if message.get("role") == "assistant" and message.get("content") == old_diagnosis:
+            return i
+    return None
+
+
+def build_update(doc, diagnosis, source, replace):
+    """UpdateOne untuk hasil diagnosis ulang; None jika --replace tidak bisa mengganti conversation lama"""
+    risk_level = extract_risk_level(diagnosis)
+    unset = {}
+    if replace:
+        update = {"risk_level": risk_level, "diagnosis_source": source, **encode_text("diagnosis", diagnosis)}
+        if "conversation" in doc:
+            # rebuild_conversation memakai array ini apa adanya - diagnosis di dalamnya harus ikut diganti
+            index = find_conversation_diagnosis(doc)
+            if index is None:
+                return None
+            update[f"conversation.{index}.content"] = diagnosis
+        # Hapus varian lain (teks biasa / terkompresi) supaya diagnosis tetap tersimpan sekali
+        unset = {field: "" for field in ("diagnosis", "diagnosis_z") if field not in update}
+    else:
+        update = {"rediagnosis": {"diagnosis": diagnosis, "risk_level": risk_level, "source": source}}
+    update["rediagnosed_at"] = utc_now()
+    update["prompt_version"] = DIAGNOSIS_CACHE_VERSION
+    return pymongo.UpdateOne({"_id": doc["_id"]}, {"$set": update, **({"$unset": unset} if unset else {})})
+
+
+def rediagnose_batch(history_collection, rediagnoser, pool, docs, replace):
+    """Diagnosis ulang satu batch dan tulis hasilnya; kembalikan _id dokumen yang gagal dan yang dilewati"""
+    futures = [(doc, pool.submit(rediagnoser.diagnose, doc)) for doc in docs]
+    ops = []
+    failed_ids = []
+    skipped_ids = []
+    for doc, future in futures:
+        try:
+            diagnosis, source = future.result()
+        except Exception as e:
+            failed_ids.append(doc["_id"])
+            print(f"Gagal {doc['_id']}: {e}")
+            continue
+        op = build_update(doc, diagnosis, source, replace)
+        if op is None:
+            # Tidak dicoba ulang - hasilnya akan sama; dilaporkan supaya bisa diperiksa manual
+            skipped_ids.append(doc["_id"])
+            print(f"Dilewati {doc['_id']}: diagnosis di conversation lama tidak ditemukan")
+            continue
+        ops.append(op)
+    if ops:
+        history_collection.bulk_write(ops, ordered=False)
+    return failed_ids, skipped_ids
+
+
+def retry_failed(history_collection, rediagnoser, pool, checkpoint, checkpoint_path, batch_size, replace):
+    """Coba lagi dokumen yang gagal di run sebelumnya; yang masih gagal tetap di failed_ids"""
+    pending = checkpoint["failed_ids"]
+    if not pending:
+        return
+    print(f"Mencoba ulang {len(pending)} dokumen yang gagal sebelumnya")
+    still_failed = []
+    for i in range(0, len(pending), batch_size):
+        batch_ids = pending[i:i + batch_size]
+        # Dokumen yang sudah dihapus dari history tidak dicoba lagi
+        docs = list(history_collection.find({"_id": {"$in": batch_ids}}, rediagnose_projection(replace)).sort("_id", pymongo.ASCENDING))
+        failed_ids, skipped_ids = rediagnose_batch(history_collection, rediagnoser, pool, docs, replace)
+        still_failed.extend(failed_ids)
+        checkpoint["skipped_ids"].extend(skipped_ids)
+        checkpoint["failed_ids"] = still_failed + pending[i + batch_size:]
+        checkpoint["failed"] = len(checkpoint["failed_ids"])
+        save_checkpoint(checkpoint_path, checkpoint)
+    print(f"Retry selesai: {len(pending) - len(still_failed)} berhasil, {len(still_failed)} masih gagal")
+
+
+def run(history_collection, rediagnoser, checkpoint, checkpoint_path, batch_size, workers, replace, limit=None):
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rediagnose") as pool:
+        retry_failed(history_collection, rediagnoser, pool, checkpoint, checkpoint_path, batch_size, replace)
+        while limit is None or checkpoint["processed"] < limit:
+            # Query per batch urut _id - tidak ada cursor panjang yang bisa timeout saat rate limit lambat
+            query = {"type": "dengue_diagnosis"}
+            if checkpoint["last_id"] is not None:
+                query["_id"] = {"$gt": checkpoint["last_id"]}
+            size = batch_size if limit is None else min(batch_size, limit - checkpoint["processed"])
+            docs = list(history_collection.find(query, rediagnose_projection(replace)).sort("_id", pymongo.ASCENDING).limit(size))
+            if not docs:
+                break
+
+            start = time.perf_counter()
+            failed_ids, skipped_ids = rediagnose_batch(history_collection, rediagnoser, pool, docs, replace)
+            checkpoint["failed_ids"].extend(failed_ids)
+            checkpoint["skipped_ids"].extend(skipped_ids)
+            checkpoint["failed"] = len(checkpoint["failed_ids"])
+
+            # Checkpoint hanya maju setelah seluruh batch tertulis; yang gagal dicoba lagi di run berikutnya
+            checkpoint["last_id"] = docs[-1]["_id"]
+            checkpoint["processed"] += len(docs)
+            save_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - start
+            print(f"{checkpoint['processed']} diproses, {checkpoint['failed']} gagal - batch {len(docs)} dok dalam {elapsed:.1f}s")
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["gemini", "mock"], default="mock")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=GEMINI_MAX_CONCURRENCY)
+    parser.add_argument("--limit", type=int, help="Maksimal dokumen yang diproses (termasuk run sebelumnya)")
+    parser.add_argument("--checkpoint", default="rediagnose_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Abaikan checkpoint dan mulai dari awal")
+    parser.add_argument("--replace", action="store_true", help="Timpa field diagnosis, bukan menulis ke rediagnosis")
+    parser.add_argument("--no-triage", action="store_true", help="Lewati pre-triage, selalu panggil backend")
+    parser.add_argument("--no-reference", action="store_true", help="Tanpa kasus referensi di prompt")
+    args = parser.parse_args()
+
+    reference_index = None
+    if args.backend == "gemini" and not args.no_reference:
+        reference_index = open_reference_index()
+
+    history_collection, _ = connect_to_mongodb()
+    ensure_indexes()
+    checkpoint = new_checkpoint() if args.restart else load_checkpoint(args.checkpoint)
+    if checkpoint["last_id"] is not None:
+        print(f"Melanjutkan setelah {checkpoint['last_id']} ({checkpoint['processed']} sudah diproses)")
+
+    rediagnoser = Rediagnoser(args.backend, reference_index, use_triage=not args.no_triage)
+    checkpoint = run(history_collection, rediagnoser, checkpoint, args.checkpoint, args.batch_size, args.workers, args.replace, args.limit)
+    print(f"Selesai: {checkpoint['processed']} diproses, {checkpoint['failed']} gagal")
+    if checkpoint["skipped_ids"]:
+        print(f"Dilewati (conversation lama tanpa diagnosis yang cocok): {[str(doc_id) for doc_id in checkpoint['skipped_ids']]}")
+    if args.backend == "gemini":
+        print(f"Gemini: {get_gemini_client().get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
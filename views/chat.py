@@ -1,39 +1,36 @@
 import streamlit as st
-import pymongo
-import pandas as pd
-import google.generativeai as genai
-import os
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from dotenv import load_dotenv
+import sys
 import time
+import functools
 import uuid
 import re
-from google.api_core.exceptions import ResourceExhausted, DeadlineExceeded
-import random
+from services.database import connect_to_mongodb, check_health, get_pool_stats, ensure_indexes, verify_indexes, MONGODB_HEALTH_CHECK_INTERVAL
+from services.history import get_history_page, load_history_entry, get_transcript_page, build_diagnosis_record, build_followup_record, rebuild_conversation, decode_responses, format_history_time, utc_now, HISTORY_PAGE_SIZE, HISTORY_LABEL_PROJECTION, HISTORY_CACHE_TTL, TRANSCRIPT_MAX_MESSAGES, TRANSCRIPT_PAGE_SIZE
+from services.timing import RerunTimer, FULL_RERUN, FRAGMENT_RERUN
+from services.gemini import get_gemini_client, get_gemini_model, describe_gemini_error
+from services.reference import ReferenceIndex, open_reference_index
+from services.questionnaire import questions, options, welcome_message, FOLLOWUP_INVITATION
+from services.scoring import PRE_TRIAGE_ENABLED, score_responses, render_triage_diagnosis
+from services.prompts import build_diagnosis_prompt, build_followup_prompt
+from services.mock_responses import get_mock_diagnosis, get_mock_followup_answer, MOCK_RESPONSE_DELAY, MOCK_STREAM_DELAY
+from services.cache import get_diagnosis_cache, get_followup_cache
+from services.persistence import save_history_record, get_history_writer
+from services.session_store import sync_current_session
+from services.metrics import timed, observe, observe_size, start_rerun_profile, get_rerun_profile, get_registry, PROFILER_PANEL
 
 # Load environment variables
 load_dotenv()
 
-# Configure MongoDB connection
-def connect_to_mongodb():
-    mongo_uri = os.getenv("MONGODB_URI")
-    try:
-        client = pymongo.MongoClient(mongo_uri)
-        db = client["Aedra_Ai"]  # Use the existing Aedra_Ai database
-        history_collection = db["history"]  # Access the history collection
-        users_collection = db["users"]      # Access the users collection
-        return history_collection, users_collection
-    except Exception as e:
-        st.error(f"❌ Gagal koneksi ke MongoDB: {e}")
-        st.stop() # Stop execution if database connection fails
-
 # Test koneksi MongoDB (hanya untuk debugging awal, tidak dipanggil di sidebar utama)
 def test_mongodb_connection():
     try:
         history_collection, users_collection = connect_to_mongodb()
         
         # Test ping database
-        client = history_collection.database.client
-        client.admin.command('ping')
+        if not check_health(force=True):
+            raise ConnectionError(get_pool_stats()["last_error"])
         
         # Hitung jumlah dokumen di setiap collection
         history_count = history_collection.count_documents({})
@@ -48,325 +45,204 @@ def test_mongodb_connection():
         st.error(f"❌ Koneksi MongoDB gagal: {e}")
         return False, None, None
 
-# Configure Gemini API
+# Configure Gemini API - shared model, dibuat sekali per proses
 def configure_gemini():
     if st.session_state.DEVELOPMENT_MODE: # Menggunakan st.session_state untuk DEVELOPMENT_MODE
         return None  # Tidak konfigurasi Gemini di mode testing
     
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    return model
+    return get_gemini_model()
 
-# Load reference data from CSV
-@st.cache_data
-def load_reference_data():
+# Similarity index over the reference cases - dimuat sekali per proses, baru saat pertama dibutuhkan.
+# Dataset build (tools/build_reference_dataset.py) di-memory-map; tanpa itu CSV di-parse.
+@st.cache_resource
+def load_reference_index():
     try:
-        df = pd.read_csv("views/DATA DBD.csv")
-        return df
+        return open_reference_index()
     except Exception as e:
         st.error(f"Error loading reference data: {e}")
-        return pd.DataFrame()
-
-# MOCK RESPONSES untuk testing - tanpa Gemini
-def get_mock_diagnosis(responses):
-    """Memberikan diagnosis palsu untuk testing database"""
-    
-    # Hitung score berdasarkan jawaban
-    risk_score = 0
-    total_questions = len(responses)
-    
-    for question, answer in responses.items():
-        if "ya" in answer.lower():
-            risk_score += 2
-        elif "sering" in answer.lower() or "parah" in answer.lower():
-            risk_score += 2
-        elif "kadang" in answer.lower() or "sedang" in answer.lower():
-            risk_score += 1
-        elif "lebih dari 3 hari" in answer.lower():
-            risk_score += 2
-        elif "2-3 hari" in answer.lower():
-            risk_score += 1
-    
-    # Tentukan tingkat risiko
-    risk_percentage = (risk_score / (total_questions * 2)) * 100
-    
-    if risk_percentage >= 70:
-        risk_level = "TINGGI"
-        color_icon = "🔴"
-    elif risk_percentage >= 40:
-        risk_level = "SEDANG" 
-        color_icon = "🟡"
-    else:
-        risk_level = "RENDAH"
-        color_icon = "🟢"
-    
-    diagnosis = f"""
-**{color_icon} HASIL ANALISIS GEJALA DEMAM BERDARAH (MODE TESTING)**
-
-**Kemungkinan Demam Berdarah: {risk_level}**
-*Score: {risk_score}/{total_questions * 2} ({risk_percentage:.1f}%)*
-
-🩺 **Tindakan yang Direkomendasikan:**
-- {"Segera konsultasi dengan dokter atau kunjungi rumah sakit" if risk_percentage >= 70 else "Konsultasi dengan dokter untuk pemeriksaan lebih lanjut" if risk_percentage >= 40 else "Pantau gejala dan istirahat yang cukup"}
-- Perbanyak minum air putih untuk mencegah dehidrasi
-- Istirahat yang cukup
-- Pantau suhu tubuh secara berkala
-
-⚠️ **Tanda Peringatan Penting:**
-- Nyeri perut yang hebat dan terus-menerus
-- Muntah terus-menerus (lebih dari 3x dalam sehari)  
-- Perdarahan dari hidung, gusi, atau bintik merah di kulit
-- Sesak napas atau kesulitan bernapas
-- Penurunan kesadaran atau gelisah
-
-🚨 **Segera Cari Bantuan Medis Jika:**
-- Demam tinggi tidak turun setelah 3 hari
-- Muncul tanda-tanda perdarahan
-- Muntah darah atau BAB berdarah
-- Pingsan atau penurunan kesadaran
-
-**📝 Catatan Testing:**
-- Ini adalah response MOCK untuk testing database
-- Data telah disimpan ke MongoDB
-- Timestamp: {time.strftime("%Y-%m-%d %H:%M:%S")}
-- User ID: {st.session_state.get('user_id', 'unknown')}
-
-⚠️ **Disclaimer:** Hasil ini hanya untuk testing sistem. Konsultasi dengan tenaga medis profesional untuk diagnosis yang akurat.
-"""
-    
-    return diagnosis
-
-def get_mock_followup_answer(question):
-    """Memberikan jawaban palsu untuk pertanyaan lanjutan"""
-    
-    question_lower = question.lower()
-    
-    if any(word in question_lower for word in ['pencegahan', 'cegah', 'hindari']):
-        return """
-**PENCEGAHAN DEMAM BERDARAH (MODE TESTING)**
-
-🏠 **3M Plus:**
-- **Menguras:** Bak mandi, tandon air minimal 1 minggu sekali
-- **Menutup:** Tempat penampungan air rapat-rapat
-- **Mengubur:** Barang bekas yang bisa menampung air
-
-➕ **Plus:**
-- Gunakan obat nyamuk/anti nyamuk
-- Pasang kawat kasa di ventilasi
-- Pakai baju lengan panjang
-- Tanam tanaman pengusir nyamuk
-
-*📝 Ini adalah response MOCK untuk testing database*
-"""
-    
-    elif any(word in question_lower for word in ['gejala', 'tanda']):
-        return """
-**GEJALA DEMAM BERDARAH (MODE TESTING)**
-
-🌡️ **Gejala Utama:**
-- Demam tinggi mendadak (38-40°C)
-- Sakit kepala hebat
-- Nyeri di belakang mata
-- Nyeri otot dan sendi
-
-🔍 **Gejala Lanjutan:**
-- Ruam kulit atau bintik merah
-- Mual dan muntah
-- Perdarahan ringan (mimisan, gusi berdarah)
-
-*📝 Ini adalah response MOCK untuk testing database*
-"""
-    
-    elif any(word in question_lower for word in ['obat', 'pengobatan', 'terapi']):
-        return """
-**PENGOBATAN DEMAM BERDARAH (MODE TESTING)**
-
-💊 **Tidak Ada Obat Khusus:**
-- Belum ada obat antiviral spesifik untuk dengue
-- Pengobatan bersifat suportif
-
-🏥 **Perawatan:**
-- Istirahat total
-- Minum banyak air putih
-- Kompres untuk menurunkan demam
-- Pantau jumlah trombosit
-
-⚠️ **Hindari:** Aspirin dan ibuprofen
-
-*📝 Ini adalah response MOCK untuk testing database*
-"""
-    
-    else:
-        return f"""
-**INFORMASI UMUM DEMAM BERDARAH (MODE TESTING)**
-
-Terima kasih atas pertanyaan: "{question}"
-
-🦟 **Tentang Demam Berdarah:**
-- Penyakit yang disebabkan virus dengue
-- Ditularkan melalui gigitan nyamuk Aedes aegypti
-- Masa inkubasi 4-7 hari
-- Bisa menyerang siapa saja
-
-📞 **Untuk informasi lebih lanjut, hubungi:**
-- Puskesmas terdekat
-- Hotline kesehatan daerah
-- Dokter keluarga
-
-*📝 Ini adalah response MOCK untuk testing database - Timestamp: {time.strftime("%Y-%m-%d %H:%M:%S")}*
+        return ReferenceIndex.empty()
+
+# Simulasi streaming untuk response MOCK - memecah teks per kata
+def stream_mock_text(text, delay=MOCK_STREAM_DELAY):
+    for word in re.split(r"(\s+)", text):
+        if word:
+            yield word
+            if not word.isspace():
+                time.sleep(delay)
+
+# Stream Gemini response chunk by chunk - fallback ke MOCK jika gagal (atau kosong) sebelum chunk pertama
+def stream_gemini_response(prompt, fallback, fallback_label, on_complete=None):
+    started = False
+    try:
+        start_time = time.perf_counter()
+        gemini_model = configure_gemini()
+        chunks = []
+        for text in get_gemini_client().stream(gemini_model, prompt):
+            started = True
+            chunks.append(text)
+            yield text
+        text = "".join(chunks)
+        if text.strip():
+            # on_complete (cache) hanya untuk stream yang selesai tanpa error dan tidak kosong
+            if on_complete:
+                on_complete(text, time.perf_counter() - start_time)
+            return
+    except Exception as e:
+        st.error(describe_gemini_error(e))
 
-**Disclaimer:** Ini adalah response untuk testing. Selalu konsultasi dengan tenaga medis profesional.
-"""
+    if not started:
+        get_gemini_client().record_fallback()
+        st.info(f"Menggunakan fallback response ({fallback_label})...")
+        yield from stream_mock_text(fallback())
 
 # Process user responses - dengan pilihan REAL atau MOCK
-def analyze_symptoms(responses, reference_data, user_id):
+@timed()
+def analyze_symptoms(responses, reference_index, user_id):
     if st.session_state.DEVELOPMENT_MODE: # Menggunakan st.session_state
         # Mode testing - gunakan mock response
         st.info("🧪 Mode Testing: Menggunakan response palsu (tidak memanggil Gemini)")
-        time.sleep(1)  # Simulasi loading
-        return get_mock_diagnosis(responses)
+        time.sleep(MOCK_RESPONSE_DELAY)  # Simulasi loading
+        return get_mock_diagnosis(responses, user_id)
     else:
-        # Mode production - gunakan Gemini API
+        # Pre-triage - kasus yang jelas rendah/tinggi dijawab langsung tanpa Gemini
+        if PRE_TRIAGE_ENABLED:
+            triage = score_responses(responses)
+            if triage["decisive"]:
+                return render_triage_diagnosis(triage)
+
+        # Mode production - cek cache diagnosis sebelum memanggil Gemini API
+        diagnosis_cache = get_diagnosis_cache()
+        cached_diagnosis = diagnosis_cache.get(responses)
+        if cached_diagnosis is not None:
+            return cached_diagnosis
+
         try:
+            start_time = time.perf_counter()
             gemini_model = configure_gemini()
+            prompt = build_diagnosis_prompt(responses, reference_index.similar_cases_for_responses(responses))
             
-            symptom_summary = []
-            for question, answer in responses.items():
-                # Improved symptom extraction based on keywords
-                if "demam" in question.lower():
-                    symptom_summary.append(f"Demam: {answer}")
-                elif "nyeri" in question.lower() and ("mata" in question.lower() or "otot" in question.lower() or "sendi" in question.lower()):
-                    symptom_summary.append(f"Nyeri: {answer}")
-                elif "lelah" in question.lower() or "lemas" in question.lower():
-                    symptom_summary.append(f"Kelelahan/Kelemasan: {answer}")
-                elif "mual" in question.lower() or "muntah" in question.lower():
-                    symptom_summary.append(f"Mual/Muntah: {answer}")
-                elif "ruam" in question.lower() or "bintik" in question.lower():
-                    symptom_summary.append(f"Ruam kulit: {answer}")
-                elif "perdarahan" in question.lower():
-                    symptom_summary.append(f"Perdarahan: {answer}")
-                elif "sakit kepala" in question.lower():
-                    symptom_summary.append(f"Sakit kepala: {answer}")
-                elif "perut" in question.lower():
-                    symptom_summary.append(f"Nyeri perut: {answer}")
-                elif "pusing" in question.lower() or "pingsan" in question.lower():
-                    symptom_summary.append(f"Pusing/Pingsan: {answer}")
-                elif "makan" in question.lower() or "minum" in question.lower():
-                    symptom_summary.append(f"Kesulitan makan/minum: {answer}")
-                else: # Fallback for any other questions
-                    symptom_summary.append(f"{question.split(' ')[1]}: {answer}") # Take the second word of question as generic symptom
-
-            
-            prompt = f"""
-            Analisis gejala demam berdarah dalam Bahasa Indonesia:
-            
-            Gejala pasien: {'; '.join(symptom_summary)}.
-            
-            Berikan:
-            1. Kemungkinan demam berdarah (Tinggi/Sedang/Rendah)
-            2. Tindakan direkomendasikan
-            3. Tanda peringatan penting
-            4. Kapan mencari bantuan medis
-            
-            Jawaban singkat, jelas, dan menggunakan format Markdown untuk poin-poin.
-            """
-            
-            response = gemini_model.generate_content(prompt)
-            return response.text
-        except ResourceExhausted:
-            st.error("❌ Kuota Gemini API habis atau batas rate tercapai. Coba lagi nanti.")
-            st.info("Menggunakan fallback response (mock diagnosis)...")
-            return get_mock_diagnosis(responses)
-        except DeadlineExceeded:
-            st.error("❌ Permintaan ke Gemini API timeout. Koneksi mungkin lambat atau server sibuk.")
-            st.info("Menggunakan fallback response (mock diagnosis)...")
-            return get_mock_diagnosis(responses)
+            diagnosis = get_gemini_client().generate(gemini_model, prompt)
+            if diagnosis.strip():
+                diagnosis_cache.set(responses, diagnosis, time.perf_counter() - start_time)
+            return diagnosis
         except Exception as e:
-            st.error(f"Error calling Gemini API: {e}")
+            st.error(describe_gemini_error(e))
+            get_gemini_client().record_fallback()
             st.info("Menggunakan fallback response (mock diagnosis)...")
-            return get_mock_diagnosis(responses)
+            return get_mock_diagnosis(responses, user_id)
+
+# Streaming version of analyze_symptoms - yields chunks for st.write_stream
+@timed()
+def stream_symptom_analysis(responses, reference_index, user_id):
+    if st.session_state.DEVELOPMENT_MODE:
+        # Mode testing - stream mock response
+        st.info("🧪 Mode Testing: Menggunakan response palsu (tidak memanggil Gemini)")
+        yield from stream_mock_text(get_mock_diagnosis(responses, user_id))
+    else:
+        # Pre-triage - kasus yang jelas rendah/tinggi dijawab langsung tanpa Gemini
+        if PRE_TRIAGE_ENABLED:
+            triage = score_responses(responses)
+            if triage["decisive"]:
+                yield render_triage_diagnosis(triage)
+                return
+
+        # Cache hit - tampilkan langsung tanpa memanggil Gemini API
+        diagnosis_cache = get_diagnosis_cache()
+        cached_diagnosis = diagnosis_cache.get(responses)
+        if cached_diagnosis is not None:
+            yield cached_diagnosis
+            return
+
+        yield from stream_gemini_response(
+            build_diagnosis_prompt(responses, reference_index.similar_cases_for_responses(responses)),
+            lambda: get_mock_diagnosis(responses, user_id),
+            "mock diagnosis",
+            on_complete=lambda text, latency: diagnosis_cache.set(responses, text, latency),
+        )
 
 # Process follow-up questions - dengan pilihan REAL atau MOCK
-def answer_followup_question(question, reference_data):
+@timed()
+def answer_followup_question(question, reference_index):
     if st.session_state.DEVELOPMENT_MODE: # Menggunakan st.session_state
         # Mode testing - gunakan mock response
         st.info("🧪 Mode Testing: Menggunakan response palsu untuk pertanyaan lanjutan")
-        time.sleep(1)  # Simulasi loading
+        time.sleep(MOCK_RESPONSE_DELAY)  # Simulasi loading
         return get_mock_followup_answer(question)
     else:
-        # Mode production - gunakan Gemini API
+        # Mode production - cek semantic cache sebelum memanggil Gemini API
+        followup_cache = get_followup_cache()
+        cached_answer = followup_cache.get(question)
+        if cached_answer is not None:
+            return cached_answer
+
         try:
             gemini_model = configure_gemini()
+            prompt = build_followup_prompt(question, reference_index.similar_cases_for_text(question))
             
-            prompt = f"""
-            Jawab pertanyaan tentang demam berdarah dalam Bahasa Indonesia:
-            
-            Pertanyaan: {question}
-            
-            Berikan jawaban singkat, akurat, dan medis. Jika tidak terkait demam berdarah, 
-            arahkan kembali ke topik demam berdarah.
-            
-            Sertakan disclaimer bahwa ini bukan pengganti konsultasi medis profesional.
-            """
-            
-            response = gemini_model.generate_content(prompt)
-            return response.text
-        except ResourceExhausted:
-            st.error("❌ Kuota Gemini API habis atau batas rate tercapai. Coba lagi nanti.")
-            st.info("Menggunakan fallback response (mock jawaban)...")
-            return get_mock_followup_answer(question)
-        except DeadlineExceeded:
-            st.error("❌ Permintaan ke Gemini API timeout. Koneksi mungkin lambat atau server sibuk.")
-            st.info("Menggunakan fallback response (mock jawaban)...")
-            return get_mock_followup_answer(question)
+            answer = get_gemini_client().generate(gemini_model, prompt)
+            if answer.strip():
+                followup_cache.set(question, answer)
+            return answer
         except Exception as e:
-            st.error(f"Error calling Gemini API: {e}")
+            st.error(describe_gemini_error(e))
+            get_gemini_client().record_fallback()
             st.info("Menggunakan fallback response (mock jawaban)...")
             return get_mock_followup_answer(question)
 
+# Streaming version of answer_followup_question
+@timed()
+def stream_followup_answer(question, reference_index):
+    if st.session_state.DEVELOPMENT_MODE:
+        # Mode testing - stream mock response
+        st.info("🧪 Mode Testing: Menggunakan response palsu untuk pertanyaan lanjutan")
+        yield from stream_mock_text(get_mock_followup_answer(question))
+    else:
+        # Cache hit - pertanyaan serupa sudah pernah dijawab
+        followup_cache = get_followup_cache()
+        cached_answer = followup_cache.get(question)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+        yield from stream_gemini_response(
+            build_followup_prompt(question, reference_index.similar_cases_for_text(question)),
+            lambda: get_mock_followup_answer(question),
+            "mock jawaban",
+            on_complete=lambda text, latency: followup_cache.set(question, text),
+        )
+
 # Save diagnosis to MongoDB
+@timed()
 def save_to_mongodb(user_id, user_responses, diagnosis):
     try:
-        history_collection, users_collection = connect_to_mongodb()
-        
-        # Reconstruct conversation messages for this diagnosis
-        conversation = [
-            {"role": "assistant", "content": f"Halo! Selamat datang di Aedra{' (Mode Testing)' if st.session_state.DEVELOPMENT_MODE else ''}. Saya akan membantu Anda menilai gejala-gejala yang mungkin terkait dengan demam berdarah (dengue fever). Mari kita mulai dengan beberapa pertanyaan."}
-        ]
-        for question in questions:
-            if question in user_responses:
-                conversation.append({"role": "assistant", "content": question})
-                conversation.append({"role": "user", "content": user_responses[question]})
-        conversation.append({"role": "assistant", "content": diagnosis})
-        conversation.append({"role": "assistant", "content": "Anda dapat bertanya lebih lanjut tentang demam berdarah atau memulai tes baru."})
-        
-        # Save to history collection
-        history_record = {
-            "user_id": user_id,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "type": "dengue_diagnosis",
-            "responses": user_responses,
-            "diagnosis": diagnosis,
-            "conversation": conversation,
-            "mode": "testing" if st.session_state.DEVELOPMENT_MODE else "production"
-        }
-        result = history_collection.insert_one(history_record)
-        
-        # Update user's last activity in users collection
-        users_collection.update_one(
-            {"user_id": user_id},
+        # Save to history collection - skema ringkas, percakapan dibangun ulang saat dibuka dari sidebar
+        history_record = build_diagnosis_record(
+            user_id,
+            user_responses,
+            diagnosis,
+            "testing" if st.session_state.DEVELOPMENT_MODE else "production",
+            utc_now(),
+        )
+        # Update user's last activity in users collection (ditulis bersama dalam batch)
+        inserted_id = save_history_record(
+            history_record,
+            get_user_filter(user_id),
             {
                 "$set": {
-                    "last_activity": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "last_activity": utc_now(),
                     "last_diagnosis_type": "dengue"
                 },
                 "$inc": {"diagnosis_count": 1}
             },
-            upsert=True
         )
         
+        remember_history_entry(history_record)
+        # Turn diagnosis: pesan pembuka sampai jawaban terakhir, ditambah diagnosis dan undangan follow-up
+        # (dipotong setelah keduanya ditambahkan - trim_transcript)
+        remember_transcript_turn(history_record, len(st.session_state.messages) + 2)
+        
         if st.session_state.DEVELOPMENT_MODE:
-            st.success(f"✅ Data diagnosis berhasil disimpan ke MongoDB! ID: {result.inserted_id}")
+            st.success(f"✅ Data diagnosis berhasil disimpan ke MongoDB! ID: {inserted_id}")
         
         return True
     except Exception as e:
@@ -374,102 +250,295 @@ def save_to_mongodb(user_id, user_responses, diagnosis):
         return False
 
 # Save follow-up question to MongoDB
+@timed()
 def save_followup_to_mongodb(user_id, question, answer):
     try:
-        history_collection, users_collection = connect_to_mongodb()
-        
-        # Reconstruct conversation for this follow-up
-        conversation = [
-            {"role": "user", "content": question},
-            {"role": "assistant", "content": answer}
-        ]
-        
         # Save to history collection
-        history_record = {
-            "user_id": user_id,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "type": "followup_question",
-            "question": question,
-            "answer": answer,
-            "conversation": conversation,
-            "mode": "testing" if st.session_state.DEVELOPMENT_MODE else "production"
-        }
-        result = history_collection.insert_one(history_record)
-        
-        # Update user's last activity in users collection
-        users_collection.update_one(
-            {"user_id": user_id},
+        history_record = build_followup_record(
+            user_id,
+            question,
+            answer,
+            "testing" if st.session_state.DEVELOPMENT_MODE else "production",
+            utc_now(),
+        )
+        # Update user's last activity in users collection (ditulis bersama dalam batch)
+        inserted_id = save_history_record(
+            history_record,
+            get_user_filter(user_id),
             {
                 "$set": {
-                    "last_activity": time.strftime("%Y-%m-%d %H:%M:%S")
+                    "last_activity": utc_now()
                 },
                 "$inc": {"question_count": 1}
             },
-            upsert=True
         )
         
+        remember_history_entry(history_record)
+        # Turn follow-up: pertanyaan user dan jawaban
+        remember_transcript_turn(history_record, 2)
+        
         if st.session_state.DEVELOPMENT_MODE:
-            st.success(f"✅ Pertanyaan lanjutan berhasil disimpan! ID: {result.inserted_id}")
+            st.success(f"✅ Pertanyaan lanjutan berhasil disimpan! ID: {inserted_id}")
         
         return True
     except Exception as e:
         st.error(f"❌ Error saving follow-up question to database: {e}")
         return False
 
-# Get or create user_id
+# Ping dan pemeriksaan index untuk panel Mode Testing - di-cache per proses, bukan query di setiap rerun
+@st.cache_data(ttl=MONGODB_HEALTH_CHECK_INTERVAL, show_spinner=False)
+def get_database_status():
+    check_health(force=True)
+    return {"checked_at": time.strftime("%H:%M:%S"), "missing_indexes": verify_indexes()}
+
+# Metrik rerun penuh: durasi script sampai selesai, atau sampai rerun_app() memotongnya
+def record_rerun_metrics():
+    if is_fragment_rerun():
+        return  # Durasi rerun fragment dicatat chat_fragment per bagian
+    script_seconds = time.perf_counter() - script_start
+    get_rerun_timer().record("script_total", script_seconds)
+    observe("rerun", script_seconds)
+    observe_size("session_transcript", transcript_bytes(st.session_state.messages))
+
+# st.rerun() - kode setelahnya (termasuk laporan di akhir script) tidak dijalankan, jadi metrik dicatat dulu
+def rerun_app():
+    record_rerun_metrics()
+    st.rerun()
+
+# Per-session timer for the rerun timing report
+def get_rerun_timer():
+    if "rerun_timer" not in st.session_state:
+        st.session_state.rerun_timer = RerunTimer()
+    return st.session_state.rerun_timer
+
+# user_id akun diisi oleh form login di main.py; tanpa login (mis. load test) dipakai ID sesi sementara
 def get_user_id():
     if "user_id" not in st.session_state:
         st.session_state.user_id = str(uuid.uuid4())
     return st.session_state.user_id
 
+# Counter aktivitas hanya untuk akun yang login - sesi anonim tidak membuat dokumen users baru
+def get_user_filter(user_id):
+    return {"user_id": user_id} if st.session_state.get("logged_in") else None
+
 # Get conversation history from MongoDB for sidebar display
+@timed()
 def get_conversation_history(user_id):
-    history_collection, _ = connect_to_mongodb()
-    # Fetch history for the current user, sorted by timestamp descending
-    # Include conversation field for reloading chats
-    return list(history_collection.find(
-        {"user_id": user_id},
-        {
-            "type": 1,
-            "timestamp": 1,
-            "question": 1,
-            "diagnosis": 1,
-            "conversation": 1,
-            "_id": 1  # Include _id for clickable buttons
+    # Label history di-cache per sesi; query ulang hanya saat user berganti atau cache kedaluwarsa
+    cache = st.session_state.get("history_cache")
+    if cache is None or cache["user_id"] != user_id or time.monotonic() - cache["loaded_at"] > HISTORY_CACHE_TTL:
+        with get_rerun_timer().section("history_query"):
+            entries = get_history_page(user_id)
+        if cache is None or cache["user_id"] != user_id:
+            st.session_state.history_older = []
+            st.session_state.history_exhausted = False
+        # Record baru yang belum tertulis oleh writer async tetap tampil di atas halaman pertama
+        loaded_ids = {entry["_id"] for entry in entries}
+        pending = [entry for entry in st.session_state.get("history_pending", []) if entry["_id"] not in loaded_ids]
+        st.session_state.history_pending = pending
+        cache = {"user_id": user_id, "entries": pending + entries, "loaded_at": time.monotonic()}
+        st.session_state.history_cache = cache
+    return cache["entries"] + st.session_state.history_older
+
+# Record baru: halaman sidebar di-query ulang (cursor "Muat lebih banyak" ikut direset), bukan disisipkan ke cache
+def remember_history_entry(record):
+    cache = st.session_state.get("history_cache")
+    if cache is not None and cache["user_id"] == record["user_id"]:
+        label = {key: record[key] for key in HISTORY_LABEL_PROJECTION if key in record}
+        st.session_state.history_pending = [label] + st.session_state.get("history_pending", [])
+        st.session_state.history_cache = None
+
+# --- Transcript terbatas: session state hanya menahan TRANSCRIPT_MAX_MESSAGES pesan terakhir ---
+# Mulai transcript baru; `record` = entry history yang dibuka dari sidebar sebagai isi awal
+def reset_transcript(messages, record=None):
+    st.session_state.messages = messages
+    # (_id history, jumlah pesan) per turn, terlama dulu - _id None untuk entry yang tidak bisa dimuat ulang
+    st.session_state.transcript_turns = []
+    st.session_state.transcript_trimmed = None
+    st.session_state.transcript_pages = 0
+    if record is not None:
+        st.session_state.transcript_turns.append((record.get("_id"), len(messages)))
+
+def append_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+
+# Turn baru (`message_count` pesan) milik dokumen history `record`; trim_transcript dipanggil
+# setelah semua pesan turn ini ditambahkan ke transcript
+def remember_transcript_turn(record, message_count):
+    st.session_state.transcript_turns.append((record["_id"], message_count))
+
+# Buang turn tersimpan terlama (utuh) sampai transcript di bawah batas; turn terakhir selalu ditahan
+def trim_transcript():
+    messages = st.session_state.messages
+    turns = st.session_state.transcript_turns
+    trimmed = st.session_state.transcript_trimmed
+    while len(messages) > TRANSCRIPT_MAX_MESSAGES and len(turns) > 1:
+        entry_id, count = turns.pop(0)
+        del messages[:count]
+        # Dict baru, bukan mutasi - objek lama bisa dipegang snapshot session store
+        # ids: _id entry history yang dipotong, terlama dulu
+        trimmed = trimmed or {"ids": [], "messages": 0}
+        trimmed = {
+            "ids": trimmed["ids"] + ([entry_id] if entry_id is not None else []),
+            "messages": trimmed["messages"] + count,
         }
-    ).sort("timestamp", pymongo.DESCENDING).limit(10))
-
-# Define all questions
-questions = [
-    "Apakah Anda mengalami demam tinggi secara tiba-tiba (di atas 38°C)?",
-    "Sudah berapa hari Anda mengalami demam?",
-    "Apakah Anda merasa nyeri di belakang mata?",
-    "Apakah Anda mengalami nyeri otot atau sendi yang parah (sering disebut 'breakbone fever')?",
-    "Apakah Anda mengalami sakit kepala berat?",
-    "Apakah Anda merasa sangat lelah atau lemas meskipun hanya sedikit aktivitas?",
-    "Apakah Anda mengalami mual atau muntah?",
-    "Apakah Anda mengalami ruam kulit atau bintik-bintik merah?",
-    "Apakah Anda mengalami perdarahan ringan, seperti mimisan atau gusi berdarah?",
-    "Apakah perut Anda terasa nyeri, terutama di bagian bawah kanan?",
-    "Apakah Anda merasa pusing atau ingin pingsan saat berdiri?",
-    "Apakah Anda kesulitan makan atau minum karena merasa mual atau lemas?"
-]
-
-# Options for each question
-options = [
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["1 hari", "2–3 hari", "Lebih dari 3 hari"],
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["Tidak", "Kadang", "Sering"],
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["Ya", "Tidak"],
-    ["Ya", "Tidak", "Tidak Yakin"],
-    ["Ya", "Tidak", "Kadang-kadang"],
-    ["Tidak", "Sedikit", "Parah"]
-]
+    st.session_state.transcript_trimmed = trimmed
+
+# Ukuran teks transcript di memori (byte) - metrik session_transcript_bytes
+def transcript_bytes(messages):
+    return sum(sys.getsizeof(message["content"]) for message in messages)
+
+# Load the next history page after the last loaded entry
+def load_more_history(user_id, last_entry):
+    page = get_history_page(user_id, after=last_entry)
+    st.session_state.history_older.extend(page)
+    st.session_state.history_exhausted = len(page) < HISTORY_PAGE_SIZE
+
+# True jika rerun ini hanya menjalankan fragment (klik di dalam @st.fragment), bukan seluruh script
+def is_fragment_rerun():
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+# Fragment chat: bagian yang dicatat RerunTimer dipisah per jenis rerun (penuh vs fragment).
+# Rerun fragment tidak melewati sync di main.py - perubahan state dari fragment ditulis di sini.
+def chat_fragment(func):
+    @st.fragment
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        get_rerun_timer().scope = FRAGMENT_RERUN if is_fragment_rerun() else FULL_RERUN
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sync_current_session(st.session_state)
+    return wrapper
+
+# --- Sidebar history fragment - "Muat lebih banyak" hanya menjalankan ulang bagian ini ---
+@chat_fragment
+def render_history_sidebar(user_id):
+    with get_rerun_timer().section("sidebar_history"):
+        st.header("📚 Riwayat Percakapan")
+        history = get_conversation_history(user_id)
+
+        if history:
+            for entry in history:
+                entry_type = entry.get("type", "unknown")
+                timestamp = format_history_time(entry.get("timestamp"))  # Just show time
+                entry_id = str(entry["_id"])  # MongoDB ObjectId for button key
+
+                if entry_type == "dengue_diagnosis":
+                    risk_level = entry.get("risk_level", "N/A")
+                    label = f"Diagnosis ({timestamp}) - Risiko: {risk_level}"
+                    if st.button(label, key=f"history_{entry_id}"):
+                        # Load the full conversation only when clicked
+                        full_entry = load_history_entry(entry_id) or {}
+                        reset_transcript(rebuild_conversation(full_entry), full_entry)
+                        st.session_state.diagnosis_complete = True
+                        st.session_state.allow_followup = True
+                        st.session_state.current_question = len(questions)
+                        st.session_state.user_responses = decode_responses(full_entry)
+                        rerun_app()
+                elif entry_type == "followup_question":
+                    question_text = entry.get("question", "Tidak ada pertanyaan")
+                    display_question = (question_text[:40] + '...') if len(question_text) > 40 else question_text
+                    label = f"Tanya ({timestamp}) - {display_question}"
+                    if st.button(label, key=f"history_{entry_id}"):
+                        # Load the full conversation only when clicked
+                        full_entry = load_history_entry(entry_id) or {}
+                        reset_transcript(rebuild_conversation(full_entry), full_entry)
+                        st.session_state.diagnosis_complete = True
+                        st.session_state.allow_followup = True
+                        st.session_state.current_question = len(questions)
+                        st.session_state.user_responses = {}  # Clear responses for follow-up
+                        rerun_app()
+
+            if len(history) >= HISTORY_PAGE_SIZE and not st.session_state.history_exhausted:
+                if st.button("Muat lebih banyak", key="history_load_more"):
+                    load_more_history(user_id, history[-1])
+                    st.rerun(scope="fragment")
+        else:
+            st.info("Belum ada riwayat percakapan.")
+
+def load_earlier_messages():
+    st.session_state.transcript_pages += 1
+
+# --- Pesan sebelumnya - turn yang dipotong dari transcript dimuat dari history hanya saat diminta ---
+@chat_fragment
+def render_earlier_messages(user_id):
+    trimmed = st.session_state.transcript_trimmed
+    if not trimmed:
+        return
+    with get_rerun_timer().section("earlier_messages"), st.expander(f"🕘 Pesan sebelumnya ({trimmed['messages']} pesan)"):
+        entry_ids = trimmed["ids"]
+        if not entry_ids:
+            st.caption("Pesan sebelumnya tidak tersedia di riwayat.")
+            return
+        # Hanya jumlah halaman yang disimpan di session state; isinya di-query ulang, tidak ditahan per sesi
+        limit = st.session_state.transcript_pages * TRANSCRIPT_PAGE_SIZE
+        entries = get_transcript_page(user_id, entry_ids[-limit:]) if limit else []
+        for entry in reversed(entries):
+            for message in rebuild_conversation(entry):
+                with st.chat_message(message["role"]):
+                    st.markdown(message["content"])
+        if limit < len(entry_ids):
+            # Klik tombol di dalam fragment hanya menjalankan ulang fragment ini
+            st.button("Muat pesan sebelumnya", key="transcript_load_more", on_click=load_earlier_messages)
+
+# --- Transcript fragment - rerun fragment lain (jawaban, riwayat) tidak me-render ulang transcript ---
+@chat_fragment
+def render_transcript():
+    with get_rerun_timer().section("transcript"):
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+# --- Question panel fragment - mengetik jawaban tidak menjalankan ulang seluruh halaman ---
+@chat_fragment
+def render_question_panel():
+    with get_rerun_timer().section("question_panel"):
+        # Display option buttons for current question
+        current_options = options[st.session_state.current_question]
+        cols = st.columns(len(current_options))
+        
+        button_clicked = False
+        for i, option in enumerate(current_options):
+            if cols[i].button(option, key=f"q{st.session_state.current_question}_option{i}"):
+                # Store the user's response
+                st.session_state.user_responses[questions[st.session_state.current_question]] = option
+                
+                # Add user response to chat history
+                append_message("user", option)
+                
+                # Move to next question
+                st.session_state.current_question += 1
+                button_clicked = True
+                break
+
+        # Allow for free text input as well
+        user_input = st.text_input(
+            "Atau ketikkan jawaban Anda sendiri:",
+            key=f"text_input_{st.session_state.current_question}"
+        )
+        
+        if st.button("Kirim Jawaban", key=f"submit_text_{st.session_state.current_question}"):
+            if user_input:
+                # Store the user's response
+                st.session_state.user_responses[questions[st.session_state.current_question]] = user_input
+                
+                # Add user response to chat history
+                append_message("user", user_input)
+                
+                # Move to next question
+                st.session_state.current_question += 1
+                button_clicked = True
+            else:
+                st.warning("Mohon masukkan jawaban atau pilih opsi.")
+        
+        if button_clicked:
+            rerun_app()
+
+script_start = time.perf_counter()
+get_rerun_timer().scope = FULL_RERUN
+start_rerun_profile()
 
 st.title("Aedra - Pemindai Demam Berdarah")
 
@@ -477,61 +546,62 @@ st.title("Aedra - Pemindai Demam Berdarah")
 if "DEVELOPMENT_MODE" not in st.session_state:
     st.session_state.DEVELOPMENT_MODE = False
 
+# Streaming mode - tampilkan jawaban per chunk saat diterima
+if "STREAMING_MODE" not in st.session_state:
+    st.session_state.STREAMING_MODE = True
+
+# Panel profiler per rerun - opt-in lewat PROFILER_PANEL atau checkbox di Mode Testing
+if "PROFILER_ENABLED" not in st.session_state:
+    st.session_state.PROFILER_ENABLED = PROFILER_PANEL
+
+# Shared MongoDB client - stop execution if database connection fails
+try:
+    connect_to_mongodb()
+    ensure_indexes()
+except Exception as e:
+    st.error(f"❌ Gagal koneksi ke MongoDB: {e}")
+    st.stop()
+
 # Ensure user has an ID
 user_id = get_user_id()
 
-# Load reference data
-reference_data = load_reference_data()
-
 # --- Sidebar Content ---
 with st.sidebar:
     st.header("🤖 Aedra AI")
-    st.text(f"User ID: {user_id[:8]}...")
+    if "username" in st.session_state:
+        st.text(f"User: {st.session_state.username}")
+    else:
+        st.text(f"User ID: {user_id[:8]}...")
     st.text(f"Timestamp: {time.strftime('%H:%M:%S')}")
 
     # DEVELOPMENT_MODE checkbox
     st.session_state.DEVELOPMENT_MODE = st.checkbox("Mode Testing Database", value=st.session_state.DEVELOPMENT_MODE)
     if st.session_state.DEVELOPMENT_MODE:
         st.warning("🧪 **MODE TESTING DATABASE AKTIF** - Tidak menggunakan Gemini API")
+        with st.expander("📊 Statistik Pool MongoDB"):
+            st.button("Periksa ulang", key="database_status_refresh", on_click=get_database_status.clear)
+            database_status = get_database_status()
+            st.json(get_pool_stats())
+            st.caption(f"Ping dan index diperiksa {database_status['checked_at']}")
+            if database_status["missing_indexes"]:
+                st.warning(f"Index belum tersedia: {', '.join(database_status['missing_indexes'])}")
+        with st.expander("🗃️ Statistik Cache Diagnosis"):
+            st.json(get_diagnosis_cache().get_stats())
+        with st.expander("🔎 Statistik Cache Pertanyaan Lanjutan"):
+            st.json(get_followup_cache().get_stats())
+        with st.expander("💾 Statistik Antrean Penyimpanan"):
+            st.json(get_history_writer().get_stats())
+        with st.expander("🚦 Statistik Gemini API"):
+            st.json(get_gemini_client().get_stats())
+        with st.expander("📈 Metrik Latency Proses"):
+            st.json(get_registry().snapshot())
+        st.session_state.PROFILER_ENABLED = st.checkbox("Profiler Rerun", value=st.session_state.PROFILER_ENABLED)
     else:
         st.info("🚀 **MODE PRODUCTION** - Menggunakan Gemini API")
 
-    st.header("📚 Riwayat Percakapan")
-    history = get_conversation_history(user_id)
-
-    if history:
-        for entry in history:
-            entry_type = entry.get("type", "unknown")
-            timestamp = entry.get("timestamp", "No Timestamp").split(' ')[1]  # Just show time
-            entry_id = str(entry["_id"])  # MongoDB ObjectId for button key
-
-            if entry_type == "dengue_diagnosis":
-                diagnosis_text = entry.get("diagnosis", "")
-                match = re.search(r"Kemungkinan Demam Berdarah:\s*(\w+)", diagnosis_text)
-                risk_level = match.group(1) if match else "N/A"
-                label = f"Diagnosis ({timestamp}) - Risiko: {risk_level}"
-                if st.button(label, key=f"history_{entry_id}"):
-                    # Load the conversation into session state
-                    st.session_state.messages = entry.get("conversation", [])
-                    st.session_state.diagnosis_complete = True
-                    st.session_state.allow_followup = True
-                    st.session_state.current_question = len(questions)
-                    st.session_state.user_responses = entry.get("responses", {})
-                    st.rerun()
-            elif entry_type == "followup_question":
-                question_text = entry.get("question", "Tidak ada pertanyaan")
-                display_question = (question_text[:40] + '...') if len(question_text) > 40 else question_text
-                label = f"Tanya ({timestamp}) - {display_question}"
-                if st.button(label, key=f"history_{entry_id}"):
-                    # Load the conversation into session state
-                    st.session_state.messages = entry.get("conversation", [])
-                    st.session_state.diagnosis_complete = True
-                    st.session_state.allow_followup = True
-                    st.session_state.current_question = len(questions)
-                    st.session_state.user_responses = {}  # Clear responses for follow-up
-                    st.rerun()
-    else:
-        st.info("Belum ada riwayat percakapan.")
+    st.session_state.STREAMING_MODE = st.checkbox("Mode Streaming", value=st.session_state.STREAMING_MODE)
+
+    render_history_sidebar(user_id)
 
 # --- Main Chat Interface ---
 
@@ -543,13 +613,11 @@ else:
 
 # Initialize session state for chat flow
 if "messages" not in st.session_state:
-    st.session_state.messages = []
-    # Assistant speaks first
-    mode_text = " (Mode Testing)" if st.session_state.DEVELOPMENT_MODE else ""
-    initial_message = f"Halo! Selamat datang di Aedra{mode_text}. Saya akan membantu Anda menilai gejala-gejala yang mungkin terkait dengan demam berdarah (dengue fever). Mari kita mulai dengan beberapa pertanyaan."
-    st.session_state.messages.append({"role": "assistant", "content": initial_message})
-    # Add first question immediately
-    st.session_state.messages.append({"role": "assistant", "content": questions[0]})
+    # Assistant speaks first, then the first question immediately
+    reset_transcript([
+        {"role": "assistant", "content": welcome_message(st.session_state.DEVELOPMENT_MODE)},
+        {"role": "assistant", "content": questions[0]},
+    ])
     
 if "current_question" not in st.session_state:
     st.session_state.current_question = 0
@@ -564,9 +632,8 @@ if "allow_followup" not in st.session_state:
     st.session_state.allow_followup = False
 
 # Display chat messages from history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+render_earlier_messages(user_id)
+render_transcript()
 
 # Check if we're in the diagnosis phase or follow-up phase
 if not st.session_state.diagnosis_complete:
@@ -574,73 +641,40 @@ if not st.session_state.diagnosis_complete:
     if st.session_state.current_question < len(questions):
         # Display current question in the main chat (if not already displayed)
         if not st.session_state.messages or st.session_state.messages[-1]["content"] != questions[st.session_state.current_question]:
-             st.session_state.messages.append({"role": "assistant", "content": questions[st.session_state.current_question]})
-             st.rerun()
-
-        # Display option buttons for current question
-        current_options = options[st.session_state.current_question]
-        cols = st.columns(len(current_options))
-        
-        button_clicked = False
-        for i, option in enumerate(current_options):
-            if cols[i].button(option, key=f"q{st.session_state.current_question}_option{i}"):
-                # Store the user's response
-                st.session_state.user_responses[questions[st.session_state.current_question]] = option
-                
-                # Add user response to chat history
-                st.session_state.messages.append({"role": "user", "content": option})
-                
-                # Move to next question
-                st.session_state.current_question += 1
-                button_clicked = True
-                break
+             append_message("assistant", questions[st.session_state.current_question])
+             rerun_app()
 
-        # Allow for free text input as well
-        user_input = st.text_input(
-            "Atau ketikkan jawaban Anda sendiri:",
-            key=f"text_input_{st.session_state.current_question}"
-        )
-        
-        if st.button("Kirim Jawaban", key=f"submit_text_{st.session_state.current_question}"):
-            if user_input:
-                # Store the user's response
-                st.session_state.user_responses[questions[st.session_state.current_question]] = user_input
-                
-                # Add user response to chat history
-                st.session_state.messages.append({"role": "user", "content": user_input})
-                
-                # Move to next question
-                st.session_state.current_question += 1
-                button_clicked = True
-            else:
-                st.warning("Mohon masukkan jawaban atau pilih opsi.")
-        
-        if button_clicked:
-            st.rerun()
+        render_question_panel()
     else:
         # All questions answered, perform diagnosis
         if not st.session_state.diagnosis_complete:
             loading_text = "Menganalisis gejala Anda..." if not st.session_state.DEVELOPMENT_MODE else "Testing database - Membuat response palsu..."
+            if st.session_state.STREAMING_MODE:
+                # Stream diagnosis into the chat bubble as chunks arrive
+                with st.chat_message("assistant"):
+                    diagnosis = st.write_stream(stream_symptom_analysis(st.session_state.user_responses, load_reference_index(), user_id))
             with st.spinner(loading_text):
                 # Get diagnosis
-                diagnosis = analyze_symptoms(st.session_state.user_responses, reference_data, user_id)
+                if not st.session_state.STREAMING_MODE:
+                    diagnosis = analyze_symptoms(st.session_state.user_responses, load_reference_index(), user_id)
                 
                 # Save to MongoDB
                 save_to_mongodb(user_id, st.session_state.user_responses, diagnosis)
                 
                 # Add diagnosis to chat history
-                st.session_state.messages.append({"role": "assistant", "content": diagnosis})
+                append_message("assistant", diagnosis)
                 
                 # Add follow-up invitation
-                followup_invitation = "Anda dapat bertanya lebih lanjut tentang demam berdarah atau memulai tes baru."
-                st.session_state.messages.append({"role": "assistant", "content": followup_invitation})
+                followup_invitation = FOLLOWUP_INVITATION
+                append_message("assistant", followup_invitation)
+                trim_transcript()
                 
                 # Mark diagnosis as complete and allow follow-up
                 st.session_state.diagnosis_complete = True
                 st.session_state.allow_followup = True
                 
                 # Force a rerun to update the UI
-                st.rerun()
+                rerun_app()
 else:
     # We're in the follow-up phase or showing test results
     if st.session_state.allow_followup:
@@ -653,44 +687,58 @@ else:
         if user_question:
             if user_question.lower().strip() == "mulai tes baru":
                 # Reset session state but keep user ID
-                st.session_state.messages = []
-                mode_text = " (Mode Testing)" if st.session_state.DEVELOPMENT_MODE else ""
-                initial_message = f"Halo! Selamat datang di Aedra{mode_text}. Saya akan membantu Anda menilai gejala-gejala yang mungkin terkait dengan demam berdarah (dengue fever). Mari kita mulai dengan beberapa pertanyaan."
-                st.session_state.messages.append({"role": "assistant", "content": initial_message})
-                st.session_state.messages.append({"role": "assistant", "content": questions[0]})
+                reset_transcript([
+                    {"role": "assistant", "content": welcome_message(st.session_state.DEVELOPMENT_MODE)},
+                    {"role": "assistant", "content": questions[0]},
+                ])
                 st.session_state.current_question = 0
                 st.session_state.user_responses = {}
                 st.session_state.diagnosis_complete = False
                 st.session_state.allow_followup = False
-                st.rerun()
+                rerun_app()
             else:
                 # Add user question to chat history
-                st.session_state.messages.append({"role": "user", "content": user_question})
+                append_message("user", user_question)
                 
                 loading_text = "Mencari jawaban..." if not st.session_state.DEVELOPMENT_MODE else "Testing database - Membuat jawaban palsu..."
+                if st.session_state.STREAMING_MODE:
+                    # Stream answer into the chat bubble as chunks arrive
+                    with st.chat_message("user"):
+                        st.markdown(user_question)
+                    with st.chat_message("assistant"):
+                        answer = st.write_stream(stream_followup_answer(user_question, load_reference_index()))
                 with st.spinner(loading_text):
                     # Get answer
-                    answer = answer_followup_question(user_question, reference_data)
+                    if not st.session_state.STREAMING_MODE:
+                        answer = answer_followup_question(user_question, load_reference_index())
                     
                     # Save to MongoDB
                     save_followup_to_mongodb(user_id, user_question, answer)
                     
                     # Add answer to chat history
-                    st.session_state.messages.append({"role": "assistant", "content": answer})
+                    append_message("assistant", answer)
+                    trim_transcript()
                 
                 # Force a rerun to update the UI
-                st.rerun()
+                rerun_app()
 
     # Button to start a new test
     if st.button("Mulai Tes Baru", key="new_test_button"):
         # Reset session state but keep user ID
-        st.session_state.messages = []
-        mode_text = " (Mode Testing)" if st.session_state.DEVELOPMENT_MODE else ""
-        initial_message = f"Halo! Selamat datang di Aedra{mode_text}. Saya akan membantu Anda menilai gejala-gejala yang mungkin terkait dengan demam berdarah (dengue fever). Mari kita mulai dengan beberapa pertanyaan."
-        st.session_state.messages.append({"role": "assistant", "content": initial_message})
-        st.session_state.messages.append({"role": "assistant", "content": questions[0]})
+        reset_transcript([
+            {"role": "assistant", "content": welcome_message(st.session_state.DEVELOPMENT_MODE)},
+            {"role": "assistant", "content": questions[0]},
+        ])
         st.session_state.current_question = 0
         st.session_state.user_responses = {}
         st.session_state.diagnosis_complete = False
         st.session_state.allow_followup = False
-        st.rerun()
\ No newline at end of file
+        rerun_app()
+# --- Per-rerun timing report ---
+record_rerun_metrics()
+if st.session_state.PROFILER_ENABLED:
+    with st.sidebar.expander("🐢 Fungsi Paling Lambat (rerun ini)", expanded=True):
+        st.table(get_rerun_profile())
+if st.session_state.DEVELOPMENT_MODE:
+    with st.sidebar.expander("⏱️ Waktu Rerun per Bagian"):
+        st.table(get_rerun_timer().report())